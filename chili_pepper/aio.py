@@ -0,0 +1,59 @@
+"""asyncio support for task invocations
+
+asyncio is only available in python3, so this module is only imported when it is used.
+"""
+import asyncio
+
+try:
+    from typing import TYPE_CHECKING, Callable, Optional
+
+    if TYPE_CHECKING:
+        from chili_pepper.app import Result
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+
+async def await_result(result):
+    # type: (Result) -> object
+    """Wait for a task result without blocking the event loop
+
+    If the awaiting coroutine is cancelled, the invocation is cancelled too, if it has not started running yet.
+
+    Args:
+        result (Result): The task result
+
+    Returns:
+        The return payload of the serverless function
+    """
+    await asyncio.wrap_future(result.start())
+    # the invocation is finished, so this will not block
+    return result.get()
+
+
+async def delay_async(delay, event, semaphore=None):
+    # type: (Callable[[dict], Result], dict, Optional[asyncio.Semaphore]) -> object
+    """Invoke a task and wait for its result without blocking the event loop
+
+    Calling ``delay`` can block, when the invocation executor is full or the function name has to be looked up,
+    so it runs on the event loop's default executor.  The invocation itself runs on the App's invocation executor.
+
+    Args:
+        delay (Callable[[dict], Result]): The task's ``delay`` function
+        event (dict): The event to pass to the task
+        semaphore (Optional[asyncio.Semaphore]): If passed, it is held while the task runs, to limit how many tasks run at once
+
+    Returns:
+        The return payload of the serverless function
+    """
+    if semaphore is None:
+        return await _delay_and_await(delay, event)
+    async with semaphore:
+        return await _delay_and_await(delay, event)
+
+
+async def _delay_and_await(delay, event):
+    # type: (Callable[[dict], Result], dict) -> object
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(None, delay, event)
+    return await await_result(result)
@@ -1,26 +1,55 @@
 import builtins
+import functools
 import inspect
 import json
 import logging
+import os
+import time
 from base64 import b64decode
+from io import BytesIO
+from collections import deque, namedtuple
+from concurrent import futures
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, CancelledError, Future
 from copy import deepcopy
 from enum import Enum
-from threading import Thread
+from threading import Lock
 
 import awacs
 import boto3
+from botocore.exceptions import ReadTimeoutError
 
+from chili_pepper.arrays import encode_arrays
+from chili_pepper.build_cache import DEFAULT_BUILD_CACHE_MAX_BYTES, BuildCache, get_default_build_cache_dir
+from chili_pepper.clients import ClientPool
 from chili_pepper.config import Config
-from chili_pepper.deployer import Deployer
+from chili_pepper.deadline import DeadlineExceededError, add_deadline, get_invoke_timeouts, get_remaining, is_deadline_event, unwrap_deadline_event
+from chili_pepper.dependency_cache import DEFAULT_DEPENDENCY_CACHE_MAX_BYTES, DependencyCache, get_default_dependency_cache_dir
+from chili_pepper.deployer import FUNCTION_MANIFEST_FILENAME, Deployer, FunctionIdCache, load_function_manifest
+from chili_pepper.envelope import TaskError, handle_batch_event, is_batch_event, make_batch_event, split_batch_payload
 from chili_pepper.exception import ChiliPepperException
+from chili_pepper.executor import DEFAULT_MAX_IN_FLIGHT, DEFAULT_QUEUE_DEPTH, BackpressurePolicy, InvocationExecutor, get_default_executor
+from chili_pepper.governor import DEFAULT_MAX_RETRIES, DEFAULT_RETRY_BASE_MS, DEFAULT_RETRY_MAX_MS, InvocationGovernor
+from chili_pepper.hedging import DEFAULT_HEDGE_MAX_RATIO, HedgePolicy, call_later
+from chili_pepper.offload import OFFLOAD_KEY_PREFIX, PayloadOffloader, is_s3_reference, load_s3_reference, open_s3_reference
+from chili_pepper.result_cache import LruResultCache, ResultCache, make_cache_key
+from chili_pepper.serializer import DEFAULT_COMPRESSION_MIN_SIZE, DEFAULT_SERIALIZER, PayloadCodec, SerializerRegistry
+from chili_pepper.spillover import DEFAULT_SPILLOVER_AFTER_THROTTLES, LocalSpillover
 
 try:
-    from typing import List, Optional, Dict
+    from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 except ImportError:
     # python2.7 doesn't have typing, and I don't want to mess with mypy yet
     pass
 
 
+DEFAULT_FUNCTION_ID_CACHE_TTL = 300
+DEFAULT_BATCH_WINDOW_MS = 10
+DEFAULT_RESULT_CHUNK_SIZE = 1024 * 1024
+
+# marks a Result whose offloaded return payload has not been downloaded yet
+_NOT_LOADED = object()
+
+
 class InvalidFunctionSignature(ChiliPepperException):
     """Function Signature does not match required specifications
 
@@ -52,78 +81,375 @@ class Result:
 
     Result wraps the information returned when the serverless function is invoked.
 
+    Result implements the :py:class:`concurrent.futures.Future` interface, so it can be waited on with a timeout,
+    given callbacks, and passed to :py:meth:`App.as_completed` and :py:meth:`App.wait`.
+    It can also be awaited from asyncio code.
+
+    The event is only held until it has been sent, and the raw invoke response body is released once it is decoded,
+    so pending and finished Results stay small.
+
     """
 
-    def __init__(self, lambda_function_name, event):
-        # type: (str, dict) -> None
+    # there can be a lot of Results at once, so keep them compact
+    __slots__ = (
+        "_logger",
+        "_lambda_function_name",
+        "_event",
+        "_lambda_client",
+        "_executor",
+        "_wait",
+        "_governor",
+        "_concurrency_ceiling",
+        "_offloader",
+        "_codec",
+        "_future",
+        "_invoke_response",
+        "_offloaded_value",
+        "_deadline",
+        "_spillover",
+    )
+
+    def __init__(
+        self,
+        lambda_function_name,  # type: str
+        event,  # type: dict
+        lambda_client=None,  # type: Optional[object]
+        executor=None,  # type: Optional[InvocationExecutor]
+        wait=True,  # type: bool
+        future=None,  # type: Optional[Future]
+        governor=None,  # type: Optional[InvocationGovernor]
+        concurrency_ceiling=None,  # type: Optional[int]
+        offloader=None,  # type: Optional[PayloadOffloader]
+        codec=None,  # type: Optional[PayloadCodec]
+        deadline=None,  # type: Optional[float]
+        spillover=None,  # type: Optional[Callable[[dict], object]]
+    ):
+        # type: (...) -> None
         """
         Args:
             lambda_function_name: The name of the invoked AWS Lambda function
             event: The event dictionary to pass to the AWS Lambda function
+            lambda_client: The boto3 lambda client to invoke the function with.  If not passed, a new client is created.
+            executor: The executor to run the invocation on.  If not passed, a shared default executor is used.
+            wait: If ``True``, invoke the function synchronously and wait for its return payload.
+                  If ``False``, the invocation is fire-and-forget - it is queued by AWS Lambda, and finishes as soon as it is accepted.
+            future: A future for an invocation that is already running, like a batch invocation that includes this event.
+                    It must resolve to the return payload.
+            governor: If passed, the invocation runs under the governor's adaptive concurrency limit,
+                      and is retried if it is throttled or fails with a server error.
+            concurrency_ceiling: The most invocations of this function the governor lets run at once, like its reserved concurrency
+            offloader: If passed, events that are too big to send through lambda are uploaded to S3, and a reference is sent instead.
+                       Its S3 client is used to download return payloads that the function offloaded to S3.
+            codec: The serializer and compression to encode the event with.  If not passed, the event is sent as plain JSON.
+            deadline: When the invocation must be finished by, in seconds since the epoch, like :py:func:`time.time`.
+                      The time left is sent to the function with the event, and the Result fails once the deadline passes.
+            spillover: Runs the event locally, and returns the return payload, if the governor gives up on invoking the function
+                       because it keeps being throttled.  Only used with a governor.
         """
         self._logger = logging.getLogger(__name__)
 
         self._lambda_function_name = lambda_function_name
         self._event = event
-
-        self._thread = None
-        self._invoke_response = None
+        self._lambda_client = lambda_client
+        self._executor = executor
+        self._wait = wait
+        self._governor = governor
+        self._concurrency_ceiling = concurrency_ceiling
+        self._offloader = offloader
+        self._codec = codec
+
+        self._future = future  # type: Optional[Future]
+        self._invoke_response = None  # type: Optional[dict]
+        self._offloaded_value = _NOT_LOADED
+        self._deadline = deadline
+        self._spillover = spillover
 
     def start(self):
+        # type: () -> Future
         """Start executing the serverless function
 
         Invokes the serverless function.
 
-        For AWS, this invokes the Lambda in a thread, since the only way to get results is to call synchronously.
-        By putting the invoke call in a therad, it will not block the main application thread.
+        For AWS, the only way to get results is to invoke the Lambda synchronously,
+        so the invoke call is submitted to an executor, and will not block the main application thread.
+        If the executor is full, this may block or raise, depending on the executor's backpressure policy.
+
+        Raises:
+            ExecutorFullError: If the executor is full, and rejects new invocations
 
         Returns:
-            Thread: The thread running the lambda
+            Future: The future for the running invocation, which resolves to the return payload
         """
-        if self._thread is None:
-
-            def lambda_run():
-                lambda_client = boto3.client("lambda")
-                self._invoke_response = lambda_client.invoke(FunctionName=self._lambda_function_name, Payload=json.dumps(self._event), LogType="Tail")
-                return
+        if self._future is None:
+            executor = self._executor if self._executor is not None else get_default_executor()
+            self._future = executor.submit(self._invoke)
+        return self._future
+
+    def _invoke(self):
+        lambda_client = self._lambda_client if self._lambda_client is not None else boto3.client("lambda")
+        if self._wait:
+            invoke_kwargs = {"LogType": "Tail"}
+        else:
+            # https://docs.aws.amazon.com/lambda/latest/dg/invocation-async.html
+            invoke_kwargs = {"InvocationType": "Event"}
+        if self._deadline is not None and get_remaining(self._deadline) <= 0:
+            # it waited in the executor queue for too long, so there is no point in invoking the function
+            self._event = None
+            raise DeadlineExceededError("The deadline passed before {function_name} was invoked".format(function_name=self._lambda_function_name))
+        # serialize (and maybe upload) the event once, even if the invocation is retried
+        encoded_event = self._codec.dumps(self._event) if self._codec is not None else json.dumps(self._event)
+        payload = encoded_event
+        if self._deadline is not None:
+            payload = add_deadline(payload, self._deadline)
+        if self._offloader is not None:
+            payload = self._offloader.offload_event(payload)
+        # the event is not needed once it is serialized, so do not keep it alive for as long as the Result is
+        self._event = None
+
+        def _invoke_once():
+            return lambda_client.invoke(FunctionName=self._lambda_function_name, Payload=payload, **invoke_kwargs)
+
+        spilled_payloads = list()
+
+        def _spill():
+            # the event and return payload go through the same encoding as an invocation's,
+            # so the caller gets the same payload whether or not the invocation was spilled
+            codec = self._get_codec()
+            return_payload = self._spillover(codec.loads(encoded_event))
+            # there is no invoke response to decode, so keep the local return payload aside
+            spilled_payloads.append(codec.loads(codec.dumps(return_payload)))
+            return dict()
 
-            self._thread = Thread(target=lambda_run)
-            self._thread.start()
-        return self._thread
+        try:
+            if self._governor is not None:
+                self._invoke_response = self._governor.call(
+                    self._lambda_function_name,
+                    _invoke_once,
+                    ceiling=self._concurrency_ceiling,
+                    deadline=self._deadline,
+                    fallback=_spill if self._spillover is not None else None,
+                )
+            else:
+                self._invoke_response = _invoke_once()
+        except ReadTimeoutError:
+            if self._deadline is not None and get_remaining(self._deadline) <= 0:
+                raise DeadlineExceededError("{function_name} did not finish before the deadline".format(function_name=self._lambda_function_name))
+            raise
+        if spilled_payloads:
+            return spilled_payloads[0] if self._wait else None
+        return self._decode_payload()
+
+    def _decode_payload(self):
+        # type: () -> object
+        if not self._wait:
+            # fire-and-forget invocations do not have a return payload
+            return None
 
-    def _join_invocation(self):
+        # lambda has now been invoked and _invoke_response *should* be populated
+        # TODO error handling
+        # moto returns None for payload in python 3.6
+        if self._invoke_response["Payload"] is not None:
+            body = self._invoke_response["Payload"]
+            # the body is a stream that can only be read once, so read it and let it go
+            payload = body.read()
+            body.close()
+            self._invoke_response = dict((key, value) for key, value in self._invoke_response.items() if key != "Payload")
+        else:
+            raise InvocationError("No invoke response, even though the AWS lambda function has been invoked.")
+        self._logger.info("Got {size} byte payload from function {function_name}".format(size=len(payload), function_name=self._lambda_function_name))
+        if self._invoke_response.get("FunctionError") is not None:
+            # lambda reports a handler that raised, or timed out, as a successful invocation with the error as its payload
+            raise _get_function_error(self._lambda_function_name, payload)
+        # the function replies with the serializer and compression the event was sent with
+        # decode straight from the bytes, without making a str copy of them first
+        return self._get_codec().loads(payload)
+
+    def _join_invocation(self, timeout=None):
+        # type: (Optional[float]) -> None
         """
-        Ensure the lambda thread has been executed, and joined with the main thread
+        Ensure the lambda function has been invoked, and wait for the invocation to finish
         """
-        if self._thread is None:
-            self.start()
-        self._thread.join()
+        self._wait_for(self.start().result, timeout)
 
-    def get(self):
+    def _wait_for(self, wait, timeout):
+        # type: (Callable[[Optional[float]], object], Optional[float]) -> object
+        """
+        Call one of the invocation future's waiting methods, giving up when the deadline passes
+        """
+        if self._deadline is None:
+            return wait(timeout)
+        remaining = max(0.0, get_remaining(self._deadline))
+        if timeout is not None and timeout < remaining:
+            return wait(timeout)
+        try:
+            return wait(remaining)
+        except futures.TimeoutError:
+            raise DeadlineExceededError("{function_name} did not finish before the deadline".format(function_name=self._lambda_function_name))
+
+    def get(self, timeout=None):
+        # type: (Optional[float]) -> object
         """Get the response from the serverless execution.
 
         This is a potentially blocking call.
 
         It will retrieve the return payload from the serverless function.  If it is called before the serverless function has finished,
-        ``get`` will block until the serverless function returns.
+        ``get`` will block until the serverless function returns, or until ``timeout`` seconds have passed.
+
+        Args:
+            timeout (Optional[float]): The maximum number of seconds to wait.  ``None`` waits forever.
 
         Raises:
             InvocationError: Raises if something goes retrieving the return payload of the serverless function.
+            concurrent.futures.TimeoutError: Raises if the serverless function did not finish within ``timeout`` seconds.
+            DeadlineExceededError: Raises if the serverless function did not finish before the Result's deadline.
+
+        Returns:
+            dict: The return payload of the serverless function, or ``None`` for fire-and-forget invocations
+        """
+        payload = self._wait_for(self.start().result, timeout)
+        if is_s3_reference(payload):
+            # only download an offloaded return payload once
+            if self._offloaded_value is _NOT_LOADED:
+                self._offloaded_value = self._get_codec().unwrap(load_s3_reference(self._get_s3_client(), payload))
+            return self._offloaded_value
+        return payload
+
+    def open(self, timeout=None):
+        # type: (Optional[float]) -> object
+        """Open the JSON encoded return payload of the serverless function for reading.
+
+        If the function offloaded its return payload to S3, it is streamed from S3, so it is never all in memory at once.
+        Offloaded return payloads are streamed exactly as the function sent them,
+        so they are only plain JSON if the event was sent with the ``json`` serializer and no compression.
+        Other return payloads are encoded as JSON again, with any numpy arrays and Arrow record batches in their base64 encoded envelopes,
+        which :py:func:`chili_pepper.arrays.decode_arrays` turns back into arrays.
+
+        Args:
+            timeout (Optional[float]): The maximum number of seconds to wait for the function to finish.  ``None`` waits forever.
+
+        Returns:
+            A binary file-like object
+        """
+        payload = self._wait_for(self.start().result, timeout)
+        if is_s3_reference(payload):
+            return open_s3_reference(self._get_s3_client(), payload)
+        # without an array store, array buffers are encoded inline instead of being uploaded again
+        return BytesIO(json.dumps(encode_arrays(payload)).encode("utf8"))
+
+    def iter_chunks(self, chunk_size=DEFAULT_RESULT_CHUNK_SIZE, timeout=None):
+        # type: (int, Optional[float]) -> Iterator[bytes]
+        """Iterate over the JSON encoded return payload of the serverless function in chunks.
+
+        Args:
+            chunk_size (int): The maximum number of bytes in each chunk
+            timeout (Optional[float]): The maximum number of seconds to wait for the function to finish.  ``None`` waits forever.
+
+        Returns:
+            Iterator[bytes]: The chunks of the return payload
+        """
+        stream = self.open(timeout=timeout)
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                yield chunk
+        finally:
+            stream.close()
+
+    def _get_codec(self):
+        # type: () -> PayloadCodec
+        if self._codec is None:
+            self._codec = PayloadCodec(SerializerRegistry())
+        return self._codec
+
+    def _get_s3_client(self):
+        if self._offloader is not None:
+            return self._offloader.get_s3_client()
+        return boto3.client("s3")
+
+    @property
+    def request_id(self):
+        # type: () -> str
+        """
+        The AWS request id of the invocation.
+
+        This blocks until the invocation has been accepted by AWS Lambda,
+        which is right away for fire-and-forget invocations, but only when the function finishes otherwise.
 
         Returns:
-            dict: The return payload of the serverless function
+            str: The request id, or ``None`` if the return payload came from a result cache
         """
         self._join_invocation()
+        return self._invoke_response.get("ResponseMetadata", {}).get("RequestId")
 
-        # lambda has now been invoked and _invoke_response *should* be populated
-        # TODO error handling
-        # moto returns None for payload in python 3.6
-        if self._invoke_response["Payload"] is not None:
-            payload = self._invoke_response["Payload"].read().decode("utf8")
-        else:
-            raise InvocationError("No invoke response, even though the AWS lambda function has been invoked.")
-        self._logger.info("Got payload {payload} from thread {thread}".format(payload=payload, thread=self._thread))
-        return json.loads(payload)
+    def result(self, timeout=None):
+        # type: (Optional[float]) -> object
+        """Same as :py:meth:`get`, to match the :py:class:`concurrent.futures.Future` interface"""
+        return self.get(timeout=timeout)
+
+    def exception(self, timeout=None):
+        # type: (Optional[float]) -> Optional[BaseException]
+        """Get the exception raised by the invocation.
+
+        Args:
+            timeout (Optional[float]): The maximum number of seconds to wait.  ``None`` waits forever.
+
+        Raises:
+            concurrent.futures.TimeoutError: Raises if the serverless function did not finish within ``timeout`` seconds.
+
+        Returns:
+            Optional[BaseException]: The exception raised while invoking the serverless function, or ``None`` if it succeeded
+        """
+        return self._wait_for(self.start().exception, timeout)
+
+    def done(self):
+        # type: () -> bool
+        """
+        Returns:
+            bool: ``True`` if the invocation has finished or was cancelled
+        """
+        return self.start().done()
+
+    def running(self):
+        # type: () -> bool
+        """
+        Returns:
+            bool: ``True`` if the invocation is running right now
+        """
+        return self.start().running()
+
+    def cancel(self):
+        # type: () -> bool
+        """Cancel the invocation, if it has not started running yet
+
+        Returns:
+            bool: ``True`` if the invocation was cancelled
+        """
+        return self.start().cancel()
+
+    def cancelled(self):
+        # type: () -> bool
+        """
+        Returns:
+            bool: ``True`` if the invocation was cancelled
+        """
+        return self.start().cancelled()
+
+    def add_done_callback(self, fn):
+        # type: (Callable[[Result], None]) -> None
+        """Call ``fn`` with this Result when the invocation finishes
+
+        If the invocation has already finished, ``fn`` is called right away.
+
+        Args:
+            fn (Callable[[Result], None]): The callback
+        """
+        self.start().add_done_callback(lambda _: fn(self))
+
+    def __await__(self):
+        """Wait for the return payload of the serverless function, without blocking the asyncio event loop"""
+        # asyncio is python3 only, so only import it when it is used
+        from chili_pepper.aio import await_result
+
+        return await_result(self).__await__()
 
     def get_log_result(self):
         """
@@ -136,7 +462,8 @@ class Result:
         """
         self._join_invocation()
 
-        if self._invoke_response["LogResult"] is not None:
+        # fire-and-forget invocations do not have a log result
+        if self._invoke_response.get("LogResult") is not None:
             log_result = b64decode(self._invoke_response["LogResult"]).decode("utf8")
             self._logger.debug("Log result was populated")
         else:
@@ -146,6 +473,378 @@ class Result:
         return log_result
 
 
+class _MicroBatcher:
+    """Coalesces events for one task into batch invocations
+
+    Events are held until ``batch_size`` of them are queued, or ``batch_window_ms`` has passed since the first one,
+    and are then sent to the serverless function as one batch event.  Each event gets its own :py:class:`Result`,
+    which resolves to that event's slice of the batch return payload.
+    """
+
+    def __init__(self, dispatch, batch_size, batch_window_ms, wait):
+        # type: (Callable[[str, dict], Result], int, float, bool) -> None
+        """
+        Args:
+            dispatch: Starts the invocation of a function with a batch event, and returns its Result
+            batch_size: The maximum number of events in a batch
+            batch_window_ms: The maximum number of milliseconds an event waits for the rest of its batch
+            wait: ``False`` if the batches are invoked fire-and-forget
+        """
+        self._dispatch = dispatch
+        self._batch_size = batch_size
+        self._batch_window_seconds = batch_window_ms / 1000.0
+        self._wait = wait
+
+        self._lock = Lock()
+        self._pending = list()  # type: List[Tuple[str, dict, Result]]
+        # identifies the batch window that is scheduled, since scheduled callbacks can not be cancelled
+        self._window = None  # type: Optional[object]
+
+    def submit(self, lambda_function_name, event, deadline=None):
+        # type: (str, dict, Optional[float]) -> Result
+        """Queue an event for the next batch
+
+        Args:
+            lambda_function_name: The name of the function to invoke
+            event: The event
+            deadline: When the event's Result gives up waiting, in seconds since the epoch.
+                      The batch invocation itself does not have a deadline, since it is shared with other events.
+
+        Returns:
+            Result: The result for this event
+        """
+        result = Result(lambda_function_name, event, wait=self._wait, future=Future(), deadline=deadline)
+        with self._lock:
+            self._pending.append((lambda_function_name, event, result))
+            if len(self._pending) >= self._batch_size:
+                batch = self._take_pending()
+            else:
+                batch = None
+                if self._window is None:
+                    self._window = window = object()
+                    call_later(self._batch_window_seconds, functools.partial(self._flush_window, window))
+        if batch is not None:
+            self._send(batch)
+        return result
+
+    def flush(self):
+        # type: () -> None
+        """Send the queued events now, without waiting for the batch to fill up"""
+        with self._lock:
+            batch = self._take_pending()
+        if batch:
+            self._send(batch)
+
+    def _flush_window(self, window):
+        # type: (object) -> None
+        with self._lock:
+            if self._window is not window:
+                # the batch filled up or was flushed before its window ended
+                return
+            batch = self._take_pending()
+        self._send(batch)
+
+    def _take_pending(self):
+        # type: () -> List[Tuple[str, dict, Result]]
+        # must be called while holding self._lock
+        self._window = None
+        batch = self._pending
+        self._pending = list()
+        return batch
+
+    def _send(self, batch):
+        # type: (List[Tuple[str, dict, Result]]) -> None
+        # leave out any events whose results were cancelled while they were queued
+        batch = [item for item in batch if item[2].start().set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = [result for _, _, result in batch]
+
+        try:
+            # all of the events in a batch are for the same task, so they have the same function name
+            batch_result = self._dispatch(batch[0][0], make_batch_event([event for _, event, _ in batch]))
+        except Exception as e:
+            for result in results:
+                result.start().set_exception(e)
+            return
+        finally:
+            for result in results:
+                result._event = None
+
+        def _split_batch_result(batch_future):
+            # type: (Future) -> None
+            for result in results:
+                result._invoke_response = batch_result._invoke_response
+            if batch_future.exception() is not None:
+                for result in results:
+                    result.start().set_exception(batch_future.exception())
+                return
+
+            if not self._wait:
+                # fire-and-forget invocations do not have a return payload to split
+                payloads = [None] * len(results)
+            else:
+                try:
+                    # the function may have offloaded the whole batch return payload
+                    batch_payload = batch_result.get()
+                except Exception as e:
+                    for result in results:
+                        result.start().set_exception(e)
+                    return
+                payloads = split_batch_payload(batch_payload, len(results))
+            for result, payload in zip(results, payloads):
+                if isinstance(payload, TaskError):
+                    result.start().set_exception(payload)
+                else:
+                    result.start().set_result(payload)
+
+        batch_result.start().add_done_callback(_split_batch_result)
+
+
+class _SingleFlight:
+    """Shares one invocation between concurrent calls with the same key
+
+    The first call for a key starts the invocation.  Calls with the same key that come in before it finishes
+    do not start another one.  Every call gets its own :py:class:`Result`, which resolves from the shared invocation,
+    so cancelling one of them does not affect the others.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._in_flight = dict()  # type: Dict[str, Future]
+
+    def submit(self, key, result, start, can_lead=True):
+        # type: (str, Result, Callable[[], Result], bool) -> Result
+        """Join the invocation in flight for the key, or call ``start`` to begin one
+
+        Args:
+            key: The key of the invocation
+            result: The unstarted Result for this call, with a Future that is resolved from the shared invocation
+            start: Starts an invocation, and returns its Result
+            can_lead: If ``False``, and there is no invocation in flight for the key,
+                      call ``start`` for this call alone, instead of sharing its invocation with later calls
+
+        Returns:
+            Result: ``result``, or the Result from ``start`` if this call could not lead and did not join an invocation
+        """
+        with self._lock:
+            shared = self._in_flight.get(key)
+            is_leader = shared is None
+            if is_leader and can_lead:
+                # resolves to the Result of the invocation, once it finishes
+                shared = self._in_flight[key] = Future()
+        if shared is None:
+            return start()
+
+        shared.add_done_callback(functools.partial(self._resolve, result))
+        if is_leader:
+            # start the invocation outside of the lock, since starting it may block on a full executor
+            try:
+                leader = start()
+            except Exception as e:
+                self._finish(key)
+                shared.set_exception(e)
+            else:
+                leader.add_done_callback(functools.partial(self._finish, key, shared))
+        return result
+
+    def _finish(self, key, shared=None, leader=None):
+        # type: (str, Optional[Future], Optional[Result]) -> None
+        # calls that come in after this start a new invocation
+        with self._lock:
+            del self._in_flight[key]
+        if shared is not None:
+            shared.set_result(leader)
+
+    @staticmethod
+    def _resolve(result, shared):
+        # type: (Result, Future) -> None
+        if shared.exception() is not None:
+            if result.start().set_running_or_notify_cancel():
+                result.start().set_exception(shared.exception())
+            return
+        _resolve_from(result, shared.result())
+
+
+class _HedgedCall:
+    """One call of a hedged task: the first invocation, and a duplicate of it if it is slow
+
+    The first invocation to succeed resolves the call's Result.  If one of them fails while the other is still running,
+    the call waits for the other one, and only fails if both do.
+    """
+
+    def __init__(self, policy, result, start):
+        # type: (HedgePolicy, Result, Callable[[], Result]) -> None
+        """
+        Args:
+            policy: When to hedge, and where to record latencies and counters
+            result: The unstarted Result for the call, with a Future that is resolved by the winning invocation
+            start: Starts an invocation, and returns its Result
+        """
+        self._policy = policy
+        self._result = result
+        self._start = start
+
+        self._lock = Lock()
+        self._running = 0
+        self._finished = False
+
+        self._logger = logging.getLogger(__name__)
+
+    def start(self):
+        # type: () -> Result
+        """Start the first invocation, and schedule the hedge
+
+        Returns:
+            Result: The result for the call
+        """
+        self._policy.on_invocation()
+        self._launch(is_hedge=False)
+        delay = self._policy.get_delay()
+        if delay is not None:
+            call_later(delay, self._hedge)
+        return self._result
+
+    def _launch(self, is_hedge):
+        # type: (bool) -> None
+        started = time.time()
+        attempt = self._start()
+        with self._lock:
+            self._running += 1
+        attempt.add_done_callback(functools.partial(self._on_done, is_hedge, started))
+
+    def _hedge(self):
+        # type: () -> None
+        with self._lock:
+            if self._finished:
+                return
+        if self._result.cancelled() or not self._policy.try_hedge():
+            return
+        self._logger.debug("Invocation of {function_name} is slow, starting a hedge".format(function_name=self._result._lambda_function_name))
+        try:
+            # this runs on the hedge scheduler's thread, which waits here if the executor is full,
+            # but there is no point in hedging while invocations are queueing up anyway
+            self._launch(is_hedge=True)
+        except Exception:
+            self._logger.warning("Could not start a hedged invocation", exc_info=True)
+
+    def _on_done(self, is_hedge, started, attempt):
+        # type: (bool, float, Result) -> None
+        # a FunctionError response raises a TaskError when the attempt's payload is decoded, so it counts as a failure here
+        succeeded = not attempt.cancelled() and attempt.exception() is None
+        if succeeded:
+            # the loser's latency is recorded too, so hedging does not hide how slow the function really is
+            self._policy.record_latency(time.time() - started)
+        with self._lock:
+            self._running -= 1
+            if self._finished or (not succeeded and self._running > 0):
+                return
+            self._finished = True
+            abandoned = self._running > 0
+        self._policy.record_finish(hedge_won=is_hedge and succeeded, abandoned=abandoned)
+        _resolve_from(self._result, attempt)
+
+
+def _get_function_error(lambda_function_name, payload):
+    # type: (str, bytes) -> TaskError
+    """Make the exception for the error payload of an invocation that lambda reported a ``FunctionError`` for"""
+    try:
+        error = json.loads(payload.decode("utf8"))
+    except ValueError:
+        error = None
+    if not isinstance(error, dict):
+        return TaskError("{function_name} failed: {payload}".format(function_name=lambda_function_name, payload=payload))
+    return TaskError(
+        "{function_name} failed with {type}: {message}".format(
+            function_name=lambda_function_name, type=error.get("errorType", "Error"), message=error.get("errorMessage")
+        )
+    )
+
+
+def _resolve_from(result, source):
+    # type: (Result, Result) -> None
+    """Resolve a Result that was made with its own Future from the outcome of another Result's invocation"""
+    future = result.start()
+    if not future.set_running_or_notify_cancel():
+        # this Result was cancelled, but the invocation may still be wanted by others
+        return
+    result._invoke_response = source._invoke_response
+    source_future = source.start()
+    if source_future.cancelled():
+        future.set_exception(CancelledError())
+    elif source_future.exception() is not None:
+        future.set_exception(source_future.exception())
+    else:
+        # the raw payload, so each Result downloads an offloaded return payload itself
+        future.set_result(source_future.result())
+
+
+def _completed_result(lambda_function_name, payload):
+    # type: (str, object) -> Result
+    """Make a finished Result for a return payload that did not need an invocation, like a cached one"""
+    future = Future()
+    future.set_result(payload)
+    result = Result(lambda_function_name, None, future=future)
+    result._invoke_response = dict()
+    return result
+
+
+DoneAndNotDoneResults = namedtuple("DoneAndNotDoneResults", ["done", "not_done"])
+
+
+def _group_results_by_future(results):
+    # type: (Iterable[Result]) -> Dict[Future, List[Result]]
+    results_by_future = dict()  # type: Dict[Future, List[Result]]
+    for result in results:
+        results_by_future.setdefault(result.start(), list()).append(result)
+    return results_by_future
+
+
+def _map_delay(delay, events, concurrency, ordered, get_value=Result.get):
+    # type: (Callable[[dict], Result], Iterable[dict], int, bool, Callable[[Result], object]) -> Iterator[object]
+    """
+    Invoke a task for each event, keeping at most ``concurrency`` invocations in flight,
+    and yield ``get_value`` of each result.
+
+    ``events`` is consumed lazily, so memory use does not depend on how many events there are.
+    """
+    if concurrency < 1:
+        raise MissingArgumentError("concurrency must be at least 1")
+
+    if ordered:
+        pending_results = deque()  # type: Deque[Result]
+        for event in events:
+            if len(pending_results) >= concurrency:
+                yield get_value(pending_results.popleft())
+            pending_results.append(delay(event))
+        while pending_results:
+            yield get_value(pending_results.popleft())
+    else:
+        pending_results_by_future = dict()  # type: Dict[Future, List[Result]]
+        pending_count = 0
+        event_iterator = iter(events)
+        events_exhausted = False
+        while True:
+            while not events_exhausted and pending_count < concurrency:
+                try:
+                    event = next(event_iterator)
+                except StopIteration:
+                    events_exhausted = True
+                    break
+                result = delay(event)
+                pending_results_by_future.setdefault(result.start(), list()).append(result)
+                pending_count += 1
+
+            if pending_count == 0:
+                return
+
+            done_futures, _ = futures.wait(pending_results_by_future.keys(), return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                for result in pending_results_by_future.pop(future):
+                    pending_count -= 1
+                    yield get_value(result)
+
+
 class AppProvider(Enum):
     """Enum to identify the serverless provider.
 
@@ -184,8 +883,8 @@ class TaskFunction:
     """A wrapper around python functions that can be serverlessly deployed and executed by chili-pepper
     """
 
-    def __init__(self, func, environment_variables=None, memory=None, timeout=None, tags=None, activate_tracing=False):
-        # type: (builtins.function, Optional[Dict], Optional[int], Optional[int], Optional[dict], bool) -> None
+    def __init__(self, func, environment_variables=None, memory=None, timeout=None, tags=None, activate_tracing=False, reserved_concurrency=None):
+        # type: (builtins.function, Optional[Dict], Optional[int], Optional[int], Optional[dict], bool, Optional[int]) -> None
         """
         Args:
             func (builtins.function): The python function object
@@ -193,6 +892,7 @@ class TaskFunction:
             memory [int, optional]: Memory value to allocate for the serverless function
             timeout [int, optional]: Timeout value for the serverless function
             tags [dict, optional]: Tags to add to the serverless function
+            reserved_concurrency [int, optional]: Concurrency reserved for the serverless function
         """
         self._func = func
         self._environment_variables = environment_variables if environment_variables is not None else dict()
@@ -200,6 +900,7 @@ class TaskFunction:
         self._timeout = timeout
         self._tags = tags if tags is not None else dict()
         self._activate_tracing = activate_tracing
+        self._reserved_concurrency = reserved_concurrency
 
     @property
     def func(self):
@@ -268,6 +969,19 @@ class TaskFunction:
         else:
             return False
 
+    @property
+    def reserved_concurrency(self):
+        # type: () -> Optional[int]
+        """
+        https://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/aws-resource-lambda-function.html#cfn-lambda-function-reservedconcurrentexecutions
+
+        The invocation governor never runs more invocations of the function at once than this.
+
+        Returns:
+            Optional[int]: The concurrency reserved for the serverless function
+        """
+        return self._reserved_concurrency
+
     def __eq__(self, other):
         # type: (TaskFunction) -> bool
         return (
@@ -311,6 +1025,13 @@ class App:
         self._logger = logging.getLogger(__name__)
         self._task_functions = list()
 
+        self._invocation_executor = None  # type: Optional[InvocationExecutor]
+        self._invocation_executor_lock = Lock()
+        self._serializers = None  # type: Optional[SerializerRegistry]
+        self._build_cache = None  # type: Optional[BuildCache]
+        self._dependency_cache = None  # type: Optional[DependencyCache]
+        self._batchers = list()  # type: List[_MicroBatcher]
+
     @property
     def app_name(self):
         # type: () -> str
@@ -327,6 +1048,160 @@ class App:
         """
         return self._task_functions
 
+    @property
+    def invocation_executor(self):
+        # type: () -> InvocationExecutor
+        """
+        The executor that runs serverless function invocations for this App.
+
+        The executor is created the first time it is used, from the ``max_in_flight_invocations``,
+        ``invocation_queue_depth`` and ``invocation_backpressure_policy`` config.
+
+        Returns:
+            InvocationExecutor: The invocation executor
+        """
+        if self._invocation_executor is None:
+            with self._invocation_executor_lock:
+                if self._invocation_executor is None:
+                    self._invocation_executor = InvocationExecutor(
+                        max_in_flight=self.conf.get("max_in_flight_invocations", DEFAULT_MAX_IN_FLIGHT),
+                        queue_depth=self.conf.get("invocation_queue_depth", DEFAULT_QUEUE_DEPTH),
+                        backpressure_policy=BackpressurePolicy(self.conf.get("invocation_backpressure_policy", BackpressurePolicy.BLOCK)),
+                    )
+        return self._invocation_executor
+
+    @property
+    def serializers(self):
+        # type: () -> SerializerRegistry
+        """
+        The serializers and compressions this App can send and receive payloads with.
+
+        Register your own :py:class:`chili_pepper.serializer.Serializer` here to use it with the ``serializer`` config.
+        The registry is created the first time it is used, from the ``pickle_allowlist`` config.
+
+        Returns:
+            SerializerRegistry: The serializer registry
+        """
+        if self._serializers is None:
+            with self._invocation_executor_lock:
+                if self._serializers is None:
+                    self._serializers = SerializerRegistry(pickle_allowlist=self.conf.get("pickle_allowlist"))
+        return self._serializers
+
+    @property
+    def payload_codec(self):
+        # type: () -> PayloadCodec
+        """
+        How events are encoded, from the ``serializer``, ``compression`` and ``compression_min_size`` config.
+        numpy arrays and Arrow record batches in events and return payloads are sent as raw buffers.
+
+        Returns:
+            PayloadCodec: The payload codec
+        """
+        return PayloadCodec(
+            self.serializers,
+            serializer=self.conf.get("serializer", DEFAULT_SERIALIZER),
+            compression=self.conf.get("compression"),
+            compression_min_size=self.conf.get("compression_min_size", DEFAULT_COMPRESSION_MIN_SIZE),
+            array_store=self._get_array_store(),
+        )
+
+    @property
+    def build_cache(self):
+        # type: () -> BuildCache
+        """
+        The local cache of deployment packages, from the ``build_cache_dir`` and ``build_cache_max_bytes`` config.
+
+        Returns:
+            BuildCache: The build cache
+        """
+        if self._build_cache is None:
+            with self._invocation_executor_lock:
+                if self._build_cache is None:
+                    self._build_cache = BuildCache(
+                        self.conf.get("build_cache_dir") or get_default_build_cache_dir(),
+                        max_bytes=self.conf.get("build_cache_max_bytes", DEFAULT_BUILD_CACHE_MAX_BYTES),
+                    )
+        return self._build_cache
+
+    @property
+    def dependency_cache(self):
+        # type: () -> DependencyCache
+        """
+        The local store of installed requirements, from the ``dependency_cache_dir`` and ``dependency_cache_max_bytes`` config.
+
+        Returns:
+            DependencyCache: The dependency cache
+        """
+        if self._dependency_cache is None:
+            with self._invocation_executor_lock:
+                if self._dependency_cache is None:
+                    self._dependency_cache = DependencyCache(
+                        self.conf.get("dependency_cache_dir") or get_default_dependency_cache_dir(),
+                        max_bytes=self.conf.get("dependency_cache_max_bytes", DEFAULT_DEPENDENCY_CACHE_MAX_BYTES),
+                    )
+        return self._dependency_cache
+
+    def _get_array_store(self):
+        # type: () -> Optional[object]
+        # cloud-specific App child classes can store big array buffers outside of the payload
+        return None
+
+    def as_completed(self, results, timeout=None):
+        # type: (Iterable[Result], Optional[float]) -> Iterator[Result]
+        """
+        Iterate over task results as their invocations finish, in whatever order that happens.
+
+        Args:
+            results: The task results to wait for
+            timeout: The maximum number of seconds to wait for all of the results.  ``None`` waits forever.
+
+        Raises:
+            concurrent.futures.TimeoutError: Raises if the results are not all finished within ``timeout`` seconds
+
+        Returns:
+            Iterator[Result]: The results, as they finish
+        """
+        results_by_future = _group_results_by_future(results)
+        for future in futures.as_completed(results_by_future.keys(), timeout=timeout):
+            for result in results_by_future[future]:
+                yield result
+
+    def wait(self, results, timeout=None, return_when=ALL_COMPLETED):
+        # type: (Iterable[Result], Optional[float], str) -> DoneAndNotDoneResults
+        """
+        Wait for task results to finish.
+
+        Args:
+            results: The task results to wait for
+            timeout: The maximum number of seconds to wait.  ``None`` waits forever.
+            return_when: When to return - one of ``FIRST_COMPLETED``, ``FIRST_EXCEPTION`` or ``ALL_COMPLETED``
+                         from :py:mod:`concurrent.futures`
+
+        Returns:
+            DoneAndNotDoneResults: A named tuple of the ``done`` and ``not_done`` sets of results
+        """
+        results_by_future = _group_results_by_future(results)
+        done_futures, not_done_futures = futures.wait(results_by_future.keys(), timeout=timeout, return_when=return_when)
+        return DoneAndNotDoneResults(
+            set(result for future in done_futures for result in results_by_future[future]),
+            set(result for future in not_done_futures for result in results_by_future[future]),
+        )
+
+    def shutdown(self, wait=True):
+        # type: (bool) -> None
+        """
+        Send the events queued for batches, and stop the invocation executor.  Tasks can not be invoked after the App is shut down.
+
+        Args:
+            wait: If ``True``, block until all running and queued invocations are done
+        """
+        for batcher in self._batchers:
+            batcher.flush()
+        with self._invocation_executor_lock:
+            if self._invocation_executor is not None:
+                self._invocation_executor.shutdown(wait=wait)
+
     def task(self, environment_variables=None):
         # type: (Optional[Dict]) -> builtins.func
         """
@@ -404,6 +1279,17 @@ class AwsAllowPermission:
 
 
 class AwsApp(App):
+    def __init__(self, app_name, config=None):
+        # type: (str, Optional[Config]) -> None
+        # App is an old-style class in python2.7, so super() will not work
+        App.__init__(self, app_name, config=config)
+        self._function_id_cache = FunctionIdCache()
+        self._function_manifest = None  # type: Optional[Dict[str, Dict]]
+        self._client_pool = None  # type: Optional[ClientPool]
+        self._client_pool_lock = Lock()
+        self._invocation_governor = None  # type: Optional[InvocationGovernor]
+        self._local_spillover = None  # type: Optional[LocalSpillover]
+
     @property
     def bucket_name(self):
         # type: () -> str
@@ -472,6 +1358,19 @@ class AwsApp(App):
             chili_pepper_kms_key_permission_sid = "ChiliPepperGrantAccessToKmsKey"
             if chili_pepper_kms_key_permission_sid not in [p.sid for p in allow_permissions]:
                 allow_permissions.append(AwsAllowPermission(["kms:Decrypt"], [self.kms_key_arn], sid=chili_pepper_kms_key_permission_sid))
+        payload_offloader = self.payload_offloader
+        if payload_offloader is not None:
+            chili_pepper_offload_permission_sid = "ChiliPepperGrantAccessToOffloadedPayloads"
+            if chili_pepper_offload_permission_sid not in [p.sid for p in allow_permissions]:
+                # functions download offloaded events, and upload offloaded return payloads
+                offload_actions = list()
+                # array buffers can be in either
+                if payload_offloader.event_threshold is not None or payload_offloader.array_threshold is not None:
+                    offload_actions.append("s3:GetObject")
+                if payload_offloader.result_threshold is not None or payload_offloader.array_threshold is not None:
+                    offload_actions.append("s3:PutObject")
+                offloaded_payloads_arn = "arn:aws:s3:::{bucket}/{prefix}*".format(bucket=self.bucket_name, prefix=payload_offloader.key_prefix)
+                allow_permissions.append(AwsAllowPermission(offload_actions, [offloaded_payloads_arn], sid=chili_pepper_offload_permission_sid))
         return allow_permissions
 
     @property
@@ -504,12 +1403,280 @@ class AwsApp(App):
         else:
             return list()
 
-    def task(self, environment_variables=None, memory=None, timeout=None, tags=None, activate_tracing=False):
-        # type: (Optional[Dict], Optional[int], Optional[int], Optional[dict], bool) -> builtins.func
+    @property
+    def function_id_cache(self):
+        # type: () -> FunctionIdCache
+        """
+        The cache of lambda function names, so that invoking a task does not need to ask cloudformation every time
+
+        Returns:
+            FunctionIdCache: The function id cache for this App
+        """
+        return self._function_id_cache
+
+    @property
+    def function_id_cache_ttl(self):
+        # type: () -> Optional[float]
+        """
+        How long, in seconds, looked up lambda function names are cached for
+
+        Returns:
+            Optional[float]: The cache ttl in seconds, or None if cached names never expire
+        """
+        if "function_id_cache_ttl" in self.conf["aws"]:
+            return self.conf["aws"]["function_id_cache_ttl"]
+        else:
+            return DEFAULT_FUNCTION_ID_CACHE_TTL
+
+    @property
+    def deterministic_function_names(self):
+        # type: () -> bool
+        """
+        If ``True``, lambda functions are given app scoped names that can be computed without asking AWS
+
+        Returns:
+            bool: ``True`` if function names are deterministic, ``False`` if cloudformation generates them
+        """
+        return self.conf["aws"].get("deterministic_function_names") is True
+
+    @property
+    def dependency_layer(self):
+        # type: () -> bool
+        """
+        If ``True``, requirements are deployed in a lambda layer, and the deployment package only has the app's code
+
+        Returns:
+            bool: ``True`` if requirements are deployed in a layer
+        """
+        return self.conf["aws"].get("dependency_layer") is True
+
+    @property
+    def function_manifest(self):
+        # type: () -> Optional[Dict[str, Dict]]
+        """
+        The function manifest written at deploy time, if one can be found.
+
+        The manifest is loaded from the ``function_manifest`` config path if it is set.
+        Inside an AWS Lambda function, the manifest bundled in the deployment package is used.
+
+        Returns:
+            Optional[Dict[str, Dict]]: The function details keyed by function handler, or None if there is no manifest
+        """
+        if self._function_manifest is None:
+            if self.conf["aws"].get("function_manifest") is not None:
+                manifest_path = self.conf["aws"]["function_manifest"]
+            elif "LAMBDA_TASK_ROOT" in os.environ:
+                manifest_path = os.path.join(os.environ["LAMBDA_TASK_ROOT"], FUNCTION_MANIFEST_FILENAME)
+            else:
+                return None
+
+            if not os.path.exists(str(manifest_path)):
+                self._logger.debug("No function manifest at " + str(manifest_path))
+                return None
+            self._function_manifest = load_function_manifest(manifest_path)
+        return self._function_manifest
+
+    @property
+    def client_pool(self):
+        # type: () -> ClientPool
+        """
+        The pool of boto3 clients shared by everything in this App.
+
+        The pool is created the first time it is used, from the ``max_pool_connections`` and ``tcp_keepalive`` config.
+
+        Returns:
+            ClientPool: The boto3 client pool
+        """
+        if self._client_pool is None:
+            with self._client_pool_lock:
+                if self._client_pool is None:
+                    self._client_pool = ClientPool(
+                        max_pool_connections=self.conf["aws"].get("max_pool_connections"), tcp_keepalive=self.conf["aws"].get("tcp_keepalive", True) is True
+                    )
+        return self._client_pool
+
+    @property
+    def payload_offloader(self):
+        # type: () -> Optional[PayloadOffloader]
+        """
+        Uploads events and return payloads that are too big to send through lambda to the app's S3 bucket.
+
+        Events bigger than the ``event_offload_threshold`` config,
+        return payloads bigger than the ``result_offload_threshold`` config,
+        and array buffers bigger than the ``array_offload_threshold`` config, are offloaded.
+
+        Returns:
+            Optional[PayloadOffloader]: The payload offloader, or None if no payloads are offloaded
+        """
+        event_offload_threshold = self.conf["aws"].get("event_offload_threshold")
+        result_offload_threshold = self.conf["aws"].get("result_offload_threshold")
+        array_offload_threshold = self.conf["aws"].get("array_offload_threshold")
+        if event_offload_threshold is None and result_offload_threshold is None and array_offload_threshold is None:
+            return None
+        return PayloadOffloader(
+            lambda: self.client_pool.client("s3"),
+            self.bucket_name,
+            OFFLOAD_KEY_PREFIX + self.app_name + "/",
+            event_threshold=event_offload_threshold,
+            result_threshold=result_offload_threshold,
+            array_threshold=array_offload_threshold,
+        )
+
+    def _get_array_store(self):
+        # type: () -> Optional[PayloadOffloader]
+        payload_offloader = self.payload_offloader
+        if payload_offloader is None or payload_offloader.array_threshold is None:
+            return None
+        return payload_offloader
+
+    @property
+    def invocation_governor(self):
+        # type: () -> Optional[InvocationGovernor]
+        """
+        The governor that adapts how many invocations of each function run at once, and retries throttled invocations.
+
+        The governor is created the first time it is used, from the ``adaptive_concurrency``, ``invocation_max_retries``,
+        ``invocation_retry_base_ms``, ``invocation_retry_max_ms`` and ``spillover_after_throttles`` config.
+        Each function starts out limited to ``max_in_flight_invocations``.
+
+        Returns:
+            Optional[InvocationGovernor]: The invocation governor, or None if ``adaptive_concurrency`` is turned off
+        """
+        if self.conf["aws"].get("adaptive_concurrency", True) is not True:
+            return None
+        if self._invocation_governor is None:
+            with self._invocation_executor_lock:
+                if self._invocation_governor is None:
+                    self._invocation_governor = InvocationGovernor(
+                        self.conf.get("max_in_flight_invocations", DEFAULT_MAX_IN_FLIGHT),
+                        max_retries=self.conf["aws"].get("invocation_max_retries", DEFAULT_MAX_RETRIES),
+                        retry_base_ms=self.conf["aws"].get("invocation_retry_base_ms", DEFAULT_RETRY_BASE_MS),
+                        retry_max_ms=self.conf["aws"].get("invocation_retry_max_ms", DEFAULT_RETRY_MAX_MS),
+                        fallback_after_throttles=self.conf["aws"].get("spillover_after_throttles", DEFAULT_SPILLOVER_AFTER_THROTTLES),
+                    )
+        return self._invocation_governor
+
+    @property
+    def local_spillover(self):
+        # type: () -> LocalSpillover
+        """
+        The local process pool that runs tasks with ``spillover=True`` when AWS Lambda keeps throttling their invocations.
+
+        It is created the first time it is used, with ``spillover_max_workers`` processes.
+        The processes are only started when an invocation is spilled over.
+
+        Returns:
+            LocalSpillover: The local spillover
+        """
+        if self._local_spillover is None:
+            with self._invocation_executor_lock:
+                if self._local_spillover is None:
+                    self._local_spillover = LocalSpillover(max_workers=self.conf["aws"].get("spillover_max_workers"))
+        return self._local_spillover
+
+    def shutdown(self, wait=True):
+        # type: (bool) -> None
+        """
+        Stop the invocation executor and the local spillover processes.  Tasks can not be invoked after the App is shut down.
+
+        Args:
+            wait: If ``True``, block until all running and queued invocations are done
+        """
+        App.shutdown(self, wait=wait)
+        with self._invocation_executor_lock:
+            if self._local_spillover is not None:
+                self._local_spillover.shutdown(wait=wait)
+
+    def prewarm_clients(self):
+        # type: () -> None
+        """
+        Create the boto3 clients used to invoke tasks ahead of time.
+
+        Call this when your application starts, so the first calls to ``delay`` do not pay for creating clients.
+        """
+        self.client_pool.prewarm(["cloudformation"])
+        # fire-and-forget invocations share a client, and synchronous ones get a client for their function's timeout
+        self._get_lambda_client()
+        for task_function in self._task_functions:
+            self._get_lambda_client(**get_invoke_timeouts(task_function.timeout, wait=True))
+
+    def _get_lambda_client(self, **timeouts):
+        # type: (...) -> object
+        """
+        Args:
+            timeouts: botocore connect and read timeouts, from :py:func:`chili_pepper.deadline.get_invoke_timeouts`
+        """
+        if self.invocation_governor is not None or "connect_timeout" in timeouts:
+            # the governor does the retrying, so botocore should not retry throttles too,
+            # and there is no time to retry a call with a deadline
+            return self.client_pool.client("lambda", retries={"total_max_attempts": 1}, **timeouts)
+        return self.client_pool.client("lambda", **timeouts)
+
+    def task(
+        self,
+        environment_variables=None,  # type: Optional[Dict]
+        memory=None,  # type: Optional[int]
+        timeout=None,  # type: Optional[int]
+        tags=None,  # type: Optional[dict]
+        activate_tracing=False,  # type: bool
+        wait=True,  # type: bool
+        batch_size=None,  # type: Optional[int]
+        batch_window_ms=None,  # type: Optional[float]
+        reserved_concurrency=None,  # type: Optional[int]
+        cache=None,  # type: object
+        single_flight=False,  # type: bool
+        idempotent=False,  # type: bool
+        hedge_after_ms=None,  # type: Optional[Union[float, str]]
+        hedge_max_ratio=DEFAULT_HEDGE_MAX_RATIO,  # type: float
+        spillover=False,  # type: bool
+    ):
+        # type: (...) -> builtins.func
+        """
+        The decorator to denote tasks.
+
+        Args:
+            environment_variables: Environment variables to apply to the task
+            memory: Memory value to allocate for the lambda function
+            timeout: Timeout value for the lambda function
+            tags: Tags to add to the lambda function
+            activate_tracing: If ``True``, turn on AWS X-Ray tracing for the lambda function
+            wait: If ``False``, ``delay`` invokes the task fire-and-forget by default, and ``get`` returns ``None``
+            batch_size: If set, events passed to ``delay`` are coalesced into batches of up to this many events,
+                        and each batch is handled by a single lambda invocation
+            batch_window_ms: The maximum number of milliseconds an event waits for its batch to fill up.
+                             Only used with ``batch_size``.
+            reserved_concurrency: Concurrency to reserve for the lambda function.
+                                  The invocation governor never runs more invocations of the task than this at once.
+            cache: A :py:class:`chili_pepper.result_cache.ResultCache` to keep the task's return payloads in,
+                   or ``True`` for an in-process LRU cache.  Only use this for tasks whose return payload depends on nothing but their event.
+                   ``delay`` returns a finished Result for a cached event, without invoking the lambda function.
+            single_flight: If ``True``, concurrent ``delay`` calls with the same event share one invocation, instead of each invoking the function.
+                           Fire-and-forget calls are never shared.
+            idempotent: ``True`` if running the task more than once for the same event is safe.  Required for hedging.
+            hedge_after_ms: If a call has not finished after this many milliseconds, start a duplicate invocation, and use whichever finishes first.
+                            Pass a percentile of the task's recent latencies, like ``"p95"``, to pick the threshold automatically.
+                            Fire-and-forget calls are never hedged.
+            hedge_max_ratio: The most duplicate invocations per call, like ``0.1`` for one duplicate every 10 calls
+            spillover: If ``True``, the task function runs in a local process when AWS Lambda keeps throttling its invocations.
+                       The function must be defined at the top level of a module, and its events and return payloads must be picklable.
+                       Requires ``adaptive_concurrency``.
+        """
         if environment_variables is None:
             environment_variables = dict()
         if tags is None:
             tags = dict()
+        if batch_size is not None and batch_size < 1:
+            raise MissingArgumentError("batch_size must be at least 1")
+        if batch_window_ms is None:
+            batch_window_ms = DEFAULT_BATCH_WINDOW_MS
+        if reserved_concurrency is not None and reserved_concurrency < 0:
+            raise MissingArgumentError("reserved_concurrency must not be negative")
+        if cache is True:
+            cache = LruResultCache()
+        if cache is not None and not isinstance(cache, ResultCache):
+            raise MissingArgumentError("cache must be a ResultCache, or True")
+        if hedge_after_ms is not None and not idempotent:
+            raise MissingArgumentError("Only idempotent tasks can be hedged, since a hedged task may run more than once for the same event")
 
         def _decorator(func,):
             # Ensure that the function signature matches what lambda expects
@@ -532,6 +1699,11 @@ class AwsApp(App):
                     + " has these parameters: "
                     + str(function_parameter_list)
                 )
+            if spillover and "<locals>" in getattr(func, "__qualname__", ""):
+                raise MissingArgumentError(
+                    "Spillover tasks are pickled to run in local processes, so they must be defined at the top level of a module, not in "
+                    + func.__qualname__
+                )
 
             # combine the default and passed env vars
             default_environment_vars = self.conf["default_environment_variables"]
@@ -542,31 +1714,182 @@ class AwsApp(App):
             task_tags = deepcopy(self.default_tags)
             task_tags.update(tags)
 
+            @functools.wraps(func)
+            def _task_handler(event, context):
+                # this is the function lambda calls, so it takes apart any events that chili pepper wrapped up
+                if is_s3_reference(event):
+                    event = load_s3_reference(self.client_pool.client("s3"), event)
+                if is_deadline_event(event):
+                    # the task sees the caller's deadline through context.get_remaining_time_in_millis()
+                    event, context = unwrap_deadline_event(event, context)
+                # reply with the same serializer and compression the event was sent with
+                codec = self.payload_codec.for_payload(event)
+                event = codec.unwrap(event)
+                if is_batch_event(event):
+                    result = handle_batch_event(func, event, context)
+                else:
+                    result = func(event, context)
+                result = codec.wrap(result)
+                payload_offloader = self.payload_offloader
+                if payload_offloader is not None:
+                    result = payload_offloader.dump_result(result)
+                return result
+
+            # spillover runs the task function itself, and python2.7's functools.wraps does not set this
+            _task_handler.__wrapped__ = func
+
             self._task_functions.append(
                 TaskFunction(
-                    func, environment_variables=task_environment_variables, memory=memory, timeout=timeout, tags=task_tags, activate_tracing=activate_tracing
+                    _task_handler,
+                    environment_variables=task_environment_variables,
+                    memory=memory,
+                    timeout=timeout,
+                    tags=task_tags,
+                    activate_tracing=activate_tracing,
+                    reserved_concurrency=reserved_concurrency,
                 )
             )
 
-            def _delay_wrapper(event):
+            task_wait = wait
+            task_name = func.__module__ + "." + func.__name__
+
+            def _start_invocation(lambda_function_name, event, wait, deadline=None):
+                # type: (str, dict, bool, Optional[float]) -> Result
+                result = Result(
+                    lambda_function_name,
+                    event,
+                    lambda_client=self._get_lambda_client(**get_invoke_timeouts(timeout, wait, deadline=deadline)),
+                    executor=self.invocation_executor,
+                    wait=wait,
+                    governor=self.invocation_governor,
+                    concurrency_ceiling=reserved_concurrency,
+                    offloader=self.payload_offloader,
+                    codec=self.payload_codec,
+                    deadline=deadline,
+                    spillover=functools.partial(self.local_spillover.run, _task_handler, timeout=timeout, deadline=deadline) if spillover else None,
+                )
+                result.start()
+                return result
+
+            if batch_size is not None:
+                # one batcher for each invocation type, since a batch is handled by a single invocation
+                batchers = dict(
+                    (batch_wait, _MicroBatcher(functools.partial(_start_invocation, wait=batch_wait), batch_size, batch_window_ms, batch_wait))
+                    for batch_wait in [True, False]
+                )
+                self._batchers.extend(batchers.values())
+            else:
+                batchers = None
+
+            def _make_result(lambda_function_name, deadline):
+                # type: (str, Optional[float]) -> Result
+                # a Result that is resolved from another invocation, by single-flight or hedging
+                return Result(
+                    lambda_function_name, None, future=Future(), offloader=self.payload_offloader, codec=self.payload_codec, deadline=deadline
+                )
+
+            single_flights = _SingleFlight() if single_flight else None
+            hedge_policy = HedgePolicy(hedge_after_ms, max_ratio=hedge_max_ratio) if hedge_after_ms is not None else None
+
+            def _delay_wrapper(event, wait=None, deadline=None):
                 # see https://docs.aws.amazon.com/lambda/latest/dg/python-programming-model-handler-types.html
-                # the delay function arguments must be just the event argument
+                # the only argument of the task that delay passes on is the event argument
                 # context is added by lambda
                 """
                 plan of attack
                 1) Compute or look up the function name
                 2) call https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/lambda.html#Lambda.Client.invoke
-                   in a separate thread (since invoke only gives you useful feedback if you call it synchronously)
+                   on the app's invocation executor (since invoke only gives you useful feedback if you call it synchronously)
                 3) return a wrapper of the response, payload, logs, etc
+
+                ``deadline`` is when the call must be finished by, in seconds since the epoch, like :py:func:`time.time`.
+                The task sees the time left through ``context.get_remaining_time_in_millis()``,
+                and the Result raises :py:class:`chili_pepper.deadline.DeadlineExceededError` once the deadline passes.
                 """
                 # TODO make this cloud agnostic, abstracting it depending on the cloud provider
-                deployer = Deployer(self)
-                lambda_function_name = deployer.get_function_id(func)  # TODO alias/versioning support?
-                result = Result(lambda_function_name, event)
-                result.start()
-                return result
+                # the function name comes from the deploy manifest, the deterministic name, or the function id cache
+                # so most calls do not need to ask AWS for it
+                if wait is None:
+                    wait = task_wait
+                # fire-and-forget invocations do not have a return payload to cache or share
+                use_cache = cache is not None and wait
+                use_single_flight = single_flights is not None and wait
+                if use_cache or use_single_flight:
+                    cache_codec = PayloadCodec(self.serializers, serializer=self.conf.get("serializer", DEFAULT_SERIALIZER))
+                    cache_key = make_cache_key(task_name, event, serializer=cache_codec.serializer)
+                if use_cache:
+                    cached_payload = cache.get(cache_key)
+                    if cached_payload is not None:
+                        return _completed_result(task_name, cache_codec.loads(cached_payload))
 
-            func.delay = _delay_wrapper
-            return func
+                deployer = Deployer(self)
+                lambda_function_name = deployer.get_function_id(_task_handler)  # TODO alias/versioning support?
+
+                def _start_once():
+                    # type: () -> Result
+                    if batchers is not None:
+                        return batchers[wait].submit(lambda_function_name, event, deadline=deadline)
+                    return _start_invocation(lambda_function_name, event, wait, deadline=deadline)
+
+                def _start():
+                    # type: () -> Result
+                    if hedge_policy is not None and wait:
+                        result = _HedgedCall(hedge_policy, _make_result(lambda_function_name, deadline), _start_once).start()
+                    else:
+                        result = _start_once()
+                    if use_cache:
+                        result.add_done_callback(functools.partial(_cache_payload, cache_codec, cache_key))
+                    return result
+
+                if use_single_flight:
+                    # an invocation that is limited by this call's deadline would fail the calls that joined it with a later deadline, or none.
+                    # Calls with a deadline still join an invocation in flight, since their own Result gives up at their deadline.
+                    return single_flights.submit(cache_key, _make_result(lambda_function_name, deadline), _start, can_lead=deadline is None)
+                return _start()
+
+            def _cache_payload(cache_codec, cache_key, result):
+                # type: (PayloadCodec, str, Result) -> None
+                if result.cancelled() or result.exception() is not None:
+                    return
+                try:
+                    cache.set(cache_key, cache_codec.dumps(result.get()).encode("utf8"))
+                except Exception:
+                    self._logger.warning("Could not cache the return payload of " + task_name, exc_info=True)
+
+            def _delay_async_wrapper(event, semaphore=None):
+                # asyncio is python3 only, so only import it when it is used
+                from chili_pepper.aio import delay_async
+
+                return delay_async(_delay_wrapper, event, semaphore=semaphore)
+
+            def _map_wrapper(events, concurrency=None, ordered=True, wait=None):
+                """
+                Invoke the task once for each event, and yield the return payloads.
+                For fire-and-forget invocations, the request ids are yielded instead.
+
+                ``events`` is consumed lazily, and at most ``concurrency`` invocations are in flight at once,
+                so huge (or endless) event iterables can be mapped in constant memory.
+                If an invocation fails, its exception is raised when its payload would have been yielded.
+
+                Args:
+                    events: The events to invoke the task with
+                    concurrency: The maximum number of invocations in flight.  Defaults to the app's ``max_in_flight_invocations``.
+                    ordered: If ``True``, payloads are yielded in the same order as the events.
+                             Otherwise, they are yielded as soon as each invocation finishes.
+                    wait: If ``False``, the invocations are fire-and-forget.  Defaults to the task's ``wait`` setting.
+                """
+                if concurrency is None:
+                    concurrency = self.invocation_executor.max_in_flight
+                if wait is None:
+                    wait = task_wait
+                get_value = Result.get if wait else (lambda result: result.request_id)
+                return _map_delay(lambda event: _delay_wrapper(event, wait=wait), events, concurrency, ordered, get_value=get_value)
+
+            _task_handler.delay = _delay_wrapper
+            _task_handler.delay_async = _delay_async_wrapper
+            _task_handler.map = _map_wrapper
+            _task_handler.cache = cache
+            _task_handler.hedge_policy = hedge_policy
+            return _task_handler
 
         return _decorator
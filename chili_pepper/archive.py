@@ -0,0 +1,237 @@
+"""Build zip archives with the files compressed in parallel
+
+Deployment packages hold thousands of files, and deflating them one at a time keeps a single core busy.
+:py:class:`ZipBuilder` deflates the files on a thread pool, since zlib releases the GIL while it compresses,
+and writes the compressed entries to the archive in the order they were added, so the result does not depend on which thread finished first.
+Files that are already compressed, like wheels and images, are stored as they are instead of being deflated again.
+
+In reproducible mode, the same files always make the same bytes: entries are sorted by name,
+and timestamps and permissions are normalized, so archives can be compared and deduplicated by their digest.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import stat
+import time
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+try:
+    from typing import Deque, Iterable, List, Optional, Tuple
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_STORED_EXTENSIONS = (".bz2", ".gif", ".gz", ".jpeg", ".jpg", ".png", ".tgz", ".webp", ".whl", ".xz", ".zip", ".zst")
+# how many compressed entries may wait to be written, per thread
+_ENTRIES_IN_FLIGHT_PER_WORKER = 4
+DIGEST_SUFFIX = ".sha256"
+# zip archives can not hold timestamps before 1980
+_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ZipBuilder:
+    """Collects files and builds a zip archive of them
+    """
+
+    def __init__(
+        self,
+        compression_level=DEFAULT_COMPRESSION_LEVEL,  # type: int
+        stored_extensions=DEFAULT_STORED_EXTENSIONS,  # type: Iterable[str]
+        max_workers=None,  # type: Optional[int]
+        reproducible=False,  # type: bool
+    ):
+        # type: (...) -> None
+        """
+        Args:
+            compression_level (int): The zlib compression level, from ``0`` for none to ``9`` for the smallest archive
+            stored_extensions (Iterable[str]): Extensions, like ``".whl"``, of files that are stored without compressing them
+            max_workers (Optional[int]): The most files compressed at once.  Defaults to the number of CPUs.
+            reproducible (bool): If ``True``, sort the entries, and normalize their timestamps and permissions,
+                                 so the same files always make the same archive
+        """
+        self._compression_level = compression_level
+        self._stored_extensions = tuple(extension.lower() for extension in stored_extensions)
+        self._max_workers = max_workers if max_workers is not None else multiprocessing.cpu_count()
+        self._reproducible = reproducible
+        self._date_time = get_reproducible_date_time() if reproducible else None
+        # each entry is an archive name, and either a file path or the entry's bytes
+        self._entries = list()  # type: List[Tuple[str, Optional[str], Optional[bytes]]]
+
+        self._logger = logging.getLogger(__name__)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_file(self, file_path, arcname):
+        # type: (str, str) -> None
+        """Add a file.  It is read when the archive is written.
+
+        Args:
+            file_path (str): The file to add
+            arcname (str): The file's name in the archive
+        """
+        self._entries.append((arcname, file_path, None))
+
+    def add_bytes(self, arcname, data):
+        # type: (str, bytes) -> None
+        """
+        Args:
+            arcname (str): The entry's name in the archive
+            data (bytes): The entry's contents
+        """
+        self._entries.append((arcname, None, data))
+
+    def add_directory(self, src_dir, prefix="", exclude=None):
+        # type: (str, str, Optional[Iterable[str]]) -> None
+        """Add every file under a directory
+
+        Args:
+            src_dir (str): The directory.  Its files are put at the root of the archive, not under the directory's name.
+            prefix (str): The directory in the archive to put the files under
+            exclude (Optional[Iterable[str]]): Paths under ``src_dir`` to leave out, like the archive itself
+        """
+        exclude = set(os.path.abspath(str(path)) for path in (exclude if exclude is not None else []))
+        for root, _, files in os.walk(str(src_dir)):
+            for _file in files:
+                file_path = os.path.join(root, _file)
+                if os.path.abspath(file_path) not in exclude:
+                    self.add_file(file_path, os.path.join(prefix, os.path.relpath(file_path, str(src_dir))))
+
+    def write(self, output_path):
+        # type: (str) -> None
+        """Compress the entries and write the archive
+
+        Args:
+            output_path (str): Where the archive goes.  An existing file is overwritten.
+        """
+        self._logger.debug("Compressing {count} entries on {workers} threads".format(count=len(self._entries), workers=self._max_workers))
+        with zipfile.ZipFile(str(output_path), "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zfh:
+            executor = ThreadPoolExecutor(max_workers=self._max_workers)
+            try:
+                # only a bounded window of entries is compressed ahead of the writer, so big archives do not have to fit in memory
+                # os.walk order depends on the filesystem
+                entries = iter(sorted(self._entries, key=lambda entry: _get_zip_name(entry[0])) if self._reproducible else self._entries)
+                pending = deque(
+                    executor.submit(self._compress, entry) for entry in islice(entries, self._max_workers * _ENTRIES_IN_FLIGHT_PER_WORKER)
+                )  # type: Deque
+                while pending:
+                    zinfo, data = pending.popleft().result()
+                    _write_compressed(zfh, zinfo, data)
+                    entry = next(entries, None)
+                    if entry is not None:
+                        pending.append(executor.submit(self._compress, entry))
+            finally:
+                executor.shutdown(wait=True)
+
+    def _compress(self, entry):
+        # type: (Tuple[str, Optional[str], Optional[bytes]]) -> Tuple[zipfile.ZipInfo, bytes]
+        arcname, file_path, data = entry
+        if file_path is not None:
+            file_stat = os.stat(file_path)
+            date_time = max(_MIN_DATE_TIME, time.localtime(file_stat.st_mtime)[:6])
+            mode = file_stat.st_mode
+            with open(file_path, "rb") as fh:
+                data = fh.read()
+        else:
+            date_time = time.localtime(time.time())[:6]
+            # rw-------, like zipfile gives entries written from bytes
+            mode = 0o600
+
+        zinfo = zipfile.ZipInfo(_get_zip_name(arcname), date_time=self._date_time or date_time)
+        if self._reproducible:
+            # keep only whether the file is executable, since umasks differ between machines
+            mode = stat.S_IFREG | (0o755 if mode & 0o111 else 0o644)
+            # the default depends on the platform the archive is built on
+            zinfo.create_system = 3
+        zinfo.external_attr = (mode & 0xFFFF) << 16
+
+        zinfo.file_size = len(data)
+        zinfo.CRC = zlib.crc32(data) & 0xFFFFFFFF
+        zinfo.compress_type = zipfile.ZIP_STORED
+        if self._compression_level > 0 and not arcname.lower().endswith(self._stored_extensions):
+            # negative wbits makes raw deflate data, without the zlib header and checksum zip does not use
+            compressor = zlib.compressobj(self._compression_level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            if len(compressed) < len(data):
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                data = compressed
+        zinfo.compress_size = len(data)
+        return zinfo, data
+
+
+def _write_compressed(zfh, zinfo, data):
+    # type: (zipfile.ZipFile, zipfile.ZipInfo, bytes) -> None
+    # zipfile can only write entries by compressing them itself, so write the local header and compressed data directly,
+    # and let zipfile write the central directory for them when it is closed.
+    # This sets zipfile's private fp, filelist, NameToInfo and start_dir, and is known to work on CPython 3.6 to 3.13,
+    # including zip64 entries.  tests/unit/test_archive.py reopens the archives with zipfile to check them.
+    zinfo.header_offset = zfh.fp.tell()
+    zfh.fp.write(zinfo.FileHeader(zip64=zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT))
+    zfh.fp.write(data)
+    zfh.filelist.append(zinfo)
+    zfh.NameToInfo[zinfo.filename] = zinfo
+    zfh.start_dir = zfh.fp.tell()
+
+
+def _get_zip_name(arcname):
+    # type: (str) -> str
+    return arcname.replace(os.sep, "/")
+
+
+def get_reproducible_date_time():
+    # type: () -> Tuple[int, int, int, int, int, int]
+    """The timestamp of every entry in reproducible archives
+
+    Returns:
+        Tuple[int, int, int, int, int, int]: The time from the ``SOURCE_DATE_EPOCH`` environment variable
+        (https://reproducible-builds.org/specs/source-date-epoch/), or 1980-01-01 if it is not set
+    """
+    source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if source_date_epoch is None:
+        return _MIN_DATE_TIME
+    return max(_MIN_DATE_TIME, tuple(time.gmtime(int(source_date_epoch))[:6]))
+
+
+def write_digest(zip_path):
+    # type: (str) -> str
+    """Write the SHA-256 digest of an archive next to it, in the format ``sha256sum`` reads
+
+    Args:
+        zip_path (str): The archive
+
+    Returns:
+        str: The hex encoded digest
+    """
+    digest = hashlib.sha256()
+    with open(str(zip_path), "rb") as fh:
+        block = fh.read(_HASH_BLOCK_SIZE)
+        while block:
+            digest.update(block)
+            block = fh.read(_HASH_BLOCK_SIZE)
+    hex_digest = digest.hexdigest()
+    with open(str(zip_path) + DIGEST_SUFFIX, "w") as fh:
+        fh.write(hex_digest + "  " + os.path.basename(str(zip_path)) + "\n")
+    return hex_digest
+
+
+def read_digest(zip_path):
+    # type: (str) -> Optional[str]
+    """
+    Args:
+        zip_path (str): The archive
+
+    Returns:
+        Optional[str]: The hex encoded digest written by :py:func:`write_digest`, or ``None`` if there is none
+    """
+    try:
+        with open(str(zip_path) + DIGEST_SUFFIX, "r") as fh:
+            return fh.read().split()[0]
+    except (IOError, OSError, IndexError):
+        return None
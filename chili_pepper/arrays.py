@@ -0,0 +1,154 @@
+"""NumPy array and Arrow record batch support for events and return payloads
+
+Arrays are sent as their raw buffer, with the dtype and shape needed to rebuild them,
+instead of as JSON lists with a python object for every element.
+Small buffers are base64 encoded inline.  Big buffers are uploaded to S3, if an array store is configured.
+Decoded arrays are made with ``numpy.frombuffer``, so they share memory with the decoded buffer, and are read-only.
+
+numpy and pyarrow are optional.  They are only imported when an array is sent or received.
+"""
+import sys
+from base64 import b64decode, b64encode
+
+from chili_pepper.envelope import ENVELOPE_KEY, is_envelope
+from chili_pepper.exception import ChiliPepperException
+
+try:
+    from typing import Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+
+class ArrayEncodingError(ChiliPepperException):
+    """Raised when an array can not be sent as a raw buffer, or a received array can not be rebuilt
+    """
+
+    pass
+
+
+def _is_ndarray(obj):
+    # type: (object) -> bool
+    # if numpy was never imported, there can not be any arrays, so there is no need to import it
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
+def _is_record_batch(obj):
+    # type: (object) -> bool
+    pyarrow = sys.modules.get("pyarrow")
+    return pyarrow is not None and isinstance(obj, pyarrow.RecordBatch)
+
+
+def encode_arrays(obj, array_store=None):
+    # type: (object, Optional[object]) -> object
+    """Replace the numpy arrays and Arrow record batches in a payload with JSON compatible envelopes
+
+    Args:
+        obj: The payload
+        array_store: If passed, buffers bigger than its ``array_threshold`` are uploaded with its ``upload_buffer`` method
+
+    Returns:
+        The payload, with its arrays replaced
+    """
+    if "numpy" not in sys.modules and "pyarrow" not in sys.modules:
+        # there can not be any arrays, so do not walk the payload
+        return obj
+    return _encode_arrays(obj, array_store)
+
+
+def _encode_arrays(obj, array_store):
+    # type: (object, Optional[object]) -> object
+    if _is_ndarray(obj):
+        return _encode_ndarray(obj, array_store)
+    if _is_record_batch(obj):
+        return _encode_record_batch(obj, array_store)
+    if isinstance(obj, dict):
+        encoded = dict((key, _encode_arrays(value, array_store)) for key, value in obj.items())
+        # only copy the payload if it had arrays in it
+        return encoded if any(encoded[key] is not value for key, value in obj.items()) else obj
+    if isinstance(obj, (list, tuple)):
+        encoded = [_encode_arrays(value, array_store) for value in obj]
+        return encoded if any(encoded_value is not value for encoded_value, value in zip(encoded, obj)) else obj
+    return obj
+
+
+def decode_arrays(obj, array_store=None):
+    # type: (object, Optional[object]) -> object
+    """Rebuild the numpy arrays and Arrow record batches in a payload made by :py:func:`encode_arrays`
+
+    Args:
+        obj: The payload
+        array_store: Downloads buffers that were uploaded, with its ``download_buffer`` method
+
+    Returns:
+        The payload, with its arrays rebuilt
+    """
+    if is_envelope(obj):
+        encoding = obj[ENVELOPE_KEY]
+        if "ndarray" in encoding:
+            return _decode_ndarray(encoding["ndarray"], _get_buffer(obj, encoding["ndarray"], array_store))
+        if "arrow" in encoding:
+            return _decode_record_batch(_get_buffer(obj, encoding["arrow"], array_store))
+    if isinstance(obj, dict):
+        decoded = dict((key, decode_arrays(value, array_store)) for key, value in obj.items())
+        # only copy the payload if it had arrays in it
+        return decoded if any(decoded[key] is not value for key, value in obj.items()) else obj
+    if isinstance(obj, list):
+        decoded = [decode_arrays(value, array_store) for value in obj]
+        return decoded if any(decoded_value is not value for decoded_value, value in zip(decoded, obj)) else obj
+    return obj
+
+
+def _encode_ndarray(array, array_store):
+    if array.dtype.hasobject:
+        raise ArrayEncodingError("Arrays of python objects can not be sent as a raw buffer: {dtype}".format(dtype=array.dtype))
+    numpy = sys.modules["numpy"]
+    # the buffer is always sent in C order
+    array = numpy.ascontiguousarray(array)
+    dtype = array.dtype.descr if array.dtype.names is not None else array.dtype.str
+    # viewing the array as bytes does not copy it
+    buffer = memoryview(array.reshape(-1).view(numpy.uint8))
+    return _make_envelope("ndarray", {"dtype": dtype, "shape": list(array.shape)}, buffer, array_store)
+
+
+def _decode_ndarray(metadata, buffer):
+    import numpy
+
+    dtype = metadata["dtype"]
+    if isinstance(dtype, list):
+        # structured dtype descriptions come back from JSON with lists where numpy wants tuples
+        dtype = [tuple(field) for field in dtype]
+    return numpy.frombuffer(buffer, dtype=numpy.dtype(dtype)).reshape(metadata["shape"])
+
+
+def _encode_record_batch(record_batch, array_store):
+    import pyarrow
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, record_batch.schema) as writer:
+        writer.write_batch(record_batch)
+    return _make_envelope("arrow", {}, memoryview(sink.getvalue()), array_store)
+
+
+def _decode_record_batch(buffer):
+    import pyarrow
+
+    return pyarrow.ipc.open_stream(pyarrow.py_buffer(buffer)).read_next_batch()
+
+
+def _make_envelope(kind, metadata, buffer, array_store):
+    # type: (str, dict, memoryview, Optional[object]) -> dict
+    if array_store is not None and array_store.array_threshold is not None and buffer.nbytes > array_store.array_threshold:
+        metadata["s3"] = array_store.upload_buffer(buffer)
+        return {ENVELOPE_KEY: {kind: metadata}}
+    return {ENVELOPE_KEY: {kind: metadata}, "data": b64encode(buffer).decode("ascii")}
+
+
+def _get_buffer(envelope, metadata, array_store):
+    # type: (dict, dict, Optional[object]) -> bytes
+    if "s3" not in metadata:
+        return b64decode(envelope["data"])
+    if array_store is None:
+        raise ArrayEncodingError("The array was uploaded to S3, but there is no array store to download it with")
+    return array_store.download_buffer(metadata["s3"])
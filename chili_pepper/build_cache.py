@@ -0,0 +1,268 @@
+"""A local cache of deployment packages, keyed by a content hash of everything that goes into them
+
+Building a deployment package walks the app directory, installs the requirements with pip and compresses every file.
+When none of the inputs changed since an earlier deploy, the zip that deploy built is reused instead.
+
+The key covers the app directory's files, ``requirements.txt`` among them, the function manifest, the runtime,
+the python and platform the requirements are installed with, and the chili-pepper source code.
+Requirements that are not pinned are hashed as written, so a cached package keeps the versions that pip resolved when it was built.
+"""
+import errno
+import hashlib
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+
+try:
+    from typing import Iterable, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_BUILD_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+_source_digest = None  # type: Optional[str]
+_source_digest_lock = threading.Lock()
+
+
+def get_default_build_cache_dir():
+    # type: () -> str
+    """
+    Returns:
+        str: ``chili-pepper/builds`` under ``$XDG_CACHE_HOME``, or under ``~/.cache`` if it is not set
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "chili-pepper", "builds")
+
+
+def _hash_file(file_hash, path):
+    # type: (object, str) -> None
+    with open(path, "rb") as fh:
+        block = fh.read(_HASH_BLOCK_SIZE)
+        while block:
+            file_hash.update(block)
+            block = fh.read(_HASH_BLOCK_SIZE)
+
+
+def _hash_directory(key_hash, directory, exclude):
+    # type: (object, str, Iterable[str]) -> None
+    exclude = set(os.path.abspath(path) for path in exclude)
+    paths = list()
+    for root, _, files in os.walk(directory):
+        for _file in files:
+            path = os.path.join(root, _file)
+            if os.path.abspath(path) not in exclude:
+                paths.append(path)
+    # os.walk order depends on the filesystem, so sort the paths to get the same key everywhere
+    for path in sorted(paths, key=lambda p: os.path.relpath(p, directory)):
+        key_hash.update(os.path.relpath(path, directory).replace(os.sep, "/").encode("utf8"))
+        key_hash.update(b"\0")
+        file_hash = hashlib.sha256()
+        _hash_file(file_hash, path)
+        key_hash.update(file_hash.digest())
+
+
+def get_chili_pepper_source_digest():
+    # type: () -> str
+    """A digest of the installed chili-pepper source code
+
+    The source is hashed instead of reading the version, so packages built by an unreleased checkout are not reused after it changes.
+
+    Returns:
+        str: The hex encoded SHA-256 digest
+    """
+    global _source_digest
+    with _source_digest_lock:
+        if _source_digest is None:
+            source_hash = hashlib.sha256()
+            package_dir = os.path.dirname(os.path.abspath(__file__))
+            for name in sorted(os.listdir(package_dir)):
+                if name.endswith(".py"):
+                    source_hash.update(name.encode("utf8"))
+                    _hash_file(source_hash, os.path.join(package_dir, name))
+            _source_digest = source_hash.hexdigest()
+        return _source_digest
+
+
+def compute_build_key(app_dir, runtime, function_manifest_json, exclude=None, options=None):
+    # type: (str, str, str, Optional[Iterable[str]], Optional[Iterable[str]]) -> str
+    """Derive the build cache key of a deployment package
+
+    Args:
+        app_dir (str): The application source code location
+        runtime (str): The AWS Lambda runtime, like ``python3.7``
+        function_manifest_json (str): The function manifest that is written into the package
+        exclude (Optional[Iterable[str]]): Paths under ``app_dir`` that are not part of the package, like the package itself
+        options (Optional[Iterable[str]]): Build settings that change what is in the package
+
+    Returns:
+        str: The hex encoded SHA-256 build key
+    """
+    key_hash = hashlib.sha256()
+    for part in [
+        get_chili_pepper_source_digest(),
+        runtime,
+        # requirements are installed with the local interpreter, so their wheels depend on it
+        "{major}.{minor}".format(major=sys.version_info[0], minor=sys.version_info[1]),
+        sys.platform,
+        platform.machine(),
+        function_manifest_json,
+    ] + list(options if options is not None else []):
+        key_hash.update(part.encode("utf8"))
+        key_hash.update(b"\0")
+    _hash_directory(key_hash, str(app_dir), exclude if exclude is not None else [])
+    return key_hash.hexdigest()
+
+
+class BuildCache:
+    """Deployment package zips in a local directory, evicting the least recently used ones when it is over ``max_bytes``
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_BUILD_CACHE_MAX_BYTES):
+        # type: (str, Optional[int]) -> None
+        """
+        Args:
+            directory (str): The directory to keep the zips in.  It is created the first time a zip is stored.
+            max_bytes (Optional[int]): The most bytes of zips to keep.  ``None`` does not limit the size.
+        """
+        self._directory = str(directory)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def directory(self):
+        # type: () -> str
+        """
+        Returns:
+            str: The directory the zips are kept in
+        """
+        return self._directory
+
+    @property
+    def hits(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of lookups that found a zip
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of lookups that did not find a zip
+        """
+        return self._misses
+
+    @property
+    def evictions(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of zips evicted to stay under ``max_bytes``
+        """
+        return self._evictions
+
+    def get(self, key, dest_path):
+        # type: (str, str) -> bool
+        """Put the cached zip at ``dest_path``, replacing whatever is there
+
+        Args:
+            key (str): The build key
+            dest_path (str): Where the deployment package goes
+
+        Returns:
+            bool: ``True`` on a cache hit, ``False`` if there is no zip for the key
+        """
+        entry_path = self._get_path(key)
+        with self._lock:
+            if not os.path.exists(entry_path):
+                self._misses += 1
+                return False
+            self._hits += 1
+            # eviction goes by modification time, so touching the entry marks it as recently used
+            os.utime(entry_path, None)
+        _remove(str(dest_path))
+        try:
+            # a hard link is instant, no matter how big the zip is
+            os.link(entry_path, str(dest_path))
+        except (AttributeError, OSError):
+            # python2.7 does not have os.link on windows, and the cache may be on another filesystem
+            shutil.copyfile(entry_path, str(dest_path))
+        self._logger.debug("Reusing deployment package " + entry_path)
+        return True
+
+    def put(self, key, zip_path):
+        # type: (str, str) -> None
+        """Store a deployment package
+
+        Args:
+            key (str): The build key
+            zip_path (str): The deployment package zip
+        """
+        if self._max_bytes is not None and os.path.getsize(str(zip_path)) > self._max_bytes:
+            # it would evict everything else, and still not fit
+            return
+        try:
+            os.makedirs(self._directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # copy to a temporary file and rename it, so a concurrent deploy never reuses a partial zip
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(str(zip_path), temp_path)
+            # os.replace overwrites an existing entry on every platform, but python2.7 only has os.rename
+            getattr(os, "replace", os.rename)(temp_path, self._get_path(key))
+        except Exception:
+            _remove(temp_path)
+            raise
+        if self._max_bytes is not None:
+            self._evict()
+
+    def _evict(self):
+        # type: () -> None
+        with self._lock:
+            entries = list()
+            for name in os.listdir(self._directory):
+                if name.startswith("."):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self._directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, name in sorted(entries):
+                if size <= self._max_bytes:
+                    break
+                self._logger.debug("Evicting deployment package " + name + " from the build cache")
+                _remove(os.path.join(self._directory, name))
+                self._evictions += 1
+                size -= entry_size
+
+    def _get_path(self, key):
+        # type: (str) -> str
+        return os.path.join(self._directory, key + ".zip")
+
+
+def _remove(path):
+    # type: (str) -> None
+    try:
+        os.remove(path)
+    except OSError:
+        # it is not there, or another process removed it first
+        pass
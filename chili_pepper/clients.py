@@ -0,0 +1,114 @@
+import logging
+import threading
+
+import boto3
+from botocore.config import Config as BotocoreConfig
+
+try:
+    from typing import Dict, Iterable, Optional, Tuple
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+
+class ClientPool:
+    """Thread-safe pool of boto3 clients
+
+    Creating a boto3 client resolves credentials and endpoints, and loads the botocore service model, which is slow.
+    The pool creates each client once, from a single shared session, and hands the same client to every caller.
+    boto3 clients are thread-safe, so they (and their warm HTTP connections) can be shared between threads.
+    boto3 sessions are not thread-safe, so clients are only ever created while holding the pool's lock.
+    """
+
+    def __init__(self, max_pool_connections=None, tcp_keepalive=True):
+        # type: (Optional[int], bool) -> None
+        """
+        Args:
+            max_pool_connections (Optional[int]): The maximum number of HTTP connections each client keeps open.
+                                                  ``None`` uses the botocore default.
+            tcp_keepalive (bool): Whether to turn on TCP keep-alive for the client connections
+        """
+        self._max_pool_connections = max_pool_connections
+        self._tcp_keepalive = tcp_keepalive
+
+        self._lock = threading.Lock()
+        self._session = None  # type: Optional[boto3.session.Session]
+        self._clients = dict()  # type: Dict[Tuple, object]
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def max_pool_connections(self):
+        # type: () -> Optional[int]
+        """
+        Returns:
+            Optional[int]: The maximum number of HTTP connections each client keeps open
+        """
+        return self._max_pool_connections
+
+    @property
+    def tcp_keepalive(self):
+        # type: () -> bool
+        """
+        Returns:
+            bool: Whether TCP keep-alive is turned on for the client connections
+        """
+        return self._tcp_keepalive
+
+    def client(self, service_name, **config_kwargs):
+        """Get the shared client for an AWS service
+
+        Args:
+            service_name (str): The AWS service name, like ``lambda``
+            config_kwargs: Extra ``botocore.config.Config`` arguments. Each distinct set of arguments gets its own client.
+
+        Returns:
+            The boto3 client
+        """
+        # config values can be dicts, like retries, so key on their repr
+        client_key = (service_name,) + tuple((key, repr(value)) for key, value in sorted(config_kwargs.items()))
+        # clients are only added to the dict, never replaced, so the lock-free read is safe
+        client = self._clients.get(client_key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(client_key)
+                if client is None:
+                    self._logger.debug("Creating boto3 client for " + service_name)
+                    client = self._get_session().client(service_name, config=self._get_botocore_config(**config_kwargs))
+                    self._clients[client_key] = client
+        return client
+
+    def prewarm(self, service_names):
+        # type: (Iterable[str]) -> None
+        """Create clients ahead of time, so the first calls to AWS do not pay for it
+
+        Args:
+            service_names (Iterable[str]): The AWS services to create clients for
+        """
+        for service_name in service_names:
+            self.client(service_name)
+        with self._lock:
+            # resolving credentials can mean a call to the instance metadata service, so do it now too
+            self._get_session().get_credentials()
+
+    def clear(self):
+        # type: () -> None
+        """Drop all of the pooled clients and the shared session"""
+        with self._lock:
+            self._clients = dict()
+            self._session = None
+
+    def _get_session(self):
+        # type: () -> boto3.session.Session
+        # must be called while holding self._lock
+        if self._session is None:
+            self._session = boto3.session.Session()
+        return self._session
+
+    def _get_botocore_config(self, **config_kwargs):
+        # type: (...) -> BotocoreConfig
+        botocore_config_kwargs = {"tcp_keepalive": self._tcp_keepalive}
+        if self._max_pool_connections is not None:
+            botocore_config_kwargs["max_pool_connections"] = self._max_pool_connections
+        botocore_config_kwargs.update(config_kwargs)
+        return BotocoreConfig(**botocore_config_kwargs)
@@ -0,0 +1,169 @@
+"""Deadlines for task invocations, and the client timeouts that go with them
+
+A caller can give ``delay`` a deadline.  The remaining budget is sent to the task with the event,
+and the task sees it through ``context.get_remaining_time_in_millis()``, so it can stop early.
+The invocation's botocore timeouts are cut to the budget, and the Result fails once the deadline passes.
+
+The budget is sent instead of the deadline itself, so the caller's and the serverless function's clocks do not have to agree.
+"""
+import json
+import math
+import time
+from concurrent import futures
+
+from chili_pepper.envelope import ENVELOPE_KEY, is_envelope
+from chili_pepper.exception import ChiliPepperException
+
+try:
+    from typing import Dict, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+# https://docs.aws.amazon.com/lambda/latest/dg/configuration-function-common.html#configuration-timeout-console
+DEFAULT_LAMBDA_TIMEOUT = 3
+# synchronous invocations also wait for the function's init phase, and the network
+DEFAULT_READ_TIMEOUT_MARGIN = 15
+# botocore's default connect and read timeout
+BOTOCORE_DEFAULT_TIMEOUT = 60
+
+
+class DeadlineExceededError(ChiliPepperException, futures.TimeoutError):
+    """Raised when an invocation did not finish before its deadline
+
+    It is a :py:class:`concurrent.futures.TimeoutError`, so code that handles timeouts handles it too.
+    """
+
+    pass
+
+
+def get_remaining(deadline):
+    # type: (float) -> float
+    """
+    Args:
+        deadline (float): The deadline, in seconds since the epoch, like :py:func:`time.time`
+
+    Returns:
+        float: The seconds left until the deadline, which is negative once it has passed
+    """
+    return deadline - time.time()
+
+
+def get_invoke_timeouts(function_timeout, wait, deadline=None):
+    # type: (Optional[int], bool, Optional[float]) -> Dict[str, int]
+    """The botocore timeouts for invoking a function
+
+    Synchronous invocations wait for the function to finish, so their read timeout is the function's timeout plus a margin,
+    instead of botocore's default.  A deadline cuts the timeouts to the time left.
+    Timeouts are rounded up, so calls with nearby deadlines share a pooled client.
+
+    Args:
+        function_timeout (Optional[int]): The function's timeout in seconds, or ``None`` for the AWS Lambda default
+        wait (bool): ``False`` for fire-and-forget invocations, which AWS Lambda answers right away
+        deadline (Optional[float]): The deadline, in seconds since the epoch
+
+    Returns:
+        Dict[str, int]: ``botocore.config.Config`` arguments
+    """
+    timeouts = dict()  # type: Dict[str, int]
+    if wait:
+        function_timeout = function_timeout if function_timeout is not None else DEFAULT_LAMBDA_TIMEOUT
+        timeouts["read_timeout"] = function_timeout + DEFAULT_READ_TIMEOUT_MARGIN
+    if deadline is not None:
+        remaining = _round_up(get_remaining(deadline))
+        timeouts["read_timeout"] = min(timeouts.get("read_timeout", BOTOCORE_DEFAULT_TIMEOUT), remaining)
+        timeouts["connect_timeout"] = min(BOTOCORE_DEFAULT_TIMEOUT, remaining)
+    return timeouts
+
+
+def _round_up(seconds):
+    # type: (float) -> int
+    # to the second under 10 seconds, and to 10 seconds above that, so there are not too many distinct clients
+    if seconds <= 10:
+        return max(1, int(math.ceil(seconds)))
+    return int(math.ceil(seconds / 10.0)) * 10
+
+
+def add_deadline(payload, deadline):
+    # type: (str, float) -> str
+    """Add the remaining budget to a serialized event
+
+    Args:
+        payload (str): The JSON encoded event
+        deadline (float): The deadline, in seconds since the epoch
+
+    Returns:
+        str: The JSON encoded deadline envelope, holding the event
+    """
+    header = json.dumps({"budget_ms": int(get_remaining(deadline) * 1000)})
+    # splice the event in, instead of decoding and encoding it again
+    return '{{"{key}": {header}, "event": {payload}}}'.format(key=ENVELOPE_KEY, header=header, payload=payload)
+
+
+def is_deadline_event(event):
+    # type: (object) -> bool
+    """
+    Returns:
+        bool: ``True`` if the event was made with :py:func:`add_deadline`
+    """
+    return is_envelope(event) and "budget_ms" in event[ENVELOPE_KEY]
+
+
+class DeadlineContext:
+    """Lambda context object that also counts down to the caller's deadline
+
+    Everything but :py:meth:`get_remaining_time_in_millis` is passed through to the lambda context.
+    """
+
+    def __init__(self, context, deadline):
+        # type: (object, float) -> None
+        """
+        Args:
+            context: The lambda context object
+            deadline (float): The deadline, in seconds since the epoch, by this process' clock
+        """
+        self._context = context
+        self._deadline = deadline
+
+    @property
+    def deadline(self):
+        # type: () -> float
+        """
+        Returns:
+            float: The deadline, in seconds since the epoch
+        """
+        return self._deadline
+
+    def get_remaining_time_in_millis(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The milliseconds left until the deadline, or until the function times out, whichever comes first
+        """
+        remaining = int(get_remaining(self._deadline) * 1000)
+        if hasattr(self._context, "get_remaining_time_in_millis"):
+            remaining = min(remaining, self._context.get_remaining_time_in_millis())
+        return max(0, remaining)
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+
+def unwrap_deadline_event(event, context):
+    # type: (dict, object) -> tuple
+    """Take apart an event made with :py:func:`add_deadline`
+
+    Args:
+        event (dict): The deadline envelope
+        context: The lambda context object
+
+    Raises:
+        DeadlineExceededError: If the budget was spent before the event arrived
+
+    Returns:
+        tuple: The event, and a :py:class:`DeadlineContext` for it
+    """
+    budget_ms = event[ENVELOPE_KEY]["budget_ms"]
+    if budget_ms <= 0:
+        raise DeadlineExceededError("The deadline passed before the task started")
+    return event["event"], DeadlineContext(context, time.time() + budget_ms / 1000.0)
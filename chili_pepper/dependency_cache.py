@@ -0,0 +1,241 @@
+"""A local store of installed requirements, so deploys do not run pip again for the same pins
+
+Every deployment package needs the app's requirements installed into a directory that is zipped with the code.
+The installed directory is kept, keyed by a hash of ``requirements.txt`` and the runtime and platform they were installed for,
+and later deploys add the kept directory to their package instead of installing the requirements again.
+With the directory cached, packages can be rebuilt without network access.
+
+pip is given a wheel cache inside the store, so changing one requirement only downloads and builds that one.
+"""
+import errno
+import hashlib
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+try:
+    from typing import Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_DEPENDENCY_CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def get_default_dependency_cache_dir():
+    # type: () -> str
+    """
+    Returns:
+        str: ``chili-pepper/dependencies`` under ``$XDG_CACHE_HOME``, or under ``~/.cache`` if it is not set
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "chili-pepper", "dependencies")
+
+
+def compute_requirements_key(requirements_path, runtime):
+    # type: (str, str) -> str
+    """Derive the key of the installed requirements
+
+    Requirements that are not pinned are hashed as written, so the cached directory keeps the versions pip resolved when it was installed.
+
+    Args:
+        requirements_path (str): The ``requirements.txt`` file
+        runtime (str): The AWS Lambda runtime, like ``python3.7``
+
+    Returns:
+        str: The hex encoded SHA-256 key
+    """
+    key_hash = hashlib.sha256()
+    for part in (
+        runtime,
+        # requirements are installed with the local interpreter, so their wheels depend on it
+        "{major}.{minor}".format(major=sys.version_info[0], minor=sys.version_info[1]),
+        sys.platform,
+        platform.machine(),
+    ):
+        key_hash.update(part.encode("utf8"))
+        key_hash.update(b"\0")
+    with open(str(requirements_path), "rb") as fh:
+        key_hash.update(fh.read())
+    return key_hash.hexdigest()
+
+
+def install_requirements(requirements_path, target_dir, cache_dir=None):
+    # type: (str, str, Optional[str]) -> None
+    """Install requirements into a directory with pip
+
+    Args:
+        requirements_path (str): The ``requirements.txt`` file
+        target_dir (str): The directory to install into
+        cache_dir (Optional[str]): The pip cache to use.  ``None`` uses pip's default cache.
+    """
+    # TODO gracefully handle requirements with -e
+    # https://github.com/UnitedIncome/serverless-python-requirements/issues/240
+    # https://github.com/nficano/python-lambda/blob/master/aws_lambda/aws_lambda.py#L417
+    pip_command = [sys.executable, "-m", "pip", "install", "-r", os.path.abspath(str(requirements_path)), "-t", str(target_dir), "--ignore-installed"]
+    if cache_dir is not None:
+        pip_command += ["--cache-dir", str(cache_dir)]
+    subprocess.check_call(pip_command)
+
+
+class DependencyCache:
+    """Directories of installed requirements, evicting the least recently used ones when they are over ``max_bytes``
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_DEPENDENCY_CACHE_MAX_BYTES):
+        # type: (str, Optional[int]) -> None
+        """
+        Args:
+            directory (str): The directory to keep the installed requirements and pip's wheel cache in
+            max_bytes (Optional[int]): The most bytes of installed requirements to keep.  pip's wheel cache does not count.
+                                       ``None`` does not limit the size.
+        """
+        self._directory = str(directory)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def directory(self):
+        # type: () -> str
+        """
+        Returns:
+            str: The directory the installed requirements are kept in
+        """
+        return self._directory
+
+    @property
+    def wheel_cache_dir(self):
+        # type: () -> str
+        """
+        Returns:
+            str: The directory pip caches downloaded and built wheels in
+        """
+        return os.path.join(self._directory, "wheels")
+
+    @property
+    def hits(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of times installed requirements were reused
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of times requirements had to be installed
+        """
+        return self._misses
+
+    @property
+    def evictions(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of installed requirements evicted to stay under ``max_bytes``
+        """
+        return self._evictions
+
+    def get_installed(self, requirements_path, runtime):
+        # type: (str, str) -> str
+        """Get a directory with the requirements installed, installing them if they are not cached
+
+        Args:
+            requirements_path (str): The ``requirements.txt`` file
+            runtime (str): The AWS Lambda runtime, like ``python3.7``
+
+        Returns:
+            str: The directory the requirements are installed in.  It must not be changed.
+        """
+        key = compute_requirements_key(requirements_path, runtime)
+        tree_path = os.path.join(self._get_trees_dir(), key)
+        with self._lock:
+            if os.path.isdir(tree_path):
+                self._hits += 1
+                # eviction goes by modification time, so touching the directory marks it as recently used
+                os.utime(tree_path, None)
+                self._logger.info("Reusing requirements installed in " + tree_path)
+                return tree_path
+            self._misses += 1
+
+        _makedirs(self._get_trees_dir())
+        # install next to the final location and rename it, so a concurrent deploy never reuses a partial install
+        temp_path = tempfile.mkdtemp(dir=self._get_trees_dir(), prefix=".tmp-")
+        try:
+            self._logger.info("Installing requirements into " + tree_path)
+            install_requirements(requirements_path, temp_path, cache_dir=self.wheel_cache_dir)
+            os.rename(temp_path, tree_path)
+        except Exception:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(tree_path):
+                raise
+            # another deploy installed the same requirements first, so the rename failed
+        if self._max_bytes is not None:
+            self._evict(keep=key)
+        return tree_path
+
+    def _evict(self, keep):
+        # type: (str) -> None
+        trees_dir = self._get_trees_dir()
+        with self._lock:
+            entries = list()
+            for name in os.listdir(trees_dir):
+                if name.startswith(".") or name == keep:
+                    continue
+                try:
+                    entries.append((os.stat(os.path.join(trees_dir, name)).st_mtime, _get_size(os.path.join(trees_dir, name)), name))
+                except OSError:
+                    continue
+            size = _get_size(os.path.join(trees_dir, keep)) + sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, name in sorted(entries):
+                if size <= self._max_bytes:
+                    break
+                self._logger.debug("Evicting installed requirements " + name + " from the dependency cache")
+                evict_path = os.path.join(trees_dir, ".evict-" + name)
+                try:
+                    # rename it first, so nothing reuses a half deleted directory
+                    os.rename(os.path.join(trees_dir, name), evict_path)
+                except OSError:
+                    # another process evicted it first
+                    continue
+                shutil.rmtree(evict_path, ignore_errors=True)
+                self._evictions += 1
+                size -= entry_size
+
+    def _get_trees_dir(self):
+        # type: () -> str
+        return os.path.join(self._directory, "installed")
+
+
+def _get_size(directory):
+    # type: (str) -> int
+    size = 0
+    for root, _, files in os.walk(directory):
+        for _file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, _file))
+            except OSError:
+                pass
+    return size
+
+
+def _makedirs(directory):
+    # type: (str) -> None
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
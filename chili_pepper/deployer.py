@@ -1,19 +1,32 @@
 import builtins
+import hashlib
+import json
 import logging
-import os
 import re
 import shutil
-import subprocess
-import sys
 import tempfile
-import zipfile
+import threading
+from contextlib import contextmanager
 
 import awacs
 import boto3
 import troposphere
 from awacs.aws import Allow, Principal, Statement
 from awacs.sts import AssumeRole
-from troposphere import GetAtt, Template, awslambda, iam
+from troposphere import GetAtt, Ref, Template, awslambda, iam
+
+from chili_pepper.archive import (
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_STORED_EXTENSIONS,
+    DIGEST_SUFFIX,
+    ZipBuilder,
+    get_reproducible_date_time,
+    read_digest,
+    write_digest,
+)
+from chili_pepper.build_cache import compute_build_key
+from chili_pepper.dependency_cache import compute_requirements_key, install_requirements
+from chili_pepper.exception import ChiliPepperException
 
 try:
     from pathlib import Path
@@ -21,7 +34,13 @@ except ImportError:
     from pathlib2 import Path
 
 try:
-    from typing import List, TYPE_CHECKING
+    from time import monotonic
+except ImportError:
+    # python2.7 does not have a monotonic clock
+    from time import time as monotonic
+
+try:
+    from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
     if TYPE_CHECKING:
         from app import TaskFunction
@@ -30,6 +49,98 @@ except ImportError:
     pass
 
 TITLE_SPLIT_REGEX_HACK = re.compile("[^a-zA-Z0-9]")
+FUNCTION_NAME_INVALID_CHARACTERS_REGEX = re.compile("[^a-zA-Z0-9_-]")
+LAMBDA_FUNCTION_RESOURCE_TYPE = "AWS::Lambda::Function"
+LAMBDA_FUNCTION_NAME_MAX_LENGTH = 64
+FUNCTION_MANIFEST_FILENAME = "chili_pepper_manifest.json"
+LAYER_LOGICAL_ID = "DependencyLayer"
+LAYER_PYTHON_DIR = "python"
+DIGEST_METADATA_KEY = "sha256"
+NO_UPDATES_MESSAGE = "No updates are to be performed"
+
+
+def load_function_manifest(manifest_path):
+    # type: (Path) -> Dict[str, Dict]
+    """Load the function manifest written by :py:meth:`Deployer.deploy`
+
+    Args:
+        manifest_path (Path): The location of the manifest file
+
+    Returns:
+        Dict[str, Dict]: The function details, keyed by the function handler string
+    """
+    with open(str(manifest_path), "r") as manifest_file:
+        return json.load(manifest_file)["functions"]
+
+
+class FunctionNotFoundError(ChiliPepperException):
+    """Raised when the deployed cloudformation stack does not have a task's lambda function
+    """
+
+    pass
+
+
+class FunctionIdCache:
+    """Thread-safe cache of cloudformation logical ids to physical lambda function names
+
+    The cache is filled for the whole stack at once, with a single paginated ``list_stack_resources`` call,
+    so that invoking a task does not need a cloudformation round trip every time.
+    Functions that are not in the stack are remembered as missing until the values expire or are invalidated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stack_name = None  # type: Optional[str]
+        self._physical_ids = dict()  # type: Dict[str, str]
+        self._expires_at = None  # type: Optional[float]
+
+        self._logger = logging.getLogger(__name__)
+
+    def get(self, cf_client, stack_name, logical_id, ttl):
+        # type: (object, str, str, Optional[float]) -> Optional[str]
+        """Look up the physical id of a lambda function in a cloudformation stack
+
+        Args:
+            cf_client: The boto3 cloudformation client to use if the cache needs to be filled
+            stack_name (str): The cloudformation stack name
+            logical_id (str): The logical id of the lambda function resource
+            ttl (Optional[float]): How many seconds the cached values are valid for. ``None`` means they never expire.
+
+        Returns:
+            Optional[str]: The physical id of the function, or ``None`` if the stack does not have the function
+        """
+        with self._lock:
+            if self._is_stale(stack_name):
+                self._fill(cf_client, stack_name, ttl)
+            return self._physical_ids.get(logical_id)
+
+    def invalidate(self):
+        # type: () -> None
+        """Forget all of the cached values, so the next lookup will re-read the stack"""
+        with self._lock:
+            self._stack_name = None
+            self._physical_ids = dict()
+            self._expires_at = None
+
+    def _is_stale(self, stack_name):
+        # type: (str) -> bool
+        if self._stack_name != stack_name:
+            return True
+        return self._expires_at is not None and monotonic() >= self._expires_at
+
+    def _fill(self, cf_client, stack_name, ttl):
+        # type: (object, str, Optional[float]) -> None
+        self._logger.debug("Filling the function id cache from cloudformation stack " + stack_name)
+        physical_ids = dict()
+        paginator = cf_client.get_paginator("list_stack_resources")
+        for page in paginator.paginate(StackName=stack_name):
+            for resource_summary in page["StackResourceSummaries"]:
+                if resource_summary["ResourceType"] == LAMBDA_FUNCTION_RESOURCE_TYPE and "PhysicalResourceId" in resource_summary:
+                    physical_ids[resource_summary["LogicalResourceId"]] = resource_summary["PhysicalResourceId"]
+
+        self._stack_name = stack_name
+        self._physical_ids = physical_ids
+        self._expires_at = monotonic() + ttl if ttl is not None else None
 
 
 class Deployer:
@@ -43,23 +154,41 @@ class Deployer:
 
         self._logger = logging.getLogger(__name__)
 
-    def deploy(self, dest, app_dir):
-        # type: (Path, Path) -> str
+    def deploy(self, dest, app_dir, use_build_cache=True):
+        # type: (Path, Path, bool) -> str
         """Deploys the chili-pepper app
 
         Args:
             dest (Path): The destination for the deployment package.
             app_dir (Path): The location of the application source code.
+            use_build_cache (bool): If ``True``, reuse the deployment package or installed requirements of an earlier deploy with the same inputs.
 
         Returns:
             str: The cloudformation template that was deployed to AWS.
         """
         self._logger.info("Starting to deploy")
 
-        deployment_package_path = self._create_deployment_package(dest, app_dir)
-        deployment_package_code_prop = self._send_deployment_package_to_s3(deployment_package_path)
-        cf_template = self._get_cloudformation_template(deployment_package_code_prop)
-        return self._deploy_template_to_cloudformation(cf_template)
+        # TODO un-hardcode the requirements.txt path
+        requirements_path = app_dir / "requirements.txt"
+        layer_content = None
+        if self._app.dependency_layer and requirements_path.exists():
+            layer_package_path, layer_hash = self._create_layer_package(dest, requirements_path, use_build_cache=use_build_cache)
+            layer_content = self._send_layer_package_to_s3(layer_package_path, layer_hash)
+
+        deployment_package_path = self._create_deployment_package(
+            dest, app_dir, use_build_cache=use_build_cache, include_requirements=layer_content is None
+        )
+        self._write_function_manifest(dest)
+        deployment_package_code_prop = self._send_deployment_package_to_s3(
+            deployment_package_path, digest=read_digest(str(deployment_package_path)) if self._is_reproducible() else None
+        )
+        cf_template = self._get_cloudformation_template(deployment_package_code_prop, layer_content=layer_content)
+        stack_id = self._deploy_template_to_cloudformation(cf_template)
+
+        # the physical function names may have changed, so do not trust anything that was looked up before this deploy
+        self._app.function_id_cache.invalidate()
+
+        return stack_id
 
     def get_function_id(self, python_function):
         # type: (builtins.function) -> str
@@ -70,97 +199,299 @@ class Deployer:
 
         Returns:
             str: The unique serverless function identification string
+
+        Raises:
+            FunctionNotFoundError: If the deployed stack does not have the function
         """
         # TODO it's a little weird that this lives on the deployer - I'm not sure what the right abstraction is
-        lambda_function_cf_logical_id = self._get_function_logical_id(self._get_function_handler_string(python_function))
+        function_handler = self._get_function_handler_string(python_function)
+
+        # if the function name is known without asking AWS, use it
+        function_manifest = self._app.function_manifest
+        if function_manifest is not None and function_manifest.get(function_handler, dict()).get("function_name") is not None:
+            return function_manifest[function_handler]["function_name"]
+        if self._app.deterministic_function_names:
+            return self._get_function_name(function_handler)
+
+        lambda_function_cf_logical_id = self._get_function_logical_id(function_handler)
         stack_name = self._get_stack_name()
 
-        cf_client = boto3.client("cloudformation")
-        describe_function_resource_response = cf_client.describe_stack_resource(StackName=stack_name, LogicalResourceId=lambda_function_cf_logical_id)
-        lambda_function_name = describe_function_resource_response["StackResourceDetail"]["PhysicalResourceId"]
+        cf_client = self._app.client_pool.client("cloudformation")
+        lambda_function_name = self._app.function_id_cache.get(cf_client, stack_name, lambda_function_cf_logical_id, self._app.function_id_cache_ttl)
+        if lambda_function_name is None:
+            raise FunctionNotFoundError(
+                "Stack {stack_name} has no lambda function {logical_id} for {function_handler}.  Has it been deployed since the task was added?".format(
+                    stack_name=stack_name, function_handler=function_handler, logical_id=lambda_function_cf_logical_id
+                )
+            )
 
         return lambda_function_name
 
-    def _create_deployment_package(self, dest, app_dir):
-        # type: (Path, Path) -> Path
+    def _create_deployment_package(self, dest, app_dir, use_build_cache=False, include_requirements=True):
+        # type: (Path, Path, bool, bool) -> Path
         """Builds a deployment package of the application
 
         Args:
             dest (Path): The deployment package destination
             app_dir (Path): The application source code location
+            use_build_cache (bool): If ``True``, reuse the package from the app's build cache when its inputs did not change,
+                                    and store newly built packages there.  Requirements are installed through the app's dependency cache.
+            include_requirements (bool): If ``False``, leave the requirements out, for when they are deployed in a layer
 
         Returns:
             Path: The location of the deployment package zipfile
         """
         output_filename = dest / (self._app.app_name + ".zip")
-        self._logger.info("Creating deployment package" + str(output_filename))
 
-        zfh = zipfile.ZipFile(str(output_filename), "w", zipfile.ZIP_DEFLATED)
+        build_key = None
+        if use_build_cache:
+            build_key = compute_build_key(
+                str(app_dir),
+                self._app.runtime,
+                self._get_function_manifest_json(),
+                exclude=self._get_deploy_outputs(dest),
+                options=["include_requirements={include_requirements}".format(include_requirements=include_requirements)] + self._get_zip_builder_options(),
+            )
+            if self._app.build_cache.get(build_key, str(output_filename)):
+                self._logger.info("Reusing the cached deployment package " + str(output_filename) + ", since nothing in it changed")
+                self._write_package_digest(output_filename)
+                return output_filename
+
+        self._logger.info("Creating deployment package" + str(output_filename))
 
-        def _add_directory_to_archive(src_dir):
-            for root, _, files in os.walk(src_dir):
-                for _file in files:
-                    file_path = os.path.join(root, _file)
-                    # do not put files under the app_dir inside the zip
-                    # without passing arcname, the archive will have the app_dir folder at its root
-                    zip_path = os.path.relpath(file_path, str(src_dir))
-                    self._logger.debug("Adding " + file_path + " to archive at " + zip_path)
-                    zfh.write(file_path, arcname=zip_path)
+        if output_filename.exists():
+            # the old package may be a hard link into the build cache, so it must not be overwritten in place
+            output_filename.unlink()
+        zip_builder = self._create_zip_builder()
 
         # TODO un-hardcode the requirements.txt path
         requirements_path = app_dir / "requirements.txt"
-        if requirements_path.exists():
-            requirements_temp_dir = tempfile.mkdtemp(prefix="chili-pepper-")
-            try:
-                self._logger.info(
-                    "Installing requirements into temporary directory " + requirements_temp_dir + "so they can be included in the deployment package"
-                )
-                # TODO gracefully handle requirements with -e
-                # https://github.com/UnitedIncome/serverless-python-requirements/issues/240
-                # https://github.com/nficano/python-lambda/blob/master/aws_lambda/aws_lambda.py#L417
-                subprocess.check_call(
-                    [sys.executable, "-m", "pip", "install", "-r", str(requirements_path.resolve()), "-t", requirements_temp_dir, "--ignore-installed"]
-                )
-                _add_directory_to_archive(requirements_temp_dir)
-                self._logger.info("Done installing requirements and adding them to the deployment package")
-            finally:
-                shutil.rmtree(requirements_temp_dir)
+        with self._installed_requirements(requirements_path if include_requirements else None, use_build_cache) as requirements_dir:
+            if requirements_dir is not None:
+                zip_builder.add_directory(requirements_dir)
 
-        self._logger.info("Adding application code to the deployment package")
-        _add_directory_to_archive(str(app_dir))
+            self._logger.info("Adding application code to the deployment package")
+            # do not put files under the app_dir inside the zip
+            zip_builder.add_directory(str(app_dir), exclude=self._get_deploy_outputs(dest))
 
-        zfh.close()
+            # the manifest lets tasks that delay other tasks find their functions without asking AWS
+            zip_builder.add_bytes(FUNCTION_MANIFEST_FILENAME, self._get_function_manifest_json().encode("utf8"))
+
+            zip_builder.write(str(output_filename))
 
         self._logger.info("Done creating deployment package " + str(output_filename))
 
+        if build_key is not None:
+            self._app.build_cache.put(build_key, str(output_filename))
+        self._write_package_digest(output_filename)
+
         return output_filename
 
-    def _send_deployment_package_to_s3(self, deployment_package_path):
-        # type: (Path) -> awslambda.Code
+    def _create_layer_package(self, dest, requirements_path, use_build_cache=False):
+        # type: (Path, Path, bool) -> Tuple[Path, str]
+        """Builds a lambda layer of the application's requirements
+
+        Args:
+            dest (Path): The layer zipfile destination
+            requirements_path (Path): The ``requirements.txt`` file
+            use_build_cache (bool): If ``True``, reuse the layer from the app's build cache when the requirements did not change
+
+        Returns:
+            Tuple[Path, str]: The location of the layer zipfile, and the hash that addresses it
+        """
+        layer_hash = compute_requirements_key(str(requirements_path), self._app.runtime)
+        output_filename = self._get_layer_package_path(dest)
+        if use_build_cache and self._app.build_cache.get(layer_hash, str(output_filename)):
+            self._logger.info("Reusing the cached layer " + str(output_filename) + ", since the requirements did not change")
+            self._write_package_digest(output_filename)
+            return output_filename, layer_hash
+
+        self._logger.info("Creating layer " + str(output_filename))
+        if output_filename.exists():
+            output_filename.unlink()
+        zip_builder = self._create_zip_builder()
+        with self._installed_requirements(requirements_path, use_build_cache) as requirements_dir:
+            # python runtimes put the layer's python directory on sys.path
+            zip_builder.add_directory(requirements_dir, prefix=LAYER_PYTHON_DIR)
+            zip_builder.write(str(output_filename))
+        self._logger.info("Done creating layer " + str(output_filename))
+
+        if use_build_cache:
+            self._app.build_cache.put(layer_hash, str(output_filename))
+        self._write_package_digest(output_filename)
+
+        return output_filename, layer_hash
+
+    def _get_layer_package_path(self, dest):
+        # type: (Path) -> Path
+        return dest / (self._app.app_name + "_layer.zip")
+
+    def _get_deploy_outputs(self, dest):
+        # type: (Path) -> List[str]
+        # the files a deploy writes to dest, which is often the app_dir itself, so they are neither build inputs nor package contents
+        output_filename = dest / (self._app.app_name + ".zip")
+        return [
+            str(output_filename),
+            str(output_filename) + DIGEST_SUFFIX,
+            str(self._get_function_manifest_path(dest)),
+            str(self._get_layer_package_path(dest)),
+            str(self._get_layer_package_path(dest)) + DIGEST_SUFFIX,
+        ]
+
+    def _create_zip_builder(self):
+        # type: () -> ZipBuilder
+        return ZipBuilder(
+            compression_level=self._app.conf.get("package_compression_level", DEFAULT_COMPRESSION_LEVEL),
+            stored_extensions=self._app.conf.get("package_stored_extensions", DEFAULT_STORED_EXTENSIONS),
+            max_workers=self._app.conf.get("package_build_workers"),
+            reproducible=self._is_reproducible(),
+        )
+
+    def _get_zip_builder_options(self):
+        # type: () -> List[str]
+        # the settings that change the bytes of a package, for its build cache key
+        return [
+            "compression_level={level}".format(level=self._app.conf.get("package_compression_level", DEFAULT_COMPRESSION_LEVEL)),
+            "stored_extensions={extensions}".format(extensions=sorted(self._app.conf.get("package_stored_extensions", DEFAULT_STORED_EXTENSIONS))),
+            "reproducible={reproducible}".format(reproducible=self._is_reproducible()),
+            "date_time={date_time}".format(date_time=get_reproducible_date_time() if self._is_reproducible() else None),
+        ]
+
+    def _is_reproducible(self):
+        # type: () -> bool
+        return self._app.conf.get("reproducible_packages") is True
+
+    def _write_package_digest(self, package_path):
+        # type: (Path) -> None
+        digest_path = Path(str(package_path) + DIGEST_SUFFIX)
+        if self._is_reproducible():
+            # the digest only identifies the package's contents if the same contents always make the same bytes
+            self._logger.info("Deployment package digest: " + write_digest(str(package_path)))
+        elif digest_path.exists():
+            # do not leave the digest of an older package next to this one
+            digest_path.unlink()
+
+    @contextmanager
+    def _installed_requirements(self, requirements_path, use_build_cache):
+        # type: (Optional[Path], bool) -> Iterator[Optional[str]]
+        """Install the requirements into a directory that lasts until the context exits
+
+        Args:
+            requirements_path (Optional[Path]): The ``requirements.txt`` file.  Nothing is installed if it is ``None`` or does not exist.
+            use_build_cache (bool): If ``True``, use the app's dependency cache
+
+        Returns:
+            Iterator[Optional[str]]: The directory the requirements are installed in, or ``None`` if there are none
+        """
+        if requirements_path is None or not requirements_path.exists():
+            yield None
+            return
+
+        if use_build_cache:
+            yield self._app.dependency_cache.get_installed(str(requirements_path), self._app.runtime)
+            return
+
+        requirements_temp_dir = tempfile.mkdtemp(prefix="chili-pepper-")
+        try:
+            self._logger.info("Installing requirements into temporary directory " + requirements_temp_dir + " so they can be included in the archive")
+            install_requirements(str(requirements_path), requirements_temp_dir)
+            yield requirements_temp_dir
+        finally:
+            shutil.rmtree(requirements_temp_dir)
+
+    def _get_function_manifest_json(self):
+        # type: () -> str
+        functions = dict()
+        for task_function in self._app.task_functions:
+            function_handler = self._get_function_handler_string(task_function.func)
+            functions[function_handler] = {
+                "logical_id": self._get_function_logical_id(function_handler),
+                # without deterministic names, cloudformation picks the name, so it is not known until the stack is deployed
+                "function_name": self._get_function_name(function_handler) if self._app.deterministic_function_names else None,
+            }
+        return json.dumps({"app_name": self._app.app_name, "stack_name": self._get_stack_name(), "functions": functions}, indent=2, sort_keys=True)
+
+    def _write_function_manifest(self, dest):
+        # type: (Path) -> Path
+        """Writes the function manifest next to the deployment package
+
+        Args:
+            dest (Path): The deployment package destination
+
+        Returns:
+            Path: The location of the manifest file
+        """
+        manifest_path = self._get_function_manifest_path(dest)
+        self._logger.info("Writing function manifest " + str(manifest_path))
+        with open(str(manifest_path), "w") as manifest_file:
+            manifest_file.write(self._get_function_manifest_json())
+        return manifest_path
+
+    def _get_function_manifest_path(self, dest):
+        # type: (Path) -> Path
+        return dest / (self._app.app_name + "_" + FUNCTION_MANIFEST_FILENAME)
+
+    def _send_deployment_package_to_s3(self, deployment_package_path, digest=None):
+        # type: (Path, Optional[str]) -> awslambda.Code
         # TODO verify that bucket has versioning enabled
-        # TODO do not push a new zip if it is identical to the current version
         # TODO do not push a new zip if it is identical to an old version - just use the old version
         s3_key = self._app.app_name + "_deployment_package.zip"
-        self._logger.info("Sending deployment package to s3.  bucket: '" + self._app.bucket_name + "'. key: '" + s3_key + "'.")
-
         s3_client = boto3.client("s3")
 
-        s3_response = s3_client.put_object(Bucket=self._app.bucket_name, Key=s3_key, Body=deployment_package_path.read_bytes())
+        if digest is not None:
+            try:
+                head_object_response = s3_client.head_object(Bucket=self._app.bucket_name, Key=s3_key)
+            except s3_client.exceptions.ClientError:
+                head_object_response = None
+            if (
+                head_object_response is not None
+                and head_object_response.get("Metadata", {}).get(DIGEST_METADATA_KEY) == digest
+                and head_object_response.get("VersionId") is not None
+            ):
+                # nothing changed, so keep using the current version, and cloudformation does not update the functions
+                self._logger.info("Deployment package is unchanged, not sending it to s3. bucket: '" + self._app.bucket_name + "'. key: '" + s3_key + "'.")
+                return awslambda.Code(S3Bucket=self._app.bucket_name, S3Key=s3_key, S3ObjectVersion=head_object_response["VersionId"])
+
+        self._logger.info("Sending deployment package to s3.  bucket: '" + self._app.bucket_name + "'. key: '" + s3_key + "'.")
+
+        put_object_kwargs = dict()
+        if digest is not None:
+            put_object_kwargs["Metadata"] = {DIGEST_METADATA_KEY: digest}
+        s3_response = s3_client.put_object(Bucket=self._app.bucket_name, Key=s3_key, Body=deployment_package_path.read_bytes(), **put_object_kwargs)
 
         self._logger.info("Done sending deployment package to s3. bucket: '" + self._app.bucket_name + "'. key: '" + s3_key + "'.")
 
         return awslambda.Code(S3Bucket=self._app.bucket_name, S3Key=s3_key, S3ObjectVersion=s3_response["VersionId"])
 
-    def _get_cloudformation_template(self, code_property):
-        # type: (awslambda.Code, List[str], str) -> Template
+    def _send_layer_package_to_s3(self, layer_package_path, layer_hash):
+        # type: (Path, str) -> awslambda.Content
+        # the key is content addressed, so a layer that is already in the bucket does not need to be sent again
+        s3_key = self._app.app_name + "_layers/" + layer_hash + ".zip"
+        s3_client = boto3.client("s3")
+        try:
+            s3_client.head_object(Bucket=self._app.bucket_name, Key=s3_key)
+            self._logger.info("Layer is already in s3.  bucket: '" + self._app.bucket_name + "'. key: '" + s3_key + "'.")
+        except s3_client.exceptions.ClientError:
+            self._logger.info("Sending layer to s3.  bucket: '" + self._app.bucket_name + "'. key: '" + s3_key + "'.")
+            s3_client.put_object(Bucket=self._app.bucket_name, Key=s3_key, Body=layer_package_path.read_bytes())
+
+        return awslambda.Content(S3Bucket=self._app.bucket_name, S3Key=s3_key)
+
+    def _get_cloudformation_template(self, code_property, layer_content=None):
+        # type: (awslambda.Code, Optional[awslambda.Content]) -> Template
         self._logger.info("Generating cloudformation template")
         template = Template()
 
         role = self._create_role()
         template.add_resource(role)
 
+        layer = None
+        if layer_content is not None:
+            layer = self._create_layer(layer_content, self._app.runtime)
+            template.add_resource(layer)
+
         for task_function in self._app.task_functions:
-            template.add_resource(self._create_lambda_function(code_property, task_function, role, self._app.runtime))
+            template.add_resource(self._create_lambda_function(code_property, task_function, role, self._app.runtime, layer=layer))
 
         self._logger.info("Done generating cloudformation template")
         return template
@@ -174,8 +505,31 @@ class Deployer:
         # type: (str) -> str
         return "".join(part.capitalize() for part in TITLE_SPLIT_REGEX_HACK.split(function_handler))  # TODO this will not work in general
 
-    def _create_lambda_function(self, code_property, task_function, role, runtime):
-        # type: (awslambda.Code, TaskFunction, iam.Role, str) -> None
+    def _get_function_name(self, function_handler):
+        # type: (str) -> str
+        """Builds a deterministic, app scoped lambda function name
+
+        Names that are too long for lambda are truncated, and given a hash suffix so they stay unique.
+        """
+        function_name = FUNCTION_NAME_INVALID_CHARACTERS_REGEX.sub("-", self._app.app_name + "-" + self._get_function_logical_id(function_handler))
+        if len(function_name) > LAMBDA_FUNCTION_NAME_MAX_LENGTH:
+            name_hash = hashlib.sha1(function_name.encode("utf8")).hexdigest()[:8]
+            function_name = function_name[: LAMBDA_FUNCTION_NAME_MAX_LENGTH - len(name_hash) - 1] + "-" + name_hash
+        return function_name
+
+    def _create_layer(self, layer_content, runtime):
+        # type: (awslambda.Content, str) -> awslambda.LayerVersion
+        # cloudformation only publishes a new layer version when the content, and so its hash, changes
+        return awslambda.LayerVersion(
+            LAYER_LOGICAL_ID,
+            Content=layer_content,
+            CompatibleRuntimes=[runtime],
+            LayerName=FUNCTION_NAME_INVALID_CHARACTERS_REGEX.sub("-", self._app.app_name + "-dependencies"),
+            Description="Requirements of the " + self._app.app_name + " Chili-Pepper app",
+        )
+
+    def _create_lambda_function(self, code_property, task_function, role, runtime, layer=None):
+        # type: (awslambda.Code, TaskFunction, iam.Role, str, Optional[awslambda.LayerVersion]) -> None
         # TODO add support for versioning
         function_handler = self._get_function_handler_string(task_function.func)
         title = self._get_function_logical_id(function_handler)
@@ -197,11 +551,19 @@ class Deployer:
             function_kwargs["MemorySize"] = task_function.memory
         if task_function.timeout is not None:
             function_kwargs["Timeout"] = task_function.timeout
+        if task_function.reserved_concurrency is not None:
+            function_kwargs["ReservedConcurrentExecutions"] = task_function.reserved_concurrency
+
+        if layer is not None:
+            # the reference resolves to the layer version's ARN
+            function_kwargs["Layers"] = [Ref(layer)]
 
         if task_function.activate_tracing:
             function_kwargs["TracingConfig"] = awslambda.TracingConfig(Mode="Active")
 
-        # TODO specify the function name?  Maybe we don't care?
+        if self._app.deterministic_function_names:
+            function_kwargs["FunctionName"] = self._get_function_name(function_handler)
+
         return awslambda.Function(title, **function_kwargs)
 
     def _create_role(self):
@@ -235,7 +597,7 @@ class Deployer:
         cf_client = boto3.client("cloudformation")
         # TODO start using s3 hosted templates, to have bigger stacks
         try:
-            cf_client.describe_stacks(StackName=cf_stack_name)
+            describe_stacks_response = cf_client.describe_stacks(StackName=cf_stack_name)
 
             stack_exists = True
         except cf_client.exceptions.ClientError:
@@ -243,7 +605,15 @@ class Deployer:
 
         if stack_exists:
             # stack exists
-            update_stack_response = cf_client.update_stack(StackName=cf_stack_name, TemplateBody=cf_template.to_json(), Capabilities=["CAPABILITY_IAM"])
+            try:
+                update_stack_response = cf_client.update_stack(StackName=cf_stack_name, TemplateBody=cf_template.to_json(), Capabilities=["CAPABILITY_IAM"])
+            except cf_client.exceptions.ClientError as e:
+                # an unchanged deployment package keeps its s3 version, so the template can be identical to the deployed one
+                if NO_UPDATES_MESSAGE not in str(e):
+                    raise
+                stack_id = describe_stacks_response["Stacks"][0]["StackId"]
+                self._logger.info("Cloudformation stack '" + cf_stack_name + "' with id " + stack_id + " is already up to date")
+                return stack_id
             stack_id = update_stack_response["StackId"]
             self._logger.info("Cloudformation stack '" + cf_stack_name + "' with id " + stack_id + " update in progress")
         else:
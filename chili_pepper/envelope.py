@@ -0,0 +1,97 @@
+from chili_pepper.exception import ChiliPepperException
+
+try:
+    from typing import Callable, List
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+# Events and return payloads that chili pepper wraps are dicts with this key.
+# Anything else is passed to, or returned from, the task function untouched.
+ENVELOPE_KEY = "__chili_pepper__"
+
+
+class TaskError(ChiliPepperException):
+    """Raised when a task function raised an exception, or timed out, while handling an event
+    """
+
+    pass
+
+
+def is_envelope(payload):
+    # type: (object) -> bool
+    """
+    Returns:
+        bool: ``True`` if the payload is a chili pepper envelope
+    """
+    return isinstance(payload, dict) and ENVELOPE_KEY in payload
+
+
+def make_batch_event(events):
+    # type: (List) -> dict
+    """Wrap several events into one event, so they can be handled by a single invocation
+
+    Args:
+        events (List): The events
+
+    Returns:
+        dict: The batch event
+    """
+    return {ENVELOPE_KEY: {"batch": True}, "events": events}
+
+
+def is_batch_event(event):
+    # type: (object) -> bool
+    """
+    Returns:
+        bool: ``True`` if the event was made with :py:func:`make_batch_event`
+    """
+    return is_envelope(event) and event[ENVELOPE_KEY].get("batch") is True
+
+
+def handle_batch_event(func, batch_event, context):
+    # type: (Callable, dict, object) -> dict
+    """Call the task function once for each event in a batch
+
+    An exception while handling one event does not stop the rest of the batch.
+
+    Args:
+        func (Callable): The task function
+        batch_event (dict): The batch event
+        context: The lambda context object
+
+    Returns:
+        dict: The batch return payload, with a result or an error for each event
+    """
+    results = list()
+    for event in batch_event["events"]:
+        try:
+            results.append({"result": func(event, context)})
+        except Exception as e:
+            results.append({"error": {"type": type(e).__name__, "message": str(e)}})
+    return {ENVELOPE_KEY: {"batch": True}, "results": results}
+
+
+def split_batch_payload(batch_payload, batch_size):
+    # type: (object, int) -> List
+    """Split the return payload of a batch invocation into the return payloads for each event
+
+    Args:
+        batch_payload: The return payload of the batch invocation
+        batch_size (int): The number of events in the batch
+
+    Returns:
+        List: The return payload, or a :py:class:`TaskError`, for each event
+    """
+    if not is_envelope(batch_payload) or "results" not in batch_payload or len(batch_payload["results"]) != batch_size:
+        # the function did not finish handling the batch - for example it timed out, or the handler raised an exception
+        batch_error = TaskError("The batch invocation did not return a result for each event: {payload}".format(payload=batch_payload))
+        return [batch_error] * batch_size
+
+    payloads = list()
+    for item in batch_payload["results"]:
+        if "error" in item:
+            payloads.append(TaskError("{type}: {message}".format(**item["error"])))
+        else:
+            payloads.append(item["result"])
+    return payloads
@@ -0,0 +1,138 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+from chili_pepper.exception import ChiliPepperException
+
+try:
+    from typing import Callable, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_MAX_IN_FLIGHT = 32
+DEFAULT_QUEUE_DEPTH = 1024
+
+
+class ExecutorFullError(ChiliPepperException):
+    """Raised when an invocation is rejected because the executor queue is full
+    """
+
+    pass
+
+
+class BackpressurePolicy(Enum):
+    """What to do when an invocation is submitted while the executor queue is full
+    """
+
+    BLOCK = "block"  #: Wait until there is room in the queue
+    REJECT = "reject"  #: Raise :py:class:`ExecutorFullError`
+
+
+class InvocationExecutor:
+    """Bounded executor for serverless function invocations
+
+    Invocations run on a fixed size thread pool, so fanning out many tasks does not start a thread per task.
+    At most ``max_in_flight`` invocations run at once, and at most ``queue_depth`` more wait for a free thread.
+    Submitting more than that either blocks or is rejected, depending on the backpressure policy.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, queue_depth=DEFAULT_QUEUE_DEPTH, backpressure_policy=BackpressurePolicy.BLOCK):
+        # type: (int, int, BackpressurePolicy) -> None
+        """
+        Args:
+            max_in_flight (int): The maximum number of invocations running at once
+            queue_depth (int): The maximum number of invocations waiting to run
+            backpressure_policy (BackpressurePolicy): What to do when the queue is full
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if queue_depth < 0:
+            raise ValueError("queue_depth must not be negative")
+
+        self._max_in_flight = max_in_flight
+        self._queue_depth = queue_depth
+        self._backpressure_policy = BackpressurePolicy(backpressure_policy)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="chili-pepper-invoke")
+        self._slots = threading.BoundedSemaphore(max_in_flight + queue_depth)
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def max_in_flight(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The maximum number of invocations running at once
+        """
+        return self._max_in_flight
+
+    @property
+    def queue_depth(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The maximum number of invocations waiting to run
+        """
+        return self._queue_depth
+
+    @property
+    def backpressure_policy(self):
+        # type: () -> BackpressurePolicy
+        """
+        Returns:
+            BackpressurePolicy: What happens when the queue is full
+        """
+        return self._backpressure_policy
+
+    def submit(self, fn, *args, **kwargs):
+        # type: (Callable, ...) -> Future
+        """Schedule ``fn(*args, **kwargs)`` to run on the executor
+
+        Raises:
+            ExecutorFullError: If the queue is full and the backpressure policy is ``REJECT``
+
+        Returns:
+            Future: The future for the call
+        """
+        if self._backpressure_policy == BackpressurePolicy.BLOCK:
+            self._slots.acquire()
+        elif not self._slots.acquire(False):
+            raise ExecutorFullError("{in_flight} invocations are already running or queued".format(in_flight=self._max_in_flight + self._queue_depth))
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        # type: (bool) -> None
+        """Stop accepting invocations, and release the threads once the running invocations are done
+
+        Args:
+            wait (bool): If ``True``, block until the running and queued invocations are done
+        """
+        self._executor.shutdown(wait=wait)
+
+
+_default_executor = None  # type: Optional[InvocationExecutor]
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    # type: () -> InvocationExecutor
+    """
+    Returns:
+        InvocationExecutor: The shared executor for invocations that are not started by an App
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = InvocationExecutor()
+    return _default_executor
@@ -0,0 +1,220 @@
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+try:
+    from typing import Callable, Dict, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BASE_MS = 50
+DEFAULT_RETRY_MAX_MS = 5000
+
+# https://docs.aws.amazon.com/lambda/latest/dg/API_Invoke.html#API_Invoke_Errors
+THROTTLE_ERROR_CODES = frozenset(["TooManyRequestsException", "ThrottlingException", "EC2ThrottledException"])
+
+
+def is_throttle_error(error):
+    # type: (Exception) -> bool
+    """
+    Returns:
+        bool: ``True`` if the error means AWS is throttling the caller
+    """
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLE_ERROR_CODES
+
+
+def is_server_error(error):
+    # type: (Exception) -> bool
+    """
+    Returns:
+        bool: ``True`` if the error is a 5xx error from AWS, which is worth retrying
+    """
+    return isinstance(error, ClientError) and error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit for one serverless function
+
+    Every successful invocation raises the limit a little (by ``1 / limit``, so about 1 for each limit's worth of invocations).
+    A throttled invocation halves it.  Only one throttle per "generation" of invocations lowers the limit,
+    so a burst of throttles from invocations that were all started under the old limit does not collapse it to 1.
+    """
+
+    def __init__(self, initial_limit, ceiling=None):
+        # type: (float, Optional[int]) -> None
+        """
+        Args:
+            initial_limit (float): The starting concurrency limit
+            ceiling (Optional[int]): The limit will never go above this
+        """
+        self._ceiling = ceiling
+        self._limit = self._clamp(float(initial_limit))
+        self._in_flight = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        # type: () -> float
+        """
+        Returns:
+            float: The current concurrency limit
+        """
+        return self._limit
+
+    @property
+    def in_flight(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of invocations holding a permit
+        """
+        return self._in_flight
+
+    def acquire(self):
+        # type: () -> int
+        """Wait until there is room under the limit, and take a permit
+
+        Returns:
+            int: The generation the permit was taken in, to pass to :py:meth:`release`
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return self._generation
+
+    def release(self, generation, throttled):
+        # type: (int, bool) -> None
+        """Give back a permit, and adjust the limit
+
+        Args:
+            generation (int): The generation returned by :py:meth:`acquire`
+            throttled (bool): ``True`` if the invocation was throttled
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                if generation == self._generation:
+                    self._limit = self._clamp(self._limit / 2)
+                    self._generation += 1
+            else:
+                self._limit = self._clamp(self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    def _clamp(self, limit):
+        # type: (float) -> float
+        if self._ceiling is not None:
+            limit = min(limit, float(self._ceiling))
+        return max(limit, 1.0)
+
+
+class InvocationGovernor:
+    """Adaptive concurrency control and throttle-aware retries for serverless function invocations
+
+    Each function gets its own :py:class:`AdaptiveLimit`, so invocations slow down when AWS starts throttling,
+    and speed back up when it stops.  Throttled invocations, and invocations that fail with a 5xx error,
+    are retried with exponential backoff and full jitter.
+    Calls that pass a fallback stop retrying once they have been throttled ``fallback_after_throttles`` times, and call the fallback instead.
+    """
+
+    def __init__(
+        self,
+        initial_concurrency,  # type: int
+        max_retries=DEFAULT_MAX_RETRIES,  # type: int
+        retry_base_ms=DEFAULT_RETRY_BASE_MS,  # type: float
+        retry_max_ms=DEFAULT_RETRY_MAX_MS,  # type: float
+        fallback_after_throttles=None,  # type: Optional[int]
+    ):
+        # type: (...) -> None
+        """
+        Args:
+            initial_concurrency (int): The starting concurrency limit for each function
+            max_retries (int): The maximum number of times to retry an invocation
+            retry_base_ms (float): The backoff before the first retry is up to this many milliseconds.  It doubles for each retry.
+            retry_max_ms (float): The backoff is never more than this many milliseconds
+            fallback_after_throttles (Optional[int]): How many times a call with a fallback is throttled before the fallback is called.
+                                                      ``None`` only calls the fallback once the retries run out.
+        """
+        self._initial_concurrency = initial_concurrency
+        self._max_retries = max_retries
+        self._retry_base_ms = retry_base_ms
+        self._retry_max_ms = retry_max_ms
+        self._fallback_after_throttles = fallback_after_throttles
+
+        self._lock = threading.Lock()
+        self._limits = dict()  # type: Dict[str, AdaptiveLimit]
+
+        self._logger = logging.getLogger(__name__)
+
+    def limit(self, function_name, ceiling=None):
+        # type: (str, Optional[int]) -> AdaptiveLimit
+        """
+        Args:
+            function_name (str): The serverless function name
+            ceiling (Optional[int]): The highest the function's limit may go, like its reserved concurrency
+
+        Returns:
+            AdaptiveLimit: The concurrency limit for the function
+        """
+        with self._lock:
+            if function_name not in self._limits:
+                self._limits[function_name] = AdaptiveLimit(self._initial_concurrency, ceiling=ceiling)
+            return self._limits[function_name]
+
+    def call(self, function_name, invoke, ceiling=None, deadline=None, fallback=None):
+        # type: (str, Callable[[], object], Optional[int], Optional[float], Optional[Callable[[], object]]) -> object
+        """Call ``invoke`` under the function's concurrency limit, retrying throttles and server errors
+
+        Args:
+            function_name (str): The serverless function name
+            invoke (Callable[[], object]): Invokes the function
+            ceiling (Optional[int]): The highest the function's limit may go, like its reserved concurrency
+            deadline (Optional[float]): Do not retry if the backoff would end after this time, in seconds since the epoch
+            fallback (Optional[Callable[[], object]]): Called instead of retrying, when the function keeps being throttled
+
+        Returns:
+            The return value of ``invoke``, or of ``fallback``
+        """
+        adaptive_limit = self.limit(function_name, ceiling=ceiling)
+        attempt = 0
+        throttles = 0
+        while True:
+            generation = adaptive_limit.acquire()
+            try:
+                response = invoke()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                adaptive_limit.release(generation, throttled=throttled)
+                if throttled:
+                    throttles += 1
+                    if fallback is not None and (
+                        attempt >= self._max_retries or (self._fallback_after_throttles is not None and throttles >= self._fallback_after_throttles)
+                    ):
+                        # the fallback runs outside of the concurrency limit, since it does not invoke the function
+                        return fallback()
+                if not (throttled or is_server_error(e)) or attempt >= self._max_retries:
+                    raise
+                backoff_seconds = self._get_backoff_ms(attempt) / 1000.0
+                if deadline is not None and time.time() + backoff_seconds >= deadline:
+                    raise
+                self._logger.info(
+                    "Invocation of {function_name} failed with {error}, retrying in {backoff:.3f}s".format(
+                        function_name=function_name, error=e, backoff=backoff_seconds
+                    )
+                )
+                time.sleep(backoff_seconds)
+                attempt += 1
+            else:
+                adaptive_limit.release(generation, throttled=False)
+                return response
+
+    def _get_backoff_ms(self, attempt):
+        # type: (int) -> float
+        # "full jitter" from https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+        return random.uniform(0, min(self._retry_max_ms, self._retry_base_ms * 2 ** attempt))
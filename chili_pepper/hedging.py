@@ -0,0 +1,301 @@
+"""Hedged invocations for idempotent tasks
+
+When an invocation has not answered after a threshold, a duplicate is started, and whichever finishes first is used.
+This cuts the tail latency that comes from cold starts and slow containers, at the cost of some extra invocations.
+The threshold is a fixed number of milliseconds, or a percentile of the function's recent latencies,
+and a budget caps how many invocations may be duplicated.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from chili_pepper.exception import ChiliPepperException
+
+try:
+    from typing import Callable, Deque, List, Optional, Tuple, Union
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_HEDGE_MAX_RATIO = 0.1
+DEFAULT_LATENCY_WINDOW = 1000
+DEFAULT_MIN_LATENCY_SAMPLES = 20
+# how many hedges can be saved up while no invocation needs one
+DEFAULT_HEDGE_BURST = 10
+
+_PERCENTILE_PATTERN = re.compile(r"^p(\d{1,2}(\.\d+)?)$")
+_INVALID_THRESHOLD_MESSAGE = "hedge_after_ms must be a number of milliseconds, or a percentile like 'p95', not {value!r}"
+
+
+class InvalidHedgeThreshold(ChiliPepperException):
+    """Raised when ``hedge_after_ms`` is not a number of milliseconds or a percentile like ``"p95"``
+    """
+
+    pass
+
+
+class LatencyTracker:
+    """Keeps the most recent invocation latencies of a function, to compute percentiles of them
+    """
+
+    def __init__(self, window=DEFAULT_LATENCY_WINDOW, min_samples=DEFAULT_MIN_LATENCY_SAMPLES):
+        # type: (int, int) -> None
+        """
+        Args:
+            window (int): How many of the most recent latencies to keep
+            min_samples (int): Percentiles are not computed until there are this many latencies
+        """
+        self._min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)  # type: Deque[float]
+        self._sorted = None  # type: Optional[List[float]]
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def record(self, seconds):
+        # type: (float) -> None
+        """
+        Args:
+            seconds (float): How long an invocation took
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+            self._sorted = None
+
+    def percentile(self, percent):
+        # type: (float) -> Optional[float]
+        """
+        Args:
+            percent (float): The percentile, like ``95``
+
+        Returns:
+            Optional[float]: The latency in seconds, or ``None`` if there are not enough latencies yet
+        """
+        with self._lock:
+            if len(self._latencies) < self._min_samples:
+                return None
+            if self._sorted is None:
+                # sorting is only redone after new latencies come in, not on every lookup
+                self._sorted = sorted(self._latencies)
+            index = min(len(self._sorted) - 1, int(len(self._sorted) * percent / 100.0))
+            return self._sorted[index]
+
+
+class HedgeBudget:
+    """Token bucket that caps hedges to a fraction of invocations
+
+    Every invocation adds ``max_ratio`` of a token, up to ``burst`` tokens, and every hedge spends a whole one.
+    The bucket starts full, so the first slow invocations can be hedged right away.
+    """
+
+    def __init__(self, max_ratio=DEFAULT_HEDGE_MAX_RATIO, burst=DEFAULT_HEDGE_BURST):
+        # type: (float, float) -> None
+        """
+        Args:
+            max_ratio (float): The most hedges per invocation, like ``0.1`` for one hedge every 10 invocations
+            burst (float): The most tokens that can be saved up
+        """
+        self._max_ratio = max_ratio
+        self._burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+
+    def deposit(self):
+        # type: () -> None
+        """Add the tokens for one invocation"""
+        with self._lock:
+            self._tokens = min(self._burst, self._tokens + self._max_ratio)
+
+    def try_spend(self):
+        # type: () -> bool
+        """
+        Returns:
+            bool: ``True`` if there was a token for a hedge, and it was spent
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class HedgePolicy:
+    """When a function's invocations are hedged, and how often hedging paid off
+    """
+
+    def __init__(self, hedge_after_ms, max_ratio=DEFAULT_HEDGE_MAX_RATIO, latency_tracker=None):
+        # type: (Union[float, str], float, Optional[LatencyTracker]) -> None
+        """
+        Args:
+            hedge_after_ms (Union[float, str]): Milliseconds to wait before hedging, or a percentile of recent latencies like ``"p95"``
+            max_ratio (float): The most hedges per invocation
+            latency_tracker (Optional[LatencyTracker]): Where latencies are recorded.  A new tracker is made if not passed.
+
+        Raises:
+            InvalidHedgeThreshold: If ``hedge_after_ms`` is not a number or a percentile
+        """
+        self._hedge_after_seconds, self._percentile = _parse_hedge_after(hedge_after_ms)
+        self._budget = HedgeBudget(max_ratio=max_ratio)
+        self._latency_tracker = latency_tracker if latency_tracker is not None else LatencyTracker()
+
+        self._lock = threading.Lock()
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._abandoned = 0
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def latency_tracker(self):
+        # type: () -> LatencyTracker
+        """
+        Returns:
+            LatencyTracker: The recent latencies of the function
+        """
+        return self._latency_tracker
+
+    @property
+    def hedges(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of duplicate invocations started
+        """
+        return self._hedges
+
+    @property
+    def hedge_wins(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of times a duplicate invocation finished first
+        """
+        return self._hedge_wins
+
+    @property
+    def abandoned(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of invocations that were still running when the other one of their pair finished.
+            They run to completion in AWS Lambda, and are billed, but their return payload is thrown away.
+        """
+        return self._abandoned
+
+    def get_delay(self):
+        # type: () -> Optional[float]
+        """
+        Returns:
+            Optional[float]: How many seconds to wait before hedging an invocation,
+            or ``None`` to not hedge, since there are not enough latencies to compute the percentile yet
+        """
+        if self._percentile is not None:
+            return self._latency_tracker.percentile(self._percentile)
+        return self._hedge_after_seconds
+
+    def on_invocation(self):
+        # type: () -> None
+        """Record that an invocation was started, earning a fraction of a hedge"""
+        self._budget.deposit()
+
+    def try_hedge(self):
+        # type: () -> bool
+        """
+        Returns:
+            bool: ``True`` if the budget allows another hedge, and it was counted
+        """
+        if not self._budget.try_spend():
+            self._logger.debug("Not hedging, the hedge budget is spent")
+            return False
+        with self._lock:
+            self._hedges += 1
+        return True
+
+    def record_latency(self, seconds):
+        # type: (float) -> None
+        """
+        Args:
+            seconds (float): How long an invocation took
+        """
+        self._latency_tracker.record(seconds)
+
+    def record_finish(self, hedge_won, abandoned):
+        # type: (bool, bool) -> None
+        """
+        Args:
+            hedge_won (bool): ``True`` if the duplicate invocation finished first
+            abandoned (bool): ``True`` if the other invocation was still running
+        """
+        with self._lock:
+            if hedge_won:
+                self._hedge_wins += 1
+            if abandoned:
+                self._abandoned += 1
+
+
+def _parse_hedge_after(hedge_after_ms):
+    # type: (Union[float, str]) -> Tuple[Optional[float], Optional[float]]
+    if isinstance(hedge_after_ms, str):
+        match = _PERCENTILE_PATTERN.match(hedge_after_ms)
+        if match is None:
+            raise InvalidHedgeThreshold(_INVALID_THRESHOLD_MESSAGE.format(value=hedge_after_ms))
+        return None, float(match.group(1))
+    if isinstance(hedge_after_ms, bool) or not isinstance(hedge_after_ms, (int, float)) or hedge_after_ms < 0:
+        raise InvalidHedgeThreshold(_INVALID_THRESHOLD_MESSAGE.format(value=hedge_after_ms))
+    return hedge_after_ms / 1000.0, None
+
+
+class _Scheduler:
+    """Runs callbacks after a delay, on a single daemon thread
+
+    Hedging needs a timer for every invocation, and micro-batching one for every batch window,
+    and a thread for each of them would be too many threads.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._calls = list()  # type: List[Tuple[float, int, Callable[[], None]]]
+        self._counter = 0
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def call_later(self, delay, fn):
+        # type: (float, Callable[[], None]) -> None
+        """
+        Args:
+            delay (float): How many seconds to wait
+            fn (Callable[[], None]): The callback.  It must be quick, since it runs on the scheduler's thread.
+        """
+        with self._condition:
+            # the counter breaks ties, so callbacks are never compared
+            self._counter += 1
+            heapq.heappush(self._calls, (time.time() + delay, self._counter, fn))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chili-pepper-scheduler")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        # type: () -> None
+        while True:
+            with self._condition:
+                while not self._calls or self._calls[0][0] > time.time():
+                    self._condition.wait(self._calls[0][0] - time.time() if self._calls else None)
+                _, _, fn = heapq.heappop(self._calls)
+            try:
+                fn()
+            except Exception:
+                logging.getLogger(__name__).exception("Scheduled callback failed")
+
+
+_scheduler = _Scheduler()
+
+
+def call_later(delay, fn):
+    # type: (float, Callable[[], None]) -> None
+    """Call ``fn`` on the shared scheduler thread, after ``delay`` seconds"""
+    _scheduler.call_later(delay, fn)
@@ -64,7 +64,7 @@ class CLI:
         app = self._load_app(args.app, args.app_dir)
         deployer = Deployer(app)
 
-        deployer.deploy(dest=Path(args.deployment_package_dir), app_dir=Path(args.app_dir))
+        deployer.deploy(dest=Path(args.deployment_package_dir), app_dir=Path(args.app_dir), use_build_cache=not getattr(args, "no_cache", False))
 
 
 def main():
@@ -89,6 +89,9 @@ def main():
         "--app-dir", type=str, required=True, help="The directory holding all the code that needs to be included in the serverless function bundle"
     )
     deploy_parser.add_argument("--deployment-package-dir", "-d", type=str, default=os.getcwd(), help="The directory to put the deployment package zip")
+    deploy_parser.add_argument(
+        "--no-cache", action="store_true", help="Build the deployment package and install its requirements from scratch, instead of reusing cached ones"
+    )
     # TODO add a deploy destination argument?
 
     args = parser.parse_args()
@@ -0,0 +1,222 @@
+"""Claim-check offload of large payloads through S3
+
+Lambda caps the size of invocation and return payloads, and big payloads make every invocation slow.
+Payloads over a threshold are uploaded to S3, and only a small reference to the S3 object is sent through lambda.
+"""
+import json
+import logging
+import uuid
+from io import BytesIO
+
+from chili_pepper.envelope import ENVELOPE_KEY, is_envelope
+
+try:
+    from typing import Callable, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+OFFLOAD_KEY_PREFIX = "chili_pepper_offload/"
+
+
+def make_s3_reference(bucket, key):
+    # type: (str, str) -> dict
+    """
+    Args:
+        bucket (str): The S3 bucket holding the payload
+        key (str): The S3 key of the payload
+
+    Returns:
+        dict: The envelope that is sent instead of the payload
+    """
+    return {ENVELOPE_KEY: {"s3": {"bucket": bucket, "key": key}}}
+
+
+def is_s3_reference(payload):
+    # type: (object) -> bool
+    """
+    Returns:
+        bool: ``True`` if the payload was made with :py:func:`make_s3_reference`
+    """
+    return is_envelope(payload) and "s3" in payload[ENVELOPE_KEY]
+
+
+def open_s3_reference(s3_client, reference):
+    # type: (object, dict) -> object
+    """Open an offloaded payload for streaming
+
+    Args:
+        s3_client: The boto3 s3 client
+        reference (dict): The reference made by :py:func:`make_s3_reference`
+
+    Returns:
+        A binary file-like object that reads the JSON encoded payload from S3
+    """
+    location = reference[ENVELOPE_KEY]["s3"]
+    return s3_client.get_object(Bucket=location["bucket"], Key=location["key"])["Body"]
+
+
+def load_s3_reference(s3_client, reference):
+    # type: (object, dict) -> object
+    """Download and decode an offloaded payload
+
+    Args:
+        s3_client: The boto3 s3 client
+        reference (dict): The reference made by :py:func:`make_s3_reference`
+
+    Returns:
+        The payload
+    """
+    body = open_s3_reference(s3_client, reference)
+    try:
+        return json.load(body)
+    finally:
+        body.close()
+
+
+class PayloadOffloader:
+    """Uploads payloads that are too big to send through lambda to S3
+    """
+
+    def __init__(self, get_s3_client, bucket_name, key_prefix, event_threshold=None, result_threshold=None, array_threshold=None):
+        # type: (Callable[[], object], str, str, Optional[int], Optional[int], Optional[int]) -> None
+        """
+        Args:
+            get_s3_client (Callable[[], object]): Returns the boto3 s3 client to upload with
+            bucket_name (str): The S3 bucket to upload payloads to
+            key_prefix (str): The prefix of the S3 keys of uploaded payloads
+            event_threshold (Optional[int]): Events bigger than this many bytes are offloaded.  ``None`` never offloads events.
+            result_threshold (Optional[int]): Return payloads bigger than this many bytes are offloaded.  ``None`` never offloads return payloads.
+            array_threshold (Optional[int]): Array buffers bigger than this many bytes are offloaded.  ``None`` never offloads array buffers.
+        """
+        self._get_s3_client = get_s3_client
+        self._bucket_name = bucket_name
+        self._key_prefix = key_prefix
+        self._event_threshold = event_threshold
+        self._result_threshold = result_threshold
+        self._array_threshold = array_threshold
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def bucket_name(self):
+        # type: () -> str
+        """
+        Returns:
+            str: The S3 bucket payloads are uploaded to
+        """
+        return self._bucket_name
+
+    @property
+    def key_prefix(self):
+        # type: () -> str
+        """
+        Returns:
+            str: The prefix of the S3 keys of uploaded payloads
+        """
+        return self._key_prefix
+
+    @property
+    def event_threshold(self):
+        # type: () -> Optional[int]
+        """
+        Returns:
+            Optional[int]: Events bigger than this many bytes are offloaded
+        """
+        return self._event_threshold
+
+    @property
+    def result_threshold(self):
+        # type: () -> Optional[int]
+        """
+        Returns:
+            Optional[int]: Return payloads bigger than this many bytes are offloaded
+        """
+        return self._result_threshold
+
+    @property
+    def array_threshold(self):
+        # type: () -> Optional[int]
+        """
+        Returns:
+            Optional[int]: Array buffers bigger than this many bytes are offloaded
+        """
+        return self._array_threshold
+
+    def get_s3_client(self):
+        # type: () -> object
+        """
+        Returns:
+            The boto3 s3 client payloads are uploaded and downloaded with
+        """
+        return self._get_s3_client()
+
+    def offload_event(self, payload):
+        # type: (str) -> str
+        """Offload an invocation payload to S3, if it is too big
+
+        Args:
+            payload (str): The serialized event
+
+        Returns:
+            str: The invocation payload, or a reference to it if it was offloaded
+        """
+        if self._event_threshold is None:
+            return payload
+        payload_bytes = payload.encode("utf8")
+        if len(payload_bytes) <= self._event_threshold:
+            return payload
+        return json.dumps(make_s3_reference(self._bucket_name, self._upload(payload_bytes, "events", "json")))
+
+    def dump_result(self, result):
+        # type: (object) -> object
+        """Offload a task's return payload to S3, if it is too big
+
+        Args:
+            result: The return payload of the task function
+
+        Returns:
+            The return payload, or a reference to it if it was offloaded
+        """
+        if self._result_threshold is None:
+            return result
+        payload_bytes = json.dumps(result).encode("utf8")
+        if len(payload_bytes) <= self._result_threshold:
+            return result
+        return make_s3_reference(self._bucket_name, self._upload(payload_bytes, "results", "json"))
+
+    def upload_buffer(self, buffer):
+        # type: (memoryview) -> dict
+        """Upload the raw buffer of an array
+
+        Args:
+            buffer (memoryview): The buffer
+
+        Returns:
+            dict: The S3 location of the buffer, to pass to :py:meth:`download_buffer`
+        """
+        return {"bucket": self._bucket_name, "key": self._upload(buffer, "arrays", "bin")}
+
+    def download_buffer(self, location):
+        # type: (dict) -> bytes
+        """Download the raw buffer of an array uploaded by :py:meth:`upload_buffer`
+
+        Args:
+            location (dict): The S3 location of the buffer
+
+        Returns:
+            bytes: The buffer
+        """
+        body = self.get_s3_client().get_object(Bucket=location["bucket"], Key=location["key"])["Body"]
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def _upload(self, data, kind, extension):
+        # type: (bytes, str, str) -> str
+        key = "{prefix}{kind}/{id}.{extension}".format(prefix=self._key_prefix, kind=kind, id=uuid.uuid4(), extension=extension)
+        self._logger.debug("Offloading {size} bytes to s3://{bucket}/{key}".format(size=len(data), bucket=self._bucket_name, key=key))
+        # upload_fileobj switches to a multipart upload for big payloads
+        self.get_s3_client().upload_fileobj(BytesIO(data), self._bucket_name, key)
+        return key
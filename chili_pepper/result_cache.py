@@ -0,0 +1,362 @@
+"""Result caches for tasks that are pure functions of their event
+
+A cached task's return payload is stored under a key derived from the task and its serialized event.
+Calling ``delay`` again with the same event returns the stored payload without invoking the serverless function.
+
+Caches store encoded bytes, so every cache hit decodes a fresh copy of the payload,
+and changing a returned value does not change what is cached.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from chili_pepper.arrays import encode_arrays
+
+try:
+    from typing import Callable, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def make_cache_key(task_name, event, serializer=None):
+    # type: (str, object, Optional[object]) -> str
+    """Derive a cache key from a task and its event
+
+    Events are serialized as JSON with sorted keys, so equal events get the same key no matter how their dicts were built.
+    Events that are not JSON serializable are serialized with ``serializer``.
+
+    Args:
+        task_name (str): A name that is unique to the task, like its module and function name
+        event: The event
+        serializer: A :py:class:`chili_pepper.serializer.Serializer` for events that JSON can not serialize
+
+    Returns:
+        str: The hex encoded SHA-256 cache key
+    """
+    try:
+        event_bytes = json.dumps(encode_arrays(event), sort_keys=True, separators=(",", ":")).encode("utf8")
+    except TypeError:
+        if serializer is None:
+            raise
+        event_bytes = serializer.dumps(event)
+    key_hash = hashlib.sha256(task_name.encode("utf8"))
+    key_hash.update(b"\0")
+    key_hash.update(event_bytes)
+    return key_hash.hexdigest()
+
+
+class ResultCache:
+    """Base class for result caches
+
+    Subclasses store and look up encoded return payloads by key, by implementing :py:meth:`_get` and :py:meth:`_set`.
+    Call :py:meth:`_record_eviction` when an entry is evicted to make room.
+    """
+
+    def __init__(self, ttl=None):
+        # type: (Optional[float]) -> None
+        """
+        Args:
+            ttl (Optional[float]): How many seconds entries are kept for.  ``None`` keeps them until they are evicted.
+        """
+        self._ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def ttl(self):
+        # type: () -> Optional[float]
+        """
+        Returns:
+            Optional[float]: How many seconds entries are kept for
+        """
+        return self._ttl
+
+    @property
+    def hits(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of lookups that found an entry
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of lookups that did not find an entry, or found an expired one
+        """
+        return self._misses
+
+    @property
+    def evictions(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of entries evicted to stay under the size limits
+        """
+        return self._evictions
+
+    def get(self, key):
+        # type: (str) -> Optional[bytes]
+        """
+        Args:
+            key (str): The cache key
+
+        Returns:
+            Optional[bytes]: The encoded return payload, or ``None`` on a cache miss
+        """
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return value
+
+    def set(self, key, value):
+        # type: (str, bytes) -> None
+        """
+        Args:
+            key (str): The cache key
+            value (bytes): The encoded return payload
+        """
+        self._set(key, value)
+
+    def _get(self, key):
+        # type: (str) -> Optional[bytes]
+        raise NotImplementedError()
+
+    def _set(self, key, value):
+        # type: (str, bytes) -> None
+        raise NotImplementedError()
+
+    def _record_eviction(self):
+        # type: () -> None
+        with self._stats_lock:
+            self._evictions += 1
+
+    def _expires_at(self):
+        # type: () -> Optional[float]
+        return time.time() + self._ttl if self._ttl is not None else None
+
+
+class LruResultCache(ResultCache):
+    """In-process cache that evicts the least recently used entries
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None, ttl=None):
+        # type: (Optional[int], Optional[int], Optional[float]) -> None
+        """
+        Args:
+            max_entries (Optional[int]): The most entries to keep.  ``None`` does not limit the number of entries.
+            max_bytes (Optional[int]): The most bytes of encoded return payloads to keep.  ``None`` does not limit the size.
+            ttl (Optional[float]): How many seconds entries are kept for.  ``None`` keeps them until they are evicted.
+        """
+        ResultCache.__init__(self, ttl=ttl)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The total bytes of the cached return payloads
+        """
+        return self._size
+
+    def _get(self, key):
+        # type: (str) -> Optional[bytes]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                return None
+            # re-insert the entry, to mark it as the most recently used
+            self._entries[key] = self._entries.pop(key)
+            return value
+
+    def _set(self, key, value):
+        # type: (str, bytes) -> None
+        if self._max_bytes is not None and len(value) > self._max_bytes:
+            # it would evict everything else, and still not fit
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._expires_at())
+            self._size += len(value)
+            while (self._max_entries is not None and len(self._entries) > self._max_entries) or (
+                self._max_bytes is not None and self._size > self._max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self._record_eviction()
+
+    def _remove(self, key):
+        # type: (str) -> None
+        # must be called while holding self._lock
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+
+class DiskResultCache(ResultCache):
+    """Cache that keeps entries as files in a directory, so they are shared between processes and survive restarts
+
+    When the cache is over ``max_bytes``, the oldest entries are evicted first.
+    It also works as a local stand-in for :py:class:`S3ResultCache`.
+    """
+
+    def __init__(self, directory, max_bytes=None, ttl=None):
+        # type: (str, Optional[int], Optional[float]) -> None
+        """
+        Args:
+            directory (str): The directory to keep the entries in.  It is created if it does not exist.
+            max_bytes (Optional[int]): The most bytes of encoded return payloads to keep.  ``None`` does not limit the size.
+            ttl (Optional[float]): How many seconds entries are kept for.  ``None`` keeps them until they are evicted.
+        """
+        ResultCache.__init__(self, ttl=ttl)
+        self._directory = str(directory)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(self._directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @property
+    def directory(self):
+        # type: () -> str
+        """
+        Returns:
+            str: The directory the entries are kept in
+        """
+        return self._directory
+
+    def _get(self, key):
+        # type: (str) -> Optional[bytes]
+        path = self._get_path(key)
+        try:
+            if self._ttl is not None and os.path.getmtime(path) + self._ttl < time.time():
+                self._remove(path)
+                return None
+            with open(path, "rb") as fh:
+                return fh.read()
+        except (IOError, OSError):
+            return None
+
+    def _set(self, key, value):
+        # type: (str, bytes) -> None
+        if self._max_bytes is not None and len(value) > self._max_bytes:
+            return
+        # write to a temporary file and rename it, so other processes never read a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(value)
+        # os.replace overwrites an existing entry on every platform, but python2.7 only has os.rename
+        getattr(os, "replace", os.rename)(temp_path, self._get_path(key))
+        if self._max_bytes is not None:
+            self._evict()
+
+    def _evict(self):
+        # type: () -> None
+        with self._lock:
+            entries = list()
+            for name in os.listdir(self._directory):
+                if name.startswith("."):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self._directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, name in sorted(entries):
+                if size <= self._max_bytes:
+                    break
+                self._remove(os.path.join(self._directory, name))
+                self._record_eviction()
+                size -= entry_size
+
+    def _remove(self, path):
+        # type: (str) -> None
+        try:
+            os.remove(path)
+        except OSError:
+            # another process removed it first
+            pass
+
+    def _get_path(self, key):
+        # type: (str) -> str
+        return os.path.join(self._directory, key)
+
+
+class S3ResultCache(ResultCache):
+    """Cache that keeps entries in S3, so they are shared by every process that uses the bucket
+
+    Expired entries are treated as misses, but are not deleted.  Add an S3 lifecycle rule for the prefix to clean them up,
+    and to limit how much the cache stores.
+    """
+
+    def __init__(self, get_s3_client, bucket_name, key_prefix, ttl=None):
+        # type: (Callable[[], object], str, str, Optional[float]) -> None
+        """
+        Args:
+            get_s3_client (Callable[[], object]): Returns the boto3 s3 client to use
+            bucket_name (str): The S3 bucket to keep the entries in
+            key_prefix (str): The prefix of the S3 keys of the entries
+            ttl (Optional[float]): How many seconds entries are kept for.  ``None`` keeps them forever.
+        """
+        ResultCache.__init__(self, ttl=ttl)
+        self._get_s3_client = get_s3_client
+        self._bucket_name = bucket_name
+        self._key_prefix = key_prefix
+
+    def _get(self, key):
+        # type: (str) -> Optional[bytes]
+        s3_client = self._get_s3_client()
+        try:
+            s3_object = s3_client.get_object(Bucket=self._bucket_name, Key=self._key_prefix + key)
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        body = s3_object["Body"]
+        try:
+            expires_at = s3_object.get("Metadata", {}).get("expires-at")
+            if expires_at is not None and float(expires_at) < time.time():
+                return None
+            return body.read()
+        finally:
+            body.close()
+
+    def _set(self, key, value):
+        # type: (str, bytes) -> None
+        metadata = dict()
+        expires_at = self._expires_at()
+        if expires_at is not None:
+            metadata["expires-at"] = repr(expires_at)
+        self._get_s3_client().put_object(Bucket=self._bucket_name, Key=self._key_prefix + key, Body=value, Metadata=metadata)
@@ -0,0 +1,414 @@
+"""Pluggable serializers and compression for events and return payloads
+
+AWS Lambda only accepts JSON payloads, so anything other than plain JSON is sent as an envelope,
+with the base64 encoded body and the names of the serializer and compression that made it.
+The receiving side reads the names from the envelope, so only the sender has to be configured,
+and task functions reply with whatever serializer and compression their event was sent with.
+"""
+import json
+import pickle
+import threading
+import zlib
+from base64 import b64decode, b64encode
+from io import BytesIO
+
+from chili_pepper.arrays import decode_arrays, encode_arrays
+from chili_pepper.envelope import ENVELOPE_KEY, is_envelope
+from chili_pepper.exception import ChiliPepperException
+
+try:
+    from typing import Dict, Iterable, Optional, Union
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_SERIALIZER = "json"
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+_ENVELOPE_KEY_BYTES = ENVELOPE_KEY.encode("utf8")
+
+
+class SerializerError(ChiliPepperException):
+    """Raised when a serializer or compression is unknown, not installed, or refuses to decode a payload
+    """
+
+    pass
+
+
+class Serializer:
+    """Turns payloads into bytes and back
+
+    Subclass this and register it with :py:meth:`SerializerRegistry.register` to add a serializer.
+    """
+
+    #: The name the serializer is configured and negotiated with
+    name = None  # type: str
+    #: ``True`` if the serializer makes JSON, so it can be sent without base64 encoding it
+    is_json = False
+
+    def dumps(self, obj):
+        # type: (object) -> bytes
+        raise NotImplementedError()
+
+    def loads(self, data):
+        # type: (bytes) -> object
+        raise NotImplementedError()
+
+
+class JsonSerializer(Serializer):
+    """The python standard library json module"""
+
+    name = "json"
+    is_json = True
+
+    def dumps(self, obj):
+        # type: (object) -> bytes
+        return json.dumps(obj).encode("utf8")
+
+    def loads(self, data):
+        # type: (bytes) -> object
+        # json.loads detects the encoding of bytes itself
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    """`orjson <https://github.com/ijl/orjson>`_, a much faster JSON library.  It can serialize numpy arrays and dataclasses too."""
+
+    name = "orjson"
+    is_json = True
+
+    def dumps(self, obj):
+        # type: (object) -> bytes
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    def loads(self, data):
+        # type: (bytes) -> object
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """`MessagePack <https://msgpack.org/>`_, a compact binary format"""
+
+    name = "msgpack"
+
+    def dumps(self, obj):
+        # type: (object) -> bytes
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        # type: (bytes) -> object
+        return msgpack.unpackb(data, raw=False)
+
+
+class _AllowlistUnpickler(pickle.Unpickler):
+    def __init__(self, file, allowlist):
+        pickle.Unpickler.__init__(self, file)
+        self._allowlist = allowlist
+
+    def find_class(self, module, name):
+        if module + "." + name not in self._allowlist:
+            raise SerializerError("Unpickling {module}.{name} is not allowed.  Add it to the pickle_allowlist config.".format(module=module, name=name))
+        return pickle.Unpickler.find_class(self, module, name)
+
+
+class PickleSerializer(Serializer):
+    """The python standard library pickle module
+
+    Unpickling can run arbitrary code, so only the classes and functions in the allowlist can be unpickled.
+    Builtin types like dicts, lists, strings and numbers are always allowed.
+    """
+
+    name = "pickle"
+
+    def __init__(self, allowlist=None):
+        # type: (Optional[Iterable[str]]) -> None
+        """
+        Args:
+            allowlist (Optional[Iterable[str]]): The fully qualified names, like ``datetime.datetime``, of the classes that can be unpickled
+        """
+        self._allowlist = frozenset(allowlist if allowlist is not None else [])
+
+    def dumps(self, obj):
+        # type: (object) -> bytes
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data):
+        # type: (bytes) -> object
+        return _AllowlistUnpickler(BytesIO(data), self._allowlist).load()
+
+
+class Compression:
+    """Compresses serialized payloads
+
+    Subclass this and register it with :py:meth:`SerializerRegistry.register_compression` to add a compression.
+    """
+
+    #: The name the compression is configured and negotiated with
+    name = None  # type: str
+
+    def compress(self, data):
+        # type: (bytes) -> bytes
+        raise NotImplementedError()
+
+    def decompress(self, data):
+        # type: (bytes) -> bytes
+        raise NotImplementedError()
+
+
+class ZlibCompression(Compression):
+    """The python standard library zlib module"""
+
+    name = "zlib"
+
+    def compress(self, data):
+        # type: (bytes) -> bytes
+        return zlib.compress(data)
+
+    def decompress(self, data):
+        # type: (bytes) -> bytes
+        return zlib.decompress(data)
+
+
+class ZstdCompression(Compression):
+    """`Zstandard <https://facebook.github.io/zstd/>`_, which is faster than zlib and compresses better"""
+
+    name = "zstd"
+
+    def compress(self, data):
+        # type: (bytes) -> bytes
+        return zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data):
+        # type: (bytes) -> bytes
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class SerializerRegistry:
+    """The serializers and compressions an App can send and receive payloads with
+
+    The ``json`` serializer and ``zlib`` compression are always registered.
+    ``orjson``, ``msgpack`` and ``zstd`` are registered if their libraries are installed,
+    and ``pickle`` is registered with the allowlist that is passed in.
+    """
+
+    def __init__(self, pickle_allowlist=None):
+        # type: (Optional[Iterable[str]]) -> None
+        """
+        Args:
+            pickle_allowlist (Optional[Iterable[str]]): The classes the ``pickle`` serializer is allowed to unpickle
+        """
+        self._lock = threading.Lock()
+        self._serializers = dict()  # type: Dict[str, Serializer]
+        self._compressions = dict()  # type: Dict[str, Compression]
+
+        self.register(JsonSerializer())
+        self.register(PickleSerializer(allowlist=pickle_allowlist))
+        if orjson is not None:
+            self.register(OrjsonSerializer())
+        if msgpack is not None:
+            self.register(MsgpackSerializer())
+        self.register_compression(ZlibCompression())
+        if zstandard is not None:
+            self.register_compression(ZstdCompression())
+
+    def register(self, serializer):
+        # type: (Serializer) -> None
+        """Add a serializer, replacing any serializer with the same name"""
+        with self._lock:
+            self._serializers[serializer.name] = serializer
+
+    def register_compression(self, compression):
+        # type: (Compression) -> None
+        """Add a compression, replacing any compression with the same name"""
+        with self._lock:
+            self._compressions[compression.name] = compression
+
+    def get(self, name):
+        # type: (str) -> Serializer
+        """
+        Raises:
+            SerializerError: If there is no serializer with the name
+
+        Returns:
+            Serializer: The serializer with the name
+        """
+        try:
+            return self._serializers[name]
+        except KeyError:
+            raise SerializerError("Unknown serializer '{name}'.  Is the library it needs installed?".format(name=name))
+
+    def get_compression(self, name):
+        # type: (str) -> Compression
+        """
+        Raises:
+            SerializerError: If there is no compression with the name
+
+        Returns:
+            Compression: The compression with the name
+        """
+        try:
+            return self._compressions[name]
+        except KeyError:
+            raise SerializerError("Unknown compression '{name}'.  Is the library it needs installed?".format(name=name))
+
+
+def is_encoded_payload(payload):
+    # type: (object) -> bool
+    """
+    Returns:
+        bool: ``True`` if the payload is an envelope made by :py:meth:`PayloadCodec.wrap`
+    """
+    return is_envelope(payload) and "serializer" in payload[ENVELOPE_KEY]
+
+
+class PayloadCodec:
+    """Encodes and decodes payloads with a serializer and an optional compression
+    """
+
+    def __init__(self, registry, serializer=DEFAULT_SERIALIZER, compression=None, compression_min_size=DEFAULT_COMPRESSION_MIN_SIZE, array_store=None):
+        # type: (SerializerRegistry, str, Optional[str], int, Optional[object]) -> None
+        """
+        Args:
+            registry (SerializerRegistry): Where serializers and compressions are looked up
+            serializer (str): The name of the serializer to encode payloads with
+            compression (Optional[str]): The name of the compression to encode payloads with, or ``None`` to not compress them
+            compression_min_size (int): Serialized payloads smaller than this many bytes are not compressed
+            array_store: Uploads and downloads big array buffers, like :py:class:`chili_pepper.offload.PayloadOffloader`.
+                         If not passed, array buffers are always sent inline.
+        """
+        self._registry = registry
+        self._serializer = registry.get(serializer)
+        self._compression = registry.get_compression(compression) if compression is not None else None
+        self._compression_min_size = compression_min_size
+        self._array_store = array_store
+
+    @property
+    def serializer(self):
+        # type: () -> Serializer
+        """
+        Returns:
+            Serializer: The serializer payloads are encoded with
+        """
+        return self._serializer
+
+    @property
+    def compression(self):
+        # type: () -> Optional[Compression]
+        """
+        Returns:
+            Optional[Compression]: The compression payloads are encoded with
+        """
+        return self._compression
+
+    def for_payload(self, payload):
+        # type: (object) -> PayloadCodec
+        """
+        Returns:
+            PayloadCodec: A codec that encodes with the same serializer and compression the payload was encoded with
+        """
+        if not is_encoded_payload(payload):
+            return PayloadCodec(self._registry, array_store=self._array_store)
+        encoding = payload[ENVELOPE_KEY]
+        return PayloadCodec(
+            self._registry,
+            serializer=encoding["serializer"],
+            compression=encoding.get("compression"),
+            compression_min_size=self._compression_min_size,
+            array_store=self._array_store,
+        )
+
+    def dumps(self, obj):
+        # type: (object) -> str
+        """Encode a payload as the JSON text that is sent to or returned from AWS Lambda
+
+        Args:
+            obj: The payload
+
+        Returns:
+            str: The JSON text
+        """
+        body, compression_name = self._encode(encode_arrays(obj, self._array_store))
+        if self._serializer.is_json and compression_name is None:
+            # the serializer already made JSON, so there is no need for an envelope
+            return body.decode("utf8")
+        return json.dumps(self._make_envelope(body, compression_name))
+
+    def loads(self, data):
+        # type: (Union[bytes, str]) -> object
+        """Decode the JSON text sent to or returned from AWS Lambda
+
+        Args:
+            data (Union[bytes, str]): The JSON text
+
+        Returns:
+            The payload
+        """
+        if not isinstance(data, bytes):
+            data = data.encode("utf8")
+        json_serializer = self._serializer if self._serializer.is_json else self._registry.get(DEFAULT_SERIALIZER)
+        payload = json_serializer.loads(data)
+        if _ENVELOPE_KEY_BYTES not in data:
+            # JSON encoders do not escape the key's ASCII characters, so without it in the text there are no envelopes to unwrap
+            return payload
+        return self.unwrap(payload)
+
+    def wrap(self, obj):
+        # type: (object) -> object
+        """Encode a payload into an object that AWS Lambda can turn into JSON
+
+        Args:
+            obj: The payload
+
+        Returns:
+            The payload itself for plain JSON, otherwise an envelope with the encoded payload
+        """
+        obj = encode_arrays(obj, self._array_store)
+        if self._serializer.name == DEFAULT_SERIALIZER and self._compression is None:
+            return obj
+        body, compression_name = self._encode(obj)
+        if self._serializer.name == DEFAULT_SERIALIZER and compression_name is None:
+            return obj
+        return self._make_envelope(body, compression_name)
+
+    def _encode(self, obj):
+        # type: (object) -> tuple
+        body = self._serializer.dumps(obj)
+        if self._compression is None or len(body) < self._compression_min_size:
+            return body, None
+        return self._compression.compress(body), self._compression.name
+
+    def _make_envelope(self, body, compression_name):
+        # type: (bytes, Optional[str]) -> dict
+        return {ENVELOPE_KEY: {"serializer": self._serializer.name, "compression": compression_name}, "body": b64encode(body).decode("ascii")}
+
+    def unwrap(self, payload):
+        # type: (object) -> object
+        """Decode a payload made by :py:meth:`wrap`, with whatever serializer and compression made it
+
+        Args:
+            payload: The JSON decoded payload
+
+        Returns:
+            The payload, with any arrays in it rebuilt
+        """
+        if is_encoded_payload(payload):
+            encoding = payload[ENVELOPE_KEY]
+            body = b64decode(payload["body"])
+            if encoding.get("compression") is not None:
+                body = self._registry.get_compression(encoding["compression"]).decompress(body)
+            payload = self._registry.get(encoding["serializer"]).loads(body)
+        return decode_arrays(payload, self._array_store)
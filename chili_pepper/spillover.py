@@ -0,0 +1,144 @@
+"""Run task functions locally when AWS Lambda throttles their invocations
+
+When the account is at its concurrency limit, throttled invocations would otherwise back off and queue up,
+while the calling machine may have idle cores.  Tasks that opt in are run in a local process pool instead,
+and the caller gets the same :py:class:`chili_pepper.app.Result` either way.
+
+The local processes are spawned, not forked, so they do not inherit the locks of the threads that invoke tasks.
+Events and return payloads are pickled to get to and from the local processes, and the task function is pickled by reference,
+so spilled tasks must be defined at the top level of a module.
+Events and return payloads still go through the app's serializer, like they would for an invocation.
+"""
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chili_pepper.deadline import DEFAULT_LAMBDA_TIMEOUT, DeadlineContext
+from chili_pepper.envelope import handle_batch_event, is_batch_event
+
+try:
+    from typing import Callable, Optional
+except ImportError:
+    # python2.7 doesn't have typing, and I don't want to mess with mypy yet
+    pass
+
+DEFAULT_SPILLOVER_AFTER_THROTTLES = 2
+
+
+class LocalContext:
+    """Stand-in for the lambda context object, for task functions that run locally
+    """
+
+    def __init__(self, function_name, timeout=None):
+        # type: (str, Optional[int]) -> None
+        """
+        Args:
+            function_name (str): The name of the task function
+            timeout (Optional[int]): The task's timeout in seconds, or ``None`` for the AWS Lambda default
+        """
+        self.function_name = function_name
+        self._end = time.time() + (timeout if timeout is not None else DEFAULT_LAMBDA_TIMEOUT)
+
+    def get_remaining_time_in_millis(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The milliseconds left until the task's timeout.  The timeout is not enforced for local runs.
+        """
+        return max(0, int((self._end - time.time()) * 1000))
+
+
+def run_task_locally(task_handler, event, timeout=None, deadline=None):
+    # type: (Callable, object, Optional[int], Optional[float]) -> object
+    """Call a task function in this process, without the envelopes the lambda handler takes apart
+
+    Args:
+        task_handler (Callable): The function decorated with ``app.task()``
+        event: The event
+        timeout (Optional[int]): The task's timeout in seconds
+        deadline (Optional[float]): The caller's deadline, in seconds since the epoch
+
+    Returns:
+        The task function's return payload
+    """
+    context = LocalContext(task_handler.__name__, timeout=timeout)
+    if deadline is not None:
+        context = DeadlineContext(context, deadline)
+    if is_batch_event(event):
+        return handle_batch_event(task_handler.__wrapped__, event, context)
+    return task_handler.__wrapped__(event, context)
+
+
+class LocalSpillover:
+    """A local process pool for task invocations that AWS Lambda throttled
+    """
+
+    def __init__(self, max_workers=None):
+        # type: (Optional[int]) -> None
+        """
+        Args:
+            max_workers (Optional[int]): The most task functions running locally at once.  Defaults to the number of CPUs.
+        """
+        self._max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._executor = None  # type: Optional[ProcessPoolExecutor]
+        self._spilled = 0
+
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def spilled(self):
+        # type: () -> int
+        """
+        Returns:
+            int: The number of invocations that were run locally
+        """
+        return self._spilled
+
+    def run(self, task_handler, event, timeout=None, deadline=None):
+        # type: (Callable, object, Optional[int], Optional[float]) -> object
+        """Run a task function in the process pool, and wait for it to finish
+
+        Args:
+            task_handler (Callable): The function decorated with ``app.task()``
+            event: The event
+            timeout (Optional[int]): The task's timeout in seconds
+            deadline (Optional[float]): The caller's deadline, in seconds since the epoch
+
+        Returns:
+            The task function's return payload
+        """
+        with self._lock:
+            if self._executor is None:
+                # the processes are only started when something is spilled
+                self._executor = _create_process_pool(self._max_workers)
+            executor = self._executor
+            self._spilled += 1
+        self._logger.info("Running {name} locally, since its invocation was throttled".format(name=task_handler.__name__))
+        return executor.submit(run_task_locally, task_handler, event, timeout=timeout, deadline=deadline).result()
+
+    def shutdown(self, wait=True):
+        # type: (bool) -> None
+        """Stop the local processes
+
+        Args:
+            wait (bool): If ``True``, block until the running task functions are done
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+def _create_process_pool(max_workers):
+    # type: (Optional[int]) -> ProcessPoolExecutor
+    if sys.version_info < (3, 7):
+        # ProcessPoolExecutor only takes a multiprocessing context since python3.7, so older pythons fork
+        return ProcessPoolExecutor(max_workers=max_workers)
+    # a forked process gets copies of the locks that the invocation, scheduler and boto3 threads were holding,
+    # and deadlocks when it takes one of them.  Spawned processes start clean, and import the task's module instead.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
@@ -14,6 +14,12 @@ def apply_moto_mocks():
         yield None
 
 
+@pytest.fixture(autouse=True)
+def isolate_caches(monkeypatch, tmp_path):
+    # the build and dependency caches are on by default, so keep them out of the real ~/.cache
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg_cache"))
+
+
 @pytest.fixture(autouse=True)
 def reset_sys_path():
     # main.CLI.deploy can add stuff to sys.path, and load up modules that we'll want to re-import differently in subsequent tests
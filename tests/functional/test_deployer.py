@@ -3,7 +3,7 @@ import boto3
 
 from conftest import create_app_structure, create_chili_pepper_s3_bucket
 from chili_pepper.app import ChiliPepper
-from chili_pepper.deployer import Deployer
+from chili_pepper.deployer import FUNCTION_MANIFEST_FILENAME, Deployer
 
 
 def test_zip(tmp_path, request):
@@ -19,6 +19,10 @@ def test_zip(tmp_path, request):
     # There should now be a zip file created.
     zipfile.is_zipfile(str(tmp_path / (app.app_name + ".zip")))
 
+    # and it should include the function manifest
+    with zipfile.ZipFile(str(tmp_path / (app.app_name + ".zip"))) as zfh:
+        assert FUNCTION_MANIFEST_FILENAME in zfh.namelist()
+
 
 def test_send_to_s3(tmp_path, request):
     # TODO test s3 bucket versioning
@@ -1,14 +1,99 @@
+import json
+import threading
+import uuid
+from io import BytesIO
+
 import boto3
 import pytest
+from botocore.exceptions import ClientError
 from moto.awslambda import mock_lambda
 from moto.cloudformation import mock_cloudformation
 from moto.iam import mock_iam
 from moto.kms import mock_kms
 from moto.s3 import mock_s3
 
+from chili_pepper.app import ChiliPepper
+from chili_pepper.clients import ClientPool
+from chili_pepper.deployer import Deployer
+
 
 @pytest.fixture(autouse=True)
 def apply_moto_mocks():
     with mock_cloudformation(), mock_iam(), mock_s3(), mock_lambda(), mock_kms():
         boto3.setup_default_session()
         yield None
+
+
+@pytest.fixture(autouse=True)
+def isolate_caches(monkeypatch, tmp_path):
+    # the build and dependency caches are on by default, so keep them out of the real ~/.cache
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg_cache"))
+
+
+class FakeLambdaClient:
+    """
+    A stand-in for the boto3 lambda client.
+
+    Invocations call ``handler`` in process with the decoded payload, and return its result as the response payload.
+    The default handler echoes the event back.  Tests can replace ``handler`` to change what the "lambda function" does.
+    """
+
+    def __init__(self, handler=None, wait_event=None):
+        self.handler = handler if handler is not None else (lambda event, context: event)
+        self._wait_event = wait_event
+        self._lock = threading.Lock()
+
+        self.invocations = list()
+        self.running = 0
+        self.max_running = 0
+
+    def invoke(self, **kwargs):
+        with self._lock:
+            self.invocations.append(kwargs)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if self._wait_event is not None:
+                self._wait_event.wait()
+            response = {"StatusCode": 200, "LogResult": None, "ResponseMetadata": {"RequestId": str(uuid.uuid4())}}
+            try:
+                return_payload = self.handler(json.loads(kwargs["Payload"]), None)
+            except ClientError:
+                # handlers raise these to stand in for errors of the invoke call itself, like throttling
+                raise
+            except Exception as e:
+                # lambda reports a handler that raised as a successful invocation, with the error as its payload
+                return_payload = {"errorMessage": str(e), "errorType": type(e).__name__, "stackTrace": []}
+                response["FunctionError"] = "Unhandled"
+            if kwargs.get("InvocationType") == "Event":
+                return {"StatusCode": 202, "Payload": BytesIO(b""), "ResponseMetadata": {"RequestId": str(uuid.uuid4())}}
+            response["Payload"] = BytesIO(json.dumps(return_payload).encode("utf8"))
+            return response
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture()
+def fake_lambda_client():
+    return FakeLambdaClient()
+
+
+@pytest.fixture()
+def aws_app(mocker, fake_lambda_client):
+    """An AwsApp whose tasks are invoked with ``fake_lambda_client``, without looking up function names"""
+    app = ChiliPepper().create_app("test_app")
+    mocker.patch.object(ClientPool, "client", return_value=fake_lambda_client)
+    mocker.patch.object(Deployer, "get_function_id", side_effect=lambda python_function: python_function.__name__)
+    yield app
+    app.shutdown(wait=False)
+
+
+@pytest.fixture()
+def blocked_lambda_client(aws_app):
+    """A fake lambda client for ``aws_app``, whose invocations wait until the returned event is set"""
+    release_event = threading.Event()
+    lambda_client = FakeLambdaClient(wait_event=release_event)
+    aws_app.client_pool.client.return_value = lambda_client
+    yield lambda_client, release_event
+    release_event.set()
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from chili_pepper.aio import delay_async
+
+
+def test_await_result(aws_app):
+    @aws_app.task()
+    def say_hello(event, context):
+        pass
+
+    async def main():
+        return await say_hello.delay({"name": "Jalapeno"})
+
+    assert asyncio.run(main()) == {"name": "Jalapeno"}
+
+
+def test_task_delay_async(aws_app):
+    @aws_app.task()
+    def say_hello(event, context):
+        pass
+
+    async def main():
+        return await asyncio.gather(*[say_hello.delay_async({"number": number}) for number in range(10)])
+
+    assert asyncio.run(main()) == [{"number": number} for number in range(10)]
+
+
+def test_delay_async_semaphore(aws_app, blocked_lambda_client):
+    lambda_client, release_event = blocked_lambda_client
+
+    @aws_app.task()
+    def say_hello(event, context):
+        pass
+
+    async def main():
+        semaphore = asyncio.Semaphore(2)
+        tasks = [asyncio.ensure_future(delay_async(say_hello.delay, {"number": number}, semaphore=semaphore)) for number in range(6)]
+        await asyncio.sleep(0.1)
+        release_event.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == [{"number": number} for number in range(6)]
+    assert lambda_client.max_running == 2
+
+
+def test_cancel(aws_app, blocked_lambda_client):
+    _, release_event = blocked_lambda_client
+    aws_app.conf["max_in_flight_invocations"] = 1
+
+    @aws_app.task()
+    def say_hello(event, context):
+        pass
+
+    async def main():
+        running_result = say_hello.delay({"number": 1})
+        queued_result = say_hello.delay({"number": 2})
+
+        queued_task = asyncio.ensure_future(_await(queued_result))
+        await asyncio.sleep(0.05)
+        queued_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued_task
+
+        release_event.set()
+        return running_result, queued_result
+
+    running_result, queued_result = asyncio.run(main())
+    assert running_result.get(timeout=5) == {"number": 1}
+    assert queued_result.cancelled()
+
+
+async def _await(awaitable):
+    return await awaitable
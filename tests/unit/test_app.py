@@ -1,8 +1,20 @@
+import itertools
+import json
+import threading
+import time
+
 import awacs
 import pytest
 from base64 import b64encode
+from botocore.exceptions import ClientError
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, TimeoutError
+from io import BytesIO
 
-from chili_pepper.app import AwsAllowPermission, MissingArgumentError, Result
+from chili_pepper.app import AwsAllowPermission, ChiliPepper, MissingArgumentError, Result
+from chili_pepper.deadline import DeadlineExceededError
+from chili_pepper.envelope import ENVELOPE_KEY, TaskError, make_batch_event
+from chili_pepper.executor import InvocationExecutor
+from chili_pepper.result_cache import LruResultCache
 
 
 class TestAwsAllowPermissions:
@@ -38,3 +50,710 @@ class TestTaskResult:
         # actual test is here - make sure thet log result is properly recovered from the invoke response
         expected_log_result = fake_log_result if fake_log_result is not None else ""
         assert result.get_log_result() == expected_log_result
+
+    def test_get(self, mocker):
+        lambda_client = mocker.MagicMock()
+        lambda_client.invoke.return_value = {"StatusCode": 200, "Payload": BytesIO(b'{"Hello": "World!"}'), "LogResult": None}
+        executor = InvocationExecutor(max_in_flight=1, queue_depth=0)
+
+        result = Result("test_function", {"name": "Jalapeno"}, lambda_client=lambda_client, executor=executor)
+
+        assert isinstance(result.start(), Future)
+        assert result.get() == {"Hello": "World!"}
+        lambda_client.invoke.assert_called_once_with(FunctionName="test_function", Payload='{"name": "Jalapeno"}', LogType="Tail")
+        executor.shutdown()
+
+    def test_get_twice(self, mocker):
+        lambda_client = mocker.MagicMock()
+        lambda_client.invoke.return_value = {"StatusCode": 200, "Payload": BytesIO(b'{"Hello": "World!"}'), "LogResult": b64encode(b"logs")}
+        executor = InvocationExecutor(max_in_flight=1, queue_depth=0)
+
+        result = Result("test_function", {"name": "Jalapeno"}, lambda_client=lambda_client, executor=executor)
+
+        assert result.get() == {"Hello": "World!"}
+        assert result.get() == {"Hello": "World!"}
+        assert result.get_log_result() == "logs"
+        executor.shutdown()
+
+    def test_compact(self, mocker):
+        lambda_client = mocker.MagicMock()
+        lambda_client.invoke.return_value = {"StatusCode": 200, "Payload": BytesIO(b"null"), "LogResult": None}
+
+        result = Result("test_function", {"name": "Jalapeno"}, lambda_client=lambda_client)
+        result.get()
+
+        assert not hasattr(result, "__dict__")
+        # the event and the raw response body are released once they are not needed
+        assert result._event is None
+        assert "Payload" not in result._invoke_response
+
+    def test_get_invoke_error(self, mocker):
+        lambda_client = mocker.MagicMock()
+        lambda_client.invoke.side_effect = RuntimeError("boom")
+
+        result = Result("test_function", dict(), lambda_client=lambda_client)
+
+        with pytest.raises(RuntimeError):
+            result.get()
+
+
+def _result_with_fake_invocation(mocker, executor, payload, wait_event=None):
+    """Create a Result whose invocation returns ``payload``, after ``wait_event`` is set"""
+
+    def invoke(**kwargs):
+        if wait_event is not None:
+            wait_event.wait()
+        return {"StatusCode": 200, "Payload": BytesIO(json.dumps(payload).encode("utf8")), "LogResult": None}
+
+    lambda_client = mocker.MagicMock()
+    lambda_client.invoke.side_effect = invoke
+    result = Result("test_function", dict(), lambda_client=lambda_client, executor=executor)
+    result.start()
+    return result
+
+
+class TestResultFuture:
+    def test_timeout(self, mocker):
+        executor = InvocationExecutor(max_in_flight=1, queue_depth=0)
+        release_event = threading.Event()
+        result = _result_with_fake_invocation(mocker, executor, "slow", wait_event=release_event)
+
+        with pytest.raises(TimeoutError):
+            result.get(timeout=0.01)
+        with pytest.raises(TimeoutError):
+            result.exception(timeout=0.01)
+        assert not result.done()
+
+        release_event.set()
+        assert result.result(timeout=5) == "slow"
+        assert result.exception() is None
+        assert result.done()
+        executor.shutdown()
+
+    def test_exception(self, mocker):
+        lambda_client = mocker.MagicMock()
+        lambda_client.invoke.side_effect = RuntimeError("boom")
+        result = Result("test_function", dict(), lambda_client=lambda_client)
+
+        assert isinstance(result.exception(), RuntimeError)
+
+    def test_add_done_callback(self, mocker):
+        executor = InvocationExecutor(max_in_flight=1, queue_depth=0)
+        release_event = threading.Event()
+        result = _result_with_fake_invocation(mocker, executor, "done", wait_event=release_event)
+
+        called_with = list()
+        result.add_done_callback(called_with.append)
+        assert called_with == []
+
+        release_event.set()
+        result.get()
+        # callbacks that are added after the result is done are called right away
+        result.add_done_callback(called_with.append)
+        executor.shutdown()
+
+        assert called_with == [result, result]
+
+    def test_as_completed(self, mocker):
+        app = ChiliPepper().create_app("test_app")
+        release_event = threading.Event()
+        slow_result = _result_with_fake_invocation(mocker, app.invocation_executor, "slow", wait_event=release_event)
+        fast_result = _result_with_fake_invocation(mocker, app.invocation_executor, "fast")
+
+        completed = app.as_completed([slow_result, fast_result])
+        assert next(completed) is fast_result
+        release_event.set()
+        assert next(completed) is slow_result
+        app.shutdown()
+
+    @pytest.mark.parametrize("return_when", [FIRST_COMPLETED, ALL_COMPLETED])
+    def test_wait(self, mocker, return_when):
+        app = ChiliPepper().create_app("test_app")
+        release_event = threading.Event()
+        slow_result = _result_with_fake_invocation(mocker, app.invocation_executor, "slow", wait_event=release_event)
+        fast_result = _result_with_fake_invocation(mocker, app.invocation_executor, "fast")
+
+        if return_when == FIRST_COMPLETED:
+            done, not_done = app.wait([slow_result, fast_result], return_when=return_when)
+            assert done == {fast_result}
+            assert not_done == {slow_result}
+        else:
+            done, not_done = app.wait([slow_result, fast_result], timeout=0.05, return_when=return_when)
+            assert done == {fast_result}
+            release_event.set()
+            done, not_done = app.wait([slow_result, fast_result], return_when=return_when)
+            assert done == {fast_result, slow_result}
+            assert not_done == set()
+        release_event.set()
+        app.shutdown()
+
+
+class TestTaskMap:
+    @pytest.mark.parametrize("ordered", [True, False])
+    @pytest.mark.parametrize("concurrency", [None, 1, 3])
+    def test_map(self, aws_app, fake_lambda_client, ordered, concurrency):
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        payloads = list(say_hello.map(({"number": number} for number in range(20)), concurrency=concurrency, ordered=ordered))
+
+        if ordered:
+            assert payloads == [{"number": number} for number in range(20)]
+        else:
+            assert sorted(payloads, key=lambda payload: payload["number"]) == [{"number": number} for number in range(20)]
+        assert fake_lambda_client.max_running <= (concurrency or aws_app.invocation_executor.max_in_flight)
+
+    @pytest.mark.parametrize("ordered", [True, False])
+    def test_map_is_lazy(self, aws_app, fake_lambda_client, ordered):
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        consumed = list()
+
+        def events():
+            for number in itertools.count():
+                consumed.append(number)
+                yield {"number": number}
+
+        payloads = say_hello.map(events(), concurrency=2, ordered=ordered)
+        first_payloads = list(itertools.islice(payloads, 3))
+
+        assert len(first_payloads) == 3
+        # only the events needed to keep 2 invocations in flight have been read
+        assert len(consumed) <= 5
+        assert len(fake_lambda_client.invocations) <= 5
+
+    def test_map_unordered_yields_as_completed(self, aws_app, fake_lambda_client):
+        release_event = threading.Event()
+
+        def handler(event, context):
+            if event["number"] == 1:
+                release_event.wait()
+            return event
+
+        fake_lambda_client.handler = handler
+
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        payloads = say_hello.map([{"number": 1}, {"number": 2}], concurrency=2, ordered=False)
+        assert next(payloads) == {"number": 2}
+        release_event.set()
+        assert next(payloads) == {"number": 1}
+
+    def test_map_invalid_concurrency(self, aws_app):
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        with pytest.raises(MissingArgumentError):
+            list(say_hello.map([{}], concurrency=0))
+
+
+class TestFireAndForget:
+    @pytest.mark.parametrize("task_wait, delay_wait, expect_wait", [(True, None, True), (False, None, False), (True, False, False), (False, True, True)])
+    def test_delay(self, aws_app, fake_lambda_client, task_wait, delay_wait, expect_wait):
+        @aws_app.task(wait=task_wait)
+        def say_hello(event, context):
+            pass
+
+        result = say_hello.delay({"name": "Jalapeno"}, wait=delay_wait)
+        result.start().result()
+
+        invocation = fake_lambda_client.invocations[0]
+        if expect_wait:
+            assert result.get() == {"name": "Jalapeno"}
+            assert "InvocationType" not in invocation
+        else:
+            assert result.get() is None
+            assert invocation["InvocationType"] == "Event"
+            assert result.get_log_result() == ""
+        assert result.request_id is not None
+
+    def test_map(self, aws_app, fake_lambda_client):
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        request_ids = list(say_hello.map(({"number": number} for number in range(10)), wait=False))
+
+        assert len(set(request_ids)) == 10
+        assert all(invocation["InvocationType"] == "Event" for invocation in fake_lambda_client.invocations)
+
+
+class TestMicroBatching:
+    def test_batch_size(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=3, batch_window_ms=60 * 1000)
+        def double(event, context):
+            return event["number"] * 2
+
+        fake_lambda_client.handler = double
+
+        results = [double.delay({"number": number}) for number in range(6)]
+
+        assert [result.get(timeout=5) for result in results] == [number * 2 for number in range(6)]
+        assert len(fake_lambda_client.invocations) == 2
+
+    def test_batch_window(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=100, batch_window_ms=20)
+        def double(event, context):
+            return event["number"] * 2
+
+        fake_lambda_client.handler = double
+
+        results = [double.delay({"number": number}) for number in range(3)]
+
+        assert [result.get(timeout=5) for result in results] == [0, 2, 4]
+        assert len(fake_lambda_client.invocations) == 1
+        assert json.loads(fake_lambda_client.invocations[0]["Payload"]) == make_batch_event([{"number": number} for number in range(3)])
+
+    def test_batch_item_error(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=2)
+        def invert(event, context):
+            return 1.0 / event["number"]
+
+        fake_lambda_client.handler = invert
+
+        good_result = invert.delay({"number": 2})
+        bad_result = invert.delay({"number": 0})
+
+        assert good_result.get(timeout=5) == 0.5
+        with pytest.raises(TaskError, match="ZeroDivisionError"):
+            bad_result.get(timeout=5)
+
+    def test_batch_invocation_error(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=2)
+        def say_hello(event, context):
+            pass
+
+        # a function that did not handle the batch, like one that timed out
+        fake_lambda_client.handler = lambda event, context: {"errorMessage": "Task timed out after 3.00 seconds"}
+
+        results = [say_hello.delay({}) for _ in range(2)]
+
+        for result in results:
+            with pytest.raises(TaskError):
+                result.get(timeout=5)
+
+    def test_batch_fire_and_forget(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=2, wait=False)
+        def say_hello(event, context):
+            pass
+
+        results = [say_hello.delay({}) for _ in range(2)]
+
+        assert [result.get(timeout=5) for result in results] == [None, None]
+        assert results[0].request_id == results[1].request_id
+        assert fake_lambda_client.invocations[0]["InvocationType"] == "Event"
+
+    def test_cancelled_events_are_not_sent(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=2, batch_window_ms=60 * 1000)
+        def double(event, context):
+            return event["number"] * 2
+
+        fake_lambda_client.handler = double
+
+        cancelled_result = double.delay({"number": 1})
+        assert cancelled_result.cancel()
+        result = double.delay({"number": 2})
+
+        assert result.get(timeout=5) == 4
+        assert json.loads(fake_lambda_client.invocations[0]["Payload"]) == make_batch_event([{"number": 2}])
+
+    def test_shutdown_sends_queued_events(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=10, batch_window_ms=2000, wait=False)
+        def say_hello(event, context):
+            pass
+
+        result = say_hello.delay({"name": "Jalapeno"})
+        aws_app.shutdown(wait=True)
+
+        assert len(fake_lambda_client.invocations) == 1
+        assert fake_lambda_client.invocations[0]["InvocationType"] == "Event"
+        assert json.loads(fake_lambda_client.invocations[0]["Payload"]) == make_batch_event([{"name": "Jalapeno"}])
+        assert result.get(timeout=5) is None
+
+    def test_stale_batch_window_does_not_cut_the_next_one_short(self, aws_app, fake_lambda_client):
+        @aws_app.task(batch_size=2, batch_window_ms=500)
+        def double(event, context):
+            return event["number"] * 2
+
+        fake_lambda_client.handler = double
+
+        first_results = [double.delay({"number": 1})]
+        time.sleep(0.25)
+        # this fills the first batch before its window ends, and the next event starts a new window
+        first_results.append(double.delay({"number": 2}))
+        last_result = double.delay({"number": 3})
+        assert [result.get(timeout=5) for result in first_results] == [2, 4]
+
+        # the first window ends here, but the second one does not
+        time.sleep(0.35)
+        assert len(fake_lambda_client.invocations) == 1
+        assert last_result.get(timeout=5) == 6
+        assert len(fake_lambda_client.invocations) == 2
+
+    @pytest.mark.parametrize("batch_size", [0, -1])
+    def test_invalid_batch_size(self, aws_app, batch_size):
+        with pytest.raises(MissingArgumentError):
+
+            @aws_app.task(batch_size=batch_size)
+            def say_hello(event, context):  # pylint: disable=unused-variable
+                pass
+
+    def test_task_handler(self, aws_app):
+        @aws_app.task()
+        def double(event, context):
+            return event["number"] * 2
+
+        assert double({"number": 2}, None) == 4
+        assert double(make_batch_event([{"number": 1}, {"number": 2}]), None) == {
+            ENVELOPE_KEY: {"batch": True},
+            "results": [{"result": 2}, {"result": 4}],
+        }
+
+
+class TestInvocationGovernor:
+    def test_throttled_invocations_are_retried(self, aws_app, fake_lambda_client, mocker):
+        mocker.patch("chili_pepper.governor.time.sleep")
+        throttles = [ClientError({"Error": {"Code": "TooManyRequestsException"}, "ResponseMetadata": {"HTTPStatusCode": 429}}, "Invoke")]
+
+        @aws_app.task(reserved_concurrency=2)
+        def say_hello(event, context):
+            if throttles:
+                raise throttles.pop()
+            return event
+
+        fake_lambda_client.handler = say_hello
+
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"name": "Jalapeno"}
+        assert len(fake_lambda_client.invocations) == 2
+
+    def test_reserved_concurrency_ceiling(self, aws_app, fake_lambda_client):
+        @aws_app.task(reserved_concurrency=2)
+        def say_hello(event, context):
+            return event
+
+        fake_lambda_client.handler = say_hello
+
+        assert list(say_hello.map({"number": number} for number in range(20))) == [{"number": number} for number in range(20)]
+        assert fake_lambda_client.max_running <= 2
+        assert aws_app.task_functions[0].reserved_concurrency == 2
+
+    def test_adaptive_concurrency_off(self, aws_app):
+        aws_app.conf["aws"]["adaptive_concurrency"] = False
+        assert aws_app.invocation_governor is None
+
+
+class TestSerializers:
+    @pytest.mark.parametrize("serializer, compression", [("json", "zlib"), ("pickle", None), ("pickle", "zlib")])
+    def test_delay(self, aws_app, fake_lambda_client, serializer, compression):
+        aws_app.conf["serializer"] = serializer
+        aws_app.conf["compression"] = compression
+        aws_app.conf["compression_min_size"] = 0
+
+        @aws_app.task()
+        def say_hello(event, context):
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = say_hello
+
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert ENVELOPE_KEY in json.loads(fake_lambda_client.invocations[0]["Payload"])
+
+    def test_batch(self, aws_app, fake_lambda_client):
+        aws_app.conf["serializer"] = "pickle"
+
+        @aws_app.task(batch_size=2)
+        def double(event, context):
+            return event["number"] * 2
+
+        fake_lambda_client.handler = double
+
+        results = [double.delay({"number": number}) for number in range(2)]
+        assert [result.get(timeout=5) for result in results] == [0, 2]
+
+    def test_numpy_arrays(self, aws_app, fake_lambda_client):
+        numpy = pytest.importorskip("numpy")
+
+        @aws_app.task()
+        def double(event, context):
+            return event["array"] * 2
+
+        fake_lambda_client.handler = double
+
+        numpy.testing.assert_array_equal(double.delay({"array": numpy.arange(10)}).get(timeout=5), numpy.arange(10) * 2)
+
+
+class TestResultCache:
+    def test_delay(self, aws_app, fake_lambda_client):
+        @aws_app.task(cache=True)
+        def say_hello(event, context):
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = say_hello
+
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        cached_result = say_hello.delay({"name": "Jalapeno"})
+        assert cached_result.done()
+        assert cached_result.get() == {"greeting": "Hello Jalapeno"}
+        assert cached_result.request_id is None
+        assert say_hello.delay({"name": "Habanero"}).get(timeout=5) == {"greeting": "Hello Habanero"}
+
+        assert len(fake_lambda_client.invocations) == 2
+        assert (say_hello.cache.hits, say_hello.cache.misses) == (1, 2)
+
+    def test_errors_are_not_cached(self, aws_app, fake_lambda_client):
+        @aws_app.task(cache=LruResultCache())
+        def say_hello(event, context):
+            raise RuntimeError("boom")
+
+        fake_lambda_client.handler = say_hello
+
+        # lambda reports the handler's exception as a FunctionError response, not by failing the invoke call
+        for _ in range(2):
+            with pytest.raises(TaskError, match="RuntimeError: boom"):
+                say_hello.delay({"name": "Jalapeno"}).get(timeout=5)
+        assert len(say_hello.cache) == 0
+        assert len(fake_lambda_client.invocations) == 2
+        assert say_hello.cache.hits == 0
+
+    def test_invalid_cache(self, aws_app):
+        with pytest.raises(MissingArgumentError):
+
+            @aws_app.task(cache="yes please")
+            def say_hello(event, context):  # pylint: disable=unused-variable
+                pass
+
+
+class TestSingleFlight:
+    def test_delay(self, aws_app, blocked_lambda_client):
+        lambda_client, release_event = blocked_lambda_client
+
+        @aws_app.task(single_flight=True)
+        def say_hello(event, context):
+            return {"greeting": "Hello " + event["name"]}
+
+        lambda_client.handler = say_hello
+
+        results = [say_hello.delay({"name": "Jalapeno"}) for _ in range(5)]
+        other_result = say_hello.delay({"name": "Habanero"})
+        results[0].cancel()
+        release_event.set()
+
+        assert results[0].cancelled()
+        for result in results[1:]:
+            assert result.get(timeout=5) == {"greeting": "Hello Jalapeno"}
+            assert result.request_id == results[1].request_id
+        assert other_result.get(timeout=5) == {"greeting": "Hello Habanero"}
+        assert len(lambda_client.invocations) == 2
+
+        # the invocation is no longer in flight, so the next call invokes the function again
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert len(lambda_client.invocations) == 3
+
+    def test_deadline(self, aws_app, blocked_lambda_client):
+        lambda_client, release_event = blocked_lambda_client
+
+        @aws_app.task(single_flight=True)
+        def say_hello(event, context):
+            return {"greeting": "Hello " + event["name"]}
+
+        lambda_client.handler = say_hello
+
+        # a call with a short deadline does not share its invocation with calls that can wait longer
+        short_result = say_hello.delay({"name": "Jalapeno"}, deadline=time.time() + 0.1)
+        result = say_hello.delay({"name": "Jalapeno"})
+        # but it can join an invocation without a deadline
+        joined_result = say_hello.delay({"name": "Jalapeno"}, deadline=time.time() + 0.1)
+        with pytest.raises(DeadlineExceededError):
+            short_result.get(timeout=5)
+        with pytest.raises(DeadlineExceededError):
+            joined_result.get(timeout=5)
+        release_event.set()
+
+        assert result.get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert len(lambda_client.invocations) == 2
+
+    def test_error(self, aws_app, blocked_lambda_client):
+        lambda_client, release_event = blocked_lambda_client
+
+        @aws_app.task(single_flight=True)
+        def say_hello(event, context):
+            raise RuntimeError("boom")
+
+        lambda_client.handler = say_hello
+
+        results = [say_hello.delay({"name": "Jalapeno"}) for _ in range(2)]
+        release_event.set()
+
+        for result in results:
+            with pytest.raises(TaskError, match="RuntimeError: boom"):
+                result.get(timeout=5)
+        assert len(lambda_client.invocations) == 1
+
+    def test_fire_and_forget(self, aws_app, blocked_lambda_client):
+        lambda_client, release_event = blocked_lambda_client
+
+        @aws_app.task(single_flight=True, wait=False)
+        def say_hello(event, context):
+            pass
+
+        results = [say_hello.delay({"name": "Jalapeno"}) for _ in range(2)]
+        release_event.set()
+
+        assert len(set(result.request_id for result in results)) == 2
+        assert len(lambda_client.invocations) == 2
+
+
+class TestHedging:
+    def test_hedge(self, aws_app, fake_lambda_client):
+        release_event = threading.Event()
+        calls = list()
+
+        @aws_app.task(idempotent=True, hedge_after_ms=50)
+        def say_hello(event, context):
+            calls.append(event)
+            if len(calls) == 1:
+                # the first invocation is stuck in a slow container
+                release_event.wait(5)
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = say_hello
+
+        result = say_hello.delay({"name": "Jalapeno"})
+        assert result.get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert len(fake_lambda_client.invocations) == 2
+        assert say_hello.hedge_policy.hedges == 1
+        assert say_hello.hedge_policy.hedge_wins == 1
+        assert say_hello.hedge_policy.abandoned == 1
+        release_event.set()
+
+    def test_fast_invocations_are_not_hedged(self, aws_app, fake_lambda_client):
+        @aws_app.task(idempotent=True, hedge_after_ms=5000)
+        def say_hello(event, context):
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = say_hello
+
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert len(fake_lambda_client.invocations) == 1
+        assert say_hello.hedge_policy.hedges == 0
+        assert len(say_hello.hedge_policy.latency_tracker) == 1
+
+    def test_failure_waits_for_the_hedge(self, aws_app, fake_lambda_client):
+        calls = list()
+
+        @aws_app.task(idempotent=True, hedge_after_ms=0)
+        def say_hello(event, context):
+            calls.append(event)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                raise RuntimeError("boom")
+            time.sleep(0.4)
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = say_hello
+
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert say_hello.hedge_policy.hedge_wins == 1
+        assert say_hello.hedge_policy.abandoned == 0
+
+    def test_function_error_waits_for_the_hedge(self, aws_app, fake_lambda_client, mocker):
+        calls = list()
+
+        @aws_app.task(idempotent=True, hedge_after_ms=0)
+        def say_hello(event, context):
+            pass
+
+        def handler(event, context):
+            calls.append(event)
+            if len(calls) == 1:
+                # the primary fails before the hedge finishes, like a function that timed out
+                time.sleep(0.2)
+                raise Exception("Task timed out after 3.00 seconds")
+            time.sleep(0.4)
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = handler
+        record_latency = mocker.spy(say_hello.hedge_policy, "record_latency")
+
+        assert say_hello.delay({"name": "Jalapeno"}).get(timeout=5) == {"greeting": "Hello Jalapeno"}
+        assert say_hello.hedge_policy.hedge_wins == 1
+        # only the attempt that succeeded is a latency sample
+        assert record_latency.call_count == 1
+
+    def test_budget(self, aws_app, fake_lambda_client):
+        @aws_app.task(idempotent=True, hedge_after_ms=0, hedge_max_ratio=0)
+        def say_hello(event, context):
+            # long enough that every invocation is still running when its hedge is due, even on a busy machine
+            time.sleep(0.2)
+            return {"greeting": "Hello " + event["name"]}
+
+        fake_lambda_client.handler = say_hello
+
+        for result in [say_hello.delay({"name": str(number)}) for number in range(15)]:
+            result.get(timeout=5)
+        # the budget starts with 10 hedges, and no more are earned
+        assert say_hello.hedge_policy.hedges == 10
+        assert len(fake_lambda_client.invocations) == 25
+
+    def test_requires_idempotent(self, aws_app):
+        with pytest.raises(MissingArgumentError):
+
+            @aws_app.task(hedge_after_ms="p95")
+            def say_hello(event, context):  # pylint: disable=unused-variable
+                pass
+
+
+class TestDeadline:
+    def test_task_sees_deadline(self, aws_app, fake_lambda_client):
+        @aws_app.task(timeout=300)
+        def remaining_time(event, context):
+            return context.get_remaining_time_in_millis()
+
+        fake_lambda_client.handler = remaining_time
+
+        remaining_ms = remaining_time.delay({}, deadline=time.time() + 2).get(timeout=5)
+        assert 0 < remaining_ms <= 2000
+        assert json.loads(fake_lambda_client.invocations[0]["Payload"])[ENVELOPE_KEY]["budget_ms"] <= 2000
+
+        # the invocation's client times out at the deadline
+        client_kwargs = [call[1] for call in aws_app.client_pool.client.call_args_list]
+        assert {"retries": {"total_max_attempts": 1}, "read_timeout": 2, "connect_timeout": 2} in client_kwargs
+
+    def test_read_timeout_matches_function_timeout(self, aws_app, fake_lambda_client):
+        @aws_app.task(timeout=300)
+        def say_hello(event, context):
+            return "Hello"
+
+        fake_lambda_client.handler = say_hello
+
+        assert say_hello.delay({}).get(timeout=5) == "Hello"
+        assert aws_app.client_pool.client.call_args_list[-1][1]["read_timeout"] == 315
+
+    def test_deadline_passes(self, aws_app, blocked_lambda_client):
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        start = time.time()
+        result = say_hello.delay({}, deadline=start + 0.2)
+        with pytest.raises(DeadlineExceededError):
+            result.get()
+        assert time.time() - start < 1
+        with pytest.raises(DeadlineExceededError):
+            result.exception()
+
+    def test_deadline_already_passed(self, aws_app, fake_lambda_client):
+        @aws_app.task()
+        def say_hello(event, context):
+            pass
+
+        result = say_hello.delay({}, deadline=time.time() - 1)
+        aws_app.wait([result], timeout=5)
+        assert isinstance(result.exception(), DeadlineExceededError)
+        assert fake_lambda_client.invocations == []
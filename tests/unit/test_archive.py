@@ -0,0 +1,185 @@
+import hashlib
+import os
+import stat
+import time
+import zipfile
+import zlib
+
+import pytest
+
+from chili_pepper.archive import ZipBuilder, get_reproducible_date_time, read_digest, write_digest
+
+
+@pytest.fixture
+def src_dir(tmp_path):
+    src_dir = tmp_path / "src"
+    (src_dir / "package").mkdir(parents=True)
+    (src_dir / "tasks.py").write_bytes(b"print('hello')\n" * 100)
+    (src_dir / "package" / "__init__.py").write_bytes(b"")
+    (src_dir / "package" / "dependency-1.0-py3-none-any.whl").write_bytes(b"wheel " * 100)
+    # random bytes do not get any smaller when they are deflated
+    (src_dir / "package" / "random.bin").write_bytes(os.urandom(1000))
+    return src_dir
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_write(tmp_path, src_dir, max_workers):
+    zip_builder = ZipBuilder(max_workers=max_workers)
+    zip_builder.add_directory(str(src_dir), prefix="python")
+    zip_builder.add_bytes("manifest.json", b"{}")
+    output_path = str(tmp_path / "out.zip")
+    zip_builder.write(output_path)
+
+    with zipfile.ZipFile(output_path) as zfh:
+        assert zfh.testzip() is None
+        infos = {info.filename: info for info in zfh.infolist()}
+        # entries are in the order they were added, whichever thread compressed them
+        assert [info.filename for info in zfh.infolist()] == [name.replace(os.sep, "/") for name, _, _ in zip_builder._entries]
+        assert zfh.read("python/tasks.py") == (src_dir / "tasks.py").read_bytes()
+        assert zfh.read("manifest.json") == b"{}"
+
+    assert infos["python/tasks.py"].compress_type == zipfile.ZIP_DEFLATED
+    assert infos["python/tasks.py"].compress_size < infos["python/tasks.py"].file_size
+    # already compressed and incompressible files are stored
+    assert infos["python/package/dependency-1.0-py3-none-any.whl"].compress_type == zipfile.ZIP_STORED
+    assert infos["python/package/random.bin"].compress_type == zipfile.ZIP_STORED
+    assert infos["python/tasks.py"].external_attr >> 16 == os.stat(str(src_dir / "tasks.py")).st_mode
+
+
+@pytest.mark.parametrize("reproducible", [False, True])
+def test_write_is_valid(tmp_path, src_dir, reproducible):
+    # entries are written around zipfile's own writer, so check the archive with zipfile's reader
+    zip_builder = ZipBuilder(reproducible=reproducible)
+    zip_builder.add_directory(str(src_dir))
+    zip_builder.add_bytes("manifest.json", b"{}")
+    output_path = str(tmp_path / "out.zip")
+    zip_builder.write(output_path)
+
+    assert zipfile.is_zipfile(output_path)
+    with zipfile.ZipFile(output_path) as zfh:
+        assert zfh.testzip() is None
+        assert len(zfh.infolist()) == len(zip_builder)
+        for info in zfh.infolist():
+            assert info.flag_bits == 0
+            assert info.header_offset < os.path.getsize(output_path)
+
+
+def test_write_zip64(tmp_path, src_dir, monkeypatch):
+    # like CPython's own zip64 tests, lower the limits, instead of writing a 4 GiB archive
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1000)
+    monkeypatch.setattr(zipfile, "ZIP_FILECOUNT_LIMIT", 2)
+    (src_dir / "big.bin").write_bytes(os.urandom(5000))
+    zip_builder = ZipBuilder(max_workers=2)
+    zip_builder.add_directory(str(src_dir))
+    output_path = str(tmp_path / "out.zip")
+    zip_builder.write(output_path)
+    monkeypatch.undo()
+
+    with zipfile.ZipFile(output_path) as zfh:
+        assert zfh.testzip() is None
+        assert zfh.read("big.bin") == (src_dir / "big.bin").read_bytes()
+        assert zfh.read("tasks.py") == (src_dir / "tasks.py").read_bytes()
+        assert zfh.getinfo("big.bin").file_size == 5000
+    with open(output_path, "rb") as fh:
+        # the zip64 end of central directory record
+        assert b"PK\x06\x06" in fh.read()
+
+
+def test_write_matches_serial_deflate(tmp_path, src_dir):
+    zip_builder = ZipBuilder(compression_level=9)
+    zip_builder.add_file(str(src_dir / "tasks.py"), "tasks.py")
+    output_path = str(tmp_path / "out.zip")
+    zip_builder.write(output_path)
+
+    with zipfile.ZipFile(output_path) as zfh:
+        info = zfh.getinfo("tasks.py")
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    assert info.compress_size == len(compressor.compress((src_dir / "tasks.py").read_bytes()) + compressor.flush())
+
+
+def test_write_without_compression(tmp_path, src_dir):
+    zip_builder = ZipBuilder(compression_level=0)
+    zip_builder.add_directory(str(src_dir))
+    output_path = str(tmp_path / "out.zip")
+    zip_builder.write(output_path)
+
+    with zipfile.ZipFile(output_path) as zfh:
+        assert set(info.compress_type for info in zfh.infolist()) == {zipfile.ZIP_STORED}
+        assert zfh.testzip() is None
+
+
+def test_write_empty(tmp_path):
+    output_path = str(tmp_path / "out.zip")
+    ZipBuilder().write(output_path)
+
+    with zipfile.ZipFile(output_path) as zfh:
+        assert zfh.namelist() == []
+
+
+def test_write_stored_extensions(tmp_path, src_dir):
+    zip_builder = ZipBuilder(stored_extensions=[".PY"])
+    zip_builder.add_file(str(src_dir / "tasks.py"), "tasks.py")
+    zip_builder.add_file(str(src_dir / "package" / "dependency-1.0-py3-none-any.whl"), "dependency-1.0-py3-none-any.whl")
+    output_path = str(tmp_path / "out.zip")
+    zip_builder.write(output_path)
+
+    with zipfile.ZipFile(output_path) as zfh:
+        assert zfh.getinfo("tasks.py").compress_type == zipfile.ZIP_STORED
+        assert zfh.getinfo("dependency-1.0-py3-none-any.whl").compress_type == zipfile.ZIP_DEFLATED
+
+
+def _build(src_dir, output_path, **kwargs):
+    zip_builder = ZipBuilder(**kwargs)
+    zip_builder.add_directory(str(src_dir))
+    zip_builder.add_bytes("manifest.json", b"{}")
+    zip_builder.write(str(output_path))
+    return output_path.read_bytes()
+
+
+def test_write_reproducible(tmp_path, src_dir):
+    first = _build(src_dir, tmp_path / "first.zip", reproducible=True)
+
+    # timestamps, umasks and os.walk order do not change the archive
+    os.utime(str(src_dir / "tasks.py"), (1234567890, 1234567890))
+    os.chmod(str(src_dir / "tasks.py"), 0o600)
+    assert _build(src_dir, tmp_path / "second.zip", reproducible=True, max_workers=1) == first
+
+    with zipfile.ZipFile(str(tmp_path / "first.zip")) as zfh:
+        names = zfh.namelist()
+        assert names == sorted(names)
+        assert set(info.date_time for info in zfh.infolist()) == {(1980, 1, 1, 0, 0, 0)}
+        assert zfh.getinfo("tasks.py").external_attr >> 16 == stat.S_IFREG | 0o644
+
+    # but executable bits are kept
+    os.chmod(str(src_dir / "tasks.py"), 0o700)
+    _build(src_dir, tmp_path / "third.zip", reproducible=True)
+    with zipfile.ZipFile(str(tmp_path / "third.zip")) as zfh:
+        assert zfh.getinfo("tasks.py").external_attr >> 16 == stat.S_IFREG | 0o755
+
+    # without reproducible mode, file timestamps are kept
+    os.utime(str(src_dir / "tasks.py"), (1234567890, 1234567890))
+    _build(src_dir, tmp_path / "fourth.zip")
+    with zipfile.ZipFile(str(tmp_path / "fourth.zip")) as zfh:
+        assert zfh.getinfo("tasks.py").date_time == time.localtime(1234567890)[:6]
+
+
+@pytest.mark.parametrize(
+    "source_date_epoch, expected_date_time", [(None, (1980, 1, 1, 0, 0, 0)), ("0", (1980, 1, 1, 0, 0, 0)), ("1234567890", (2009, 2, 13, 23, 31, 30))]
+)
+def test_get_reproducible_date_time(monkeypatch, source_date_epoch, expected_date_time):
+    if source_date_epoch is None:
+        monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    else:
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", source_date_epoch)
+    assert get_reproducible_date_time() == expected_date_time
+
+
+def test_digest(tmp_path):
+    zip_path = tmp_path / "demo.zip"
+    assert read_digest(str(zip_path)) is None
+
+    zip_path.write_bytes(b"package")
+    digest = write_digest(str(zip_path))
+    assert digest == hashlib.sha256(b"package").hexdigest()
+    assert (tmp_path / "demo.zip.sha256").read_text() == digest + "  demo.zip\n"
+    assert read_digest(str(zip_path)) == digest
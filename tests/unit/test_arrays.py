@@ -0,0 +1,96 @@
+import json
+
+import boto3
+import pytest
+
+from chili_pepper.app import Result
+from chili_pepper.arrays import ArrayEncodingError, decode_arrays, encode_arrays
+from chili_pepper.envelope import ENVELOPE_KEY
+from chili_pepper.offload import PayloadOffloader
+from chili_pepper.serializer import PayloadCodec, SerializerRegistry
+
+numpy = pytest.importorskip("numpy")
+
+BUCKET_NAME = "my-bucket"
+
+
+@pytest.fixture()
+def array_store():
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket=BUCKET_NAME)
+    return PayloadOffloader(lambda: s3_client, BUCKET_NAME, "prefix/", array_threshold=1024)
+
+
+def _round_trip(payload, array_store=None):
+    return decode_arrays(json.loads(json.dumps(encode_arrays(payload, array_store=array_store))), array_store=array_store)
+
+
+@pytest.mark.parametrize(
+    "array",
+    [
+        numpy.arange(12, dtype=numpy.float64).reshape(3, 4),
+        numpy.arange(12, dtype=">i4").reshape(2, 3, 2),
+        numpy.arange(12, dtype=numpy.int16).reshape(3, 4).T,
+        numpy.array([(1, 2.5), (3, 4.5)], dtype=[("id", "<i8"), ("value", "<f4")]),
+        numpy.array(7, dtype=numpy.uint8),
+        numpy.zeros((0, 3)),
+    ],
+)
+def test_round_trip(array):
+    decoded = _round_trip({"array": array, "name": "Jalapeno"})
+
+    assert decoded["name"] == "Jalapeno"
+    assert decoded["array"].dtype == array.dtype
+    numpy.testing.assert_array_equal(decoded["array"], array)
+
+
+def test_encoded_as_raw_buffer():
+    array = numpy.arange(100, dtype=numpy.float32)
+    encoded = encode_arrays([array])[0]
+
+    assert encoded[ENVELOPE_KEY] == {"ndarray": {"dtype": "<f4", "shape": [100]}}
+    assert len(encoded["data"]) == 4 * ((array.nbytes + 2) // 3)
+
+
+def test_big_arrays_go_to_s3(array_store):
+    small_array = numpy.arange(10)
+    big_array = numpy.arange(1000)
+
+    encoded = encode_arrays({"small": small_array, "big": big_array}, array_store=array_store)
+
+    assert "s3" not in encoded["small"][ENVELOPE_KEY]["ndarray"]
+    assert "data" not in encoded["big"]
+    assert encoded["big"][ENVELOPE_KEY]["ndarray"]["s3"]["bucket"] == BUCKET_NAME
+    numpy.testing.assert_array_equal(decode_arrays(encoded, array_store=array_store)["big"], big_array)
+
+
+def test_object_arrays_are_rejected():
+    with pytest.raises(ArrayEncodingError):
+        encode_arrays(numpy.array([{"name": "Jalapeno"}], dtype=object))
+
+
+@pytest.mark.parametrize("serializer", ["json", "pickle", "msgpack"])
+def test_codec(serializer):
+    if serializer == "msgpack":
+        pytest.importorskip("msgpack")
+    codec = PayloadCodec(SerializerRegistry(), serializer=serializer, compression="zlib")
+    array = numpy.linspace(0, 1, 1000)
+
+    numpy.testing.assert_array_equal(codec.loads(codec.dumps({"array": array}))["array"], array)
+
+
+def test_record_batch():
+    pyarrow = pytest.importorskip("pyarrow")
+    record_batch = pyarrow.RecordBatch.from_arrays([pyarrow.array([1, 2, 3]), pyarrow.array(["a", "b", "c"])], names=["number", "letter"])
+
+    assert _round_trip({"batch": record_batch})["batch"].equals(record_batch)
+
+
+def test_result_open(fake_lambda_client):
+    array = numpy.arange(1000, dtype=numpy.float64)
+    fake_lambda_client.handler = lambda event, context: encode_arrays({"array": array})
+    result = Result("say_hello", {}, lambda_client=fake_lambda_client, codec=PayloadCodec(SerializerRegistry()))
+
+    numpy.testing.assert_array_equal(result.get()["array"], array)
+    decoded = decode_arrays(json.loads(b"".join(result.iter_chunks(chunk_size=100)).decode("utf8")))
+    numpy.testing.assert_array_equal(decoded["array"], array)
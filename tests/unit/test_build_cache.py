@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+
+from chili_pepper.build_cache import BuildCache, compute_build_key, get_default_build_cache_dir
+
+
+def _write(path, body):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    return path
+
+
+@pytest.fixture
+def app_dir(tmp_path):
+    app_dir = tmp_path / "app"
+    _write(app_dir / "tasks.py", b"print('hello')")
+    _write(app_dir / "lib" / "helpers.py", b"x = 1")
+    _write(app_dir / "requirements.txt", b"requests==2.22.0")
+    return app_dir
+
+
+def test_build_key_is_stable(app_dir):
+    assert compute_build_key(str(app_dir), "python3.7", "{}") == compute_build_key(str(app_dir), "python3.7", "{}")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda app_dir: _write(app_dir / "tasks.py", b"print('goodbye')"),
+        lambda app_dir: _write(app_dir / "requirements.txt", b"requests==2.23.0"),
+        lambda app_dir: _write(app_dir / "lib" / "new.py", b""),
+        lambda app_dir: os.rename(str(app_dir / "lib" / "helpers.py"), str(app_dir / "lib" / "renamed.py")),
+    ],
+)
+def test_build_key_changes_with_sources(app_dir, change):
+    before = compute_build_key(str(app_dir), "python3.7", "{}")
+    change(app_dir)
+    assert compute_build_key(str(app_dir), "python3.7", "{}") != before
+
+
+def test_build_key_changes_with_runtime_and_manifest(app_dir):
+    key = compute_build_key(str(app_dir), "python3.7", "{}")
+    assert compute_build_key(str(app_dir), "python3.6", "{}") != key
+    assert compute_build_key(str(app_dir), "python3.7", '{"functions": {}}') != key
+
+
+def test_build_key_ignores_mtimes_and_excluded_paths(app_dir):
+    key = compute_build_key(str(app_dir), "python3.7", "{}")
+    os.utime(str(app_dir / "tasks.py"), (0, 0))
+    output_path = _write(app_dir / "demo.zip", b"zip")
+    assert compute_build_key(str(app_dir), "python3.7", "{}", exclude=[str(output_path)]) == key
+
+
+def test_default_build_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert get_default_build_cache_dir() == os.path.join(str(tmp_path), "chili-pepper", "builds")
+
+
+def test_get_and_put(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"))
+    dest_path = tmp_path / "demo.zip"
+
+    assert cache.get("key", str(dest_path)) is False
+    assert not dest_path.exists()
+
+    zip_path = _write(tmp_path / "built.zip", b"package")
+    cache.put("key", str(zip_path))
+    _write(dest_path, b"stale package")
+
+    assert cache.get("key", str(dest_path)) is True
+    assert dest_path.read_bytes() == b"package"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_falls_back_to_copy(tmp_path, mocker):
+    cache = BuildCache(str(tmp_path / "cache"))
+    cache.put("key", str(_write(tmp_path / "built.zip", b"package")))
+    mocker.patch("os.link", side_effect=OSError("cross-device link"))
+
+    assert cache.get("key", str(tmp_path / "demo.zip")) is True
+    assert (tmp_path / "demo.zip").read_bytes() == b"package"
+
+
+def test_eviction_is_least_recently_used(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"), max_bytes=25)
+    for i, key in enumerate(["a", "b"]):
+        cache.put(key, str(_write(tmp_path / (key + ".zip"), b"0123456789")))
+        os.utime(os.path.join(cache.directory, key + ".zip"), (time.time() - 100 + i, time.time() - 100 + i))
+
+    # reading "a" makes "b" the least recently used
+    assert cache.get("a", str(tmp_path / "out.zip")) is True
+    cache.put("c", str(_write(tmp_path / "c.zip", b"0123456789")))
+
+    assert cache.evictions == 1
+    assert sorted(os.listdir(cache.directory)) == ["a.zip", "c.zip"]
+
+
+def test_put_skips_zips_over_the_limit(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"), max_bytes=5)
+    cache.put("key", str(_write(tmp_path / "built.zip", b"0123456789")))
+    assert cache.get("key", str(tmp_path / "out.zip")) is False
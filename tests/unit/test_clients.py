@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chili_pepper.app import ChiliPepper
+from chili_pepper.clients import ClientPool
+
+
+def test_client_is_reused():
+    client_pool = ClientPool()
+
+    assert client_pool.client("lambda") is client_pool.client("lambda")
+    assert client_pool.client("lambda") is not client_pool.client("cloudformation")
+    assert client_pool.client("lambda") is not client_pool.client("lambda", read_timeout=5)
+
+
+def test_client_is_shared_between_threads():
+    client_pool = ClientPool()
+
+    executor = ThreadPoolExecutor(max_workers=8)
+    clients = list(executor.map(lambda _: client_pool.client("lambda"), range(32)))
+    executor.shutdown()
+
+    assert all(client is clients[0] for client in clients)
+
+
+@pytest.mark.parametrize("max_pool_connections", [None, 1, 50])
+@pytest.mark.parametrize("tcp_keepalive", [True, False])
+def test_client_config(max_pool_connections, tcp_keepalive):
+    client_pool = ClientPool(max_pool_connections=max_pool_connections, tcp_keepalive=tcp_keepalive)
+
+    client_config = client_pool.client("lambda", read_timeout=5).meta.config
+
+    assert client_config.max_pool_connections == (max_pool_connections if max_pool_connections is not None else 10)
+    assert client_config.tcp_keepalive == tcp_keepalive
+    assert client_config.read_timeout == 5
+
+
+def test_app_client_pool_config():
+    app = ChiliPepper().create_app("test_app")
+    app.conf["aws"]["max_pool_connections"] = 42
+    app.conf["aws"]["tcp_keepalive"] = False
+
+    assert app.client_pool is app.client_pool
+    assert app.client_pool.max_pool_connections == 42
+    assert app.client_pool.tcp_keepalive is False
+
+
+def test_prewarm_clients(mocker):
+    app = ChiliPepper().create_app("test_app")
+    client_spy = mocker.spy(app.client_pool, "client")
+
+    app.prewarm_clients()
+
+    assert sorted(call[0][0] for call in client_spy.call_args_list) == ["cloudformation", "lambda"]
@@ -0,0 +1,80 @@
+import json
+from concurrent import futures
+
+import pytest
+
+from chili_pepper.deadline import (
+    DeadlineContext,
+    DeadlineExceededError,
+    add_deadline,
+    get_invoke_timeouts,
+    is_deadline_event,
+    unwrap_deadline_event,
+)
+from chili_pepper.envelope import ENVELOPE_KEY
+
+
+class FakeContext:
+    function_name = "my_function"
+
+    def get_remaining_time_in_millis(self):
+        return 1000
+
+
+@pytest.fixture()
+def fake_time(mocker):
+    return mocker.patch("chili_pepper.deadline.time.time", return_value=1000.0)
+
+
+@pytest.mark.parametrize(
+    "function_timeout, wait, remaining, expected_timeouts",
+    [
+        (None, False, None, {}),
+        (None, True, None, {"read_timeout": 18}),
+        (300, True, None, {"read_timeout": 315}),
+        (300, True, 2.5, {"read_timeout": 3, "connect_timeout": 3}),
+        (300, True, 0.01, {"read_timeout": 1, "connect_timeout": 1}),
+        (300, True, 41, {"read_timeout": 50, "connect_timeout": 50}),
+        (300, True, 200, {"read_timeout": 200, "connect_timeout": 60}),
+        (None, True, 200, {"read_timeout": 18, "connect_timeout": 60}),
+        (None, False, 200, {"read_timeout": 60, "connect_timeout": 60}),
+    ],
+)
+def test_get_invoke_timeouts(fake_time, function_timeout, wait, remaining, expected_timeouts):
+    deadline = 1000.0 + remaining if remaining is not None else None
+    assert get_invoke_timeouts(function_timeout, wait, deadline=deadline) == expected_timeouts
+
+
+def test_deadline_event(fake_time):
+    event = json.loads(add_deadline(json.dumps({"name": "Jalapeno"}), 1002.5))
+
+    assert is_deadline_event(event)
+    assert not is_deadline_event({"name": "Jalapeno"})
+    assert event[ENVELOPE_KEY] == {"budget_ms": 2500}
+
+    fake_time.return_value = 2000.0
+    unwrapped_event, context = unwrap_deadline_event(event, FakeContext())
+    assert unwrapped_event == {"name": "Jalapeno"}
+    assert context.deadline == 2002.5
+
+
+def test_spent_budget():
+    with pytest.raises(DeadlineExceededError):
+        unwrap_deadline_event({ENVELOPE_KEY: {"budget_ms": 0}, "event": {}}, None)
+
+
+def test_deadline_context(fake_time):
+    context = DeadlineContext(FakeContext(), 1000.5)
+    assert context.get_remaining_time_in_millis() == 500
+    assert context.function_name == "my_function"
+
+    # the function's own timeout comes first
+    assert DeadlineContext(FakeContext(), 1005).get_remaining_time_in_millis() == 1000
+
+    assert DeadlineContext(None, 1000.25).get_remaining_time_in_millis() == 250
+    fake_time.return_value = 1001.0
+    assert DeadlineContext(None, 1000.25).get_remaining_time_in_millis() == 0
+
+
+def test_deadline_exceeded_is_a_timeout():
+    assert issubclass(DeadlineExceededError, futures.TimeoutError)
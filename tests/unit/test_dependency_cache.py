@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from chili_pepper.dependency_cache import DependencyCache, compute_requirements_key, get_default_dependency_cache_dir, install_requirements
+
+
+def _fake_pip(files):
+    # installs the named files with the given bodies into the -t directory
+    def check_call(command):
+        target_dir = command[command.index("-t") + 1]
+        for name, body in files.items():
+            with open(os.path.join(target_dir, name), "wb") as fh:
+                fh.write(body)
+
+    return check_call
+
+
+@pytest.fixture
+def requirements_path(tmp_path):
+    requirements_path = tmp_path / "requirements.txt"
+    requirements_path.write_bytes(b"requests==2.22.0")
+    return str(requirements_path)
+
+
+def test_requirements_key(requirements_path):
+    key = compute_requirements_key(requirements_path, "python3.7")
+    assert compute_requirements_key(requirements_path, "python3.7") == key
+    assert compute_requirements_key(requirements_path, "python3.6") != key
+
+    with open(requirements_path, "wb") as fh:
+        fh.write(b"requests==2.23.0")
+    assert compute_requirements_key(requirements_path, "python3.7") != key
+
+
+def test_default_dependency_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert get_default_dependency_cache_dir() == os.path.join(str(tmp_path), "chili-pepper", "dependencies")
+
+
+@pytest.mark.parametrize("cache_dir", [None, "/tmp/wheels"])
+def test_install_requirements(mocker, requirements_path, cache_dir):
+    check_call = mocker.patch.object(subprocess, "check_call")
+    install_requirements(requirements_path, "/tmp/target", cache_dir=cache_dir)
+
+    expected_command = [sys.executable, "-m", "pip", "install", "-r", requirements_path, "-t", "/tmp/target", "--ignore-installed"]
+    if cache_dir is not None:
+        expected_command += ["--cache-dir", cache_dir]
+    check_call.assert_called_once_with(expected_command)
+
+
+def test_get_installed(mocker, tmp_path, requirements_path):
+    check_call = mocker.patch.object(subprocess, "check_call", side_effect=_fake_pip({"requests.py": b"requests"}))
+    cache = DependencyCache(str(tmp_path / "cache"))
+
+    tree_path = cache.get_installed(requirements_path, "python3.7")
+    assert os.listdir(tree_path) == ["requests.py"]
+    assert check_call.call_args[0][0][-2:] == ["--cache-dir", cache.wheel_cache_dir]
+
+    # the second time, pip is not run at all
+    assert cache.get_installed(requirements_path, "python3.7") == tree_path
+    assert check_call.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_installed_failure_is_not_cached(mocker, tmp_path, requirements_path):
+    mocker.patch.object(subprocess, "check_call", side_effect=subprocess.CalledProcessError(1, "pip"))
+    cache = DependencyCache(str(tmp_path / "cache"))
+
+    with pytest.raises(subprocess.CalledProcessError):
+        cache.get_installed(requirements_path, "python3.7")
+    assert os.listdir(os.path.join(cache.directory, "installed")) == []
+
+
+def test_eviction_is_least_recently_used(mocker, tmp_path):
+    mocker.patch.object(subprocess, "check_call", side_effect=_fake_pip({"lib.py": b"0123456789"}))
+    cache = DependencyCache(str(tmp_path / "cache"), max_bytes=25)
+
+    tree_paths = dict()
+    for i, name in enumerate(["a", "b", "c"]):
+        requirements_path = tmp_path / (name + ".txt")
+        requirements_path.write_bytes(name.encode("utf8"))
+        tree_paths[name] = cache.get_installed(str(requirements_path), "python3.7")
+        os.utime(tree_paths[name], (time.time() - 100 + i, time.time() - 100 + i))
+        if name == "b":
+            # reading "a" makes "b" the least recently used
+            cache.get_installed(str(tmp_path / "a.txt"), "python3.7")
+
+    assert cache.evictions == 1
+    assert os.path.isdir(tree_paths["a"])
+    assert not os.path.exists(tree_paths["b"])
+    assert os.path.isdir(tree_paths["c"])
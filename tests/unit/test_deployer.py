@@ -1,12 +1,22 @@
+import hashlib
+import os
+import re
+import zipfile
 from copy import deepcopy
+from pathlib import Path
 
 import awacs
+import boto3
 import pytest
-from troposphere import awslambda, iam
+from botocore.exceptions import ClientError
+from troposphere import Ref, Template, awslambda, iam
 
 from chili_pepper.app import AwsAllowPermission, ChiliPepper
+from chili_pepper.archive import read_digest
+from chili_pepper.clients import ClientPool
 from chili_pepper.config import Config
-from chili_pepper.deployer import Deployer
+from chili_pepper.dependency_cache import compute_requirements_key
+from chili_pepper.deployer import LAYER_LOGICAL_ID, Deployer, FunctionIdCache, FunctionNotFoundError, load_function_manifest
 
 try:
     from collections.abc import Iterable
@@ -137,6 +147,19 @@ def test_get_cloudformation_template_timeout(timeout):
         assert function_resource.Timeout == timeout
 
 
+@pytest.mark.parametrize("reserved_concurrency", [None, 0, 10])
+def test_get_cloudformation_template_reserved_concurrency(reserved_concurrency):
+    task_kwargs = {"reserved_concurrency": reserved_concurrency}
+
+    cloudformation_template = _get_cloudformation_template_with_test_setup(config=Config(), task_kwargs=task_kwargs)
+    function_resource = cloudformation_template.resources["TestsUnitTestDeployerSayHello"]
+
+    if reserved_concurrency is None:
+        assert "ReservedConcurrentExecutions" not in function_resource.to_dict()["Properties"]
+    else:
+        assert function_resource.ReservedConcurrentExecutions == reserved_concurrency
+
+
 @pytest.mark.parametrize("kms_key", [None, "fake_none", "", "my_kms_key"])
 def test_get_cloudformation_template_kms_key(kms_key):
     config = Config()
@@ -288,3 +311,423 @@ def test_get_cloudformation_template_tracing(tracing_value):
         assert function_resource.TracingConfig.to_dict() == expected_tracing_config.to_dict()
     else:
         assert "TracingConfig" not in function_resource.to_dict()["Properties"]
+
+
+def _fake_cf_client(mocker, pages):
+    cf_client = mocker.MagicMock()
+    cf_client.get_paginator.return_value.paginate.return_value = pages
+    return cf_client
+
+
+def _stack_resource_pages():
+    return [
+        {
+            "StackResourceSummaries": [
+                {"LogicalResourceId": "FunctionRole", "PhysicalResourceId": "my-role", "ResourceType": "AWS::IAM::Role"},
+                {"LogicalResourceId": "TasksSayHello", "PhysicalResourceId": "demo-TasksSayHello-ABC", "ResourceType": "AWS::Lambda::Function"},
+            ]
+        },
+        {
+            "StackResourceSummaries": [
+                {"LogicalResourceId": "TasksSayGoodbye", "PhysicalResourceId": "demo-TasksSayGoodbye-DEF", "ResourceType": "AWS::Lambda::Function"}
+            ]
+        },
+    ]
+
+
+def test_function_id_cache_fills_whole_stack_once(mocker):
+    cf_client = _fake_cf_client(mocker, _stack_resource_pages())
+    function_id_cache = FunctionIdCache()
+
+    assert function_id_cache.get(cf_client, "demo", "TasksSayHello", ttl=None) == "demo-TasksSayHello-ABC"
+    assert function_id_cache.get(cf_client, "demo", "TasksSayGoodbye", ttl=None) == "demo-TasksSayGoodbye-DEF"
+
+    cf_client.get_paginator.assert_called_once_with("list_stack_resources")
+    cf_client.get_paginator.return_value.paginate.assert_called_once_with(StackName="demo")
+
+
+def test_function_id_cache_missing_function(mocker):
+    cf_client = _fake_cf_client(mocker, _stack_resource_pages())
+    function_id_cache = FunctionIdCache()
+
+    assert function_id_cache.get(cf_client, "demo", "FunctionRole", ttl=None) is None
+    assert function_id_cache.get(cf_client, "demo", "TasksSayNothing", ttl=None) is None
+    assert function_id_cache.get(cf_client, "demo", "TasksSayNothing", ttl=None) is None
+
+    # misses are cached like hits, until the cache is invalidated
+    assert cf_client.get_paginator.return_value.paginate.call_count == 1
+    function_id_cache.invalidate()
+    assert function_id_cache.get(cf_client, "demo", "TasksSayNothing", ttl=None) is None
+    assert cf_client.get_paginator.return_value.paginate.call_count == 2
+
+
+@pytest.mark.parametrize("ttl, expected_fills", [(None, 1), (600, 1), (0, 2)])
+def test_function_id_cache_ttl(mocker, ttl, expected_fills):
+    cf_client = _fake_cf_client(mocker, _stack_resource_pages())
+    function_id_cache = FunctionIdCache()
+
+    function_id_cache.get(cf_client, "demo", "TasksSayHello", ttl=ttl)
+    function_id_cache.get(cf_client, "demo", "TasksSayHello", ttl=ttl)
+
+    assert cf_client.get_paginator.return_value.paginate.call_count == expected_fills
+
+
+def test_function_id_cache_invalidate(mocker):
+    cf_client = _fake_cf_client(mocker, _stack_resource_pages())
+    function_id_cache = FunctionIdCache()
+
+    function_id_cache.get(cf_client, "demo", "TasksSayHello", ttl=None)
+    function_id_cache.invalidate()
+    function_id_cache.get(cf_client, "demo", "TasksSayHello", ttl=None)
+
+    assert cf_client.get_paginator.return_value.paginate.call_count == 2
+
+
+@pytest.mark.parametrize("deterministic_function_names", [None, False, True])
+def test_get_cloudformation_template_function_name(deterministic_function_names):
+    config = Config()
+    if deterministic_function_names is not None:
+        config["aws"]["deterministic_function_names"] = deterministic_function_names
+
+    cloudformation_template = _get_cloudformation_template_with_test_setup(config=config, task_kwargs=dict())
+    function_resource = cloudformation_template.resources["TestsUnitTestDeployerSayHello"]
+
+    if deterministic_function_names is True:
+        assert function_resource.FunctionName == "test_get_cloudformation_template-TestsUnitTestDeployerSayHello"
+    else:
+        assert "FunctionName" not in function_resource.to_dict()["Properties"]
+
+
+@pytest.mark.parametrize("app_name", ["demo", "my app", "a" * 100])
+def test_get_function_name(app_name):
+    app = ChiliPepper().create_app(app_name=app_name)
+    deployer = Deployer(app=app)
+
+    function_name = deployer._get_function_name("tasks.say_hello")
+
+    assert len(function_name) <= 64
+    assert re.match("^[a-zA-Z0-9_-]+$", function_name)
+    assert function_name == deployer._get_function_name("tasks.say_hello")
+    assert function_name != deployer._get_function_name("tasks.say_goodbye")
+
+
+@pytest.mark.parametrize("deterministic_function_names", [False, True])
+def test_function_manifest(tmp_path, deterministic_function_names):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["deterministic_function_names"] = deterministic_function_names
+
+    @app.task()
+    def say_hello(event, context):
+        pass
+
+    deployer = Deployer(app=app)
+    manifest_path = deployer._write_function_manifest(tmp_path)
+
+    function_manifest = load_function_manifest(manifest_path)
+    expected_function_name = "demo-TestsUnitTestDeployerSayHello" if deterministic_function_names else None
+    assert function_manifest == {"tests.unit.test_deployer.say_hello": {"logical_id": "TestsUnitTestDeployerSayHello", "function_name": expected_function_name}}
+
+
+def test_get_function_id_without_aws(tmp_path, mocker):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["deterministic_function_names"] = True
+
+    @app.task()
+    def say_hello(event, context):
+        pass
+
+    mocked_client_pool_client = mocker.patch.object(ClientPool, "client")
+
+    # deterministic names
+    assert Deployer(app=app).get_function_id(say_hello) == "demo-TestsUnitTestDeployerSayHello"
+
+    # function manifest
+    manifest_path = Deployer(app=app)._write_function_manifest(tmp_path)
+    manifest_app = ChiliPepper().create_app(app_name="demo")
+    manifest_app.conf["aws"]["function_manifest"] = str(manifest_path)
+    manifest_app.task()(say_hello)
+    assert Deployer(app=manifest_app).get_function_id(say_hello) == "demo-TestsUnitTestDeployerSayHello"
+
+    mocked_client_pool_client.assert_not_called()
+
+
+def test_get_function_id_missing_function(mocker):
+    app = ChiliPepper().create_app(app_name="demo")
+
+    @app.task()
+    def say_hello(event, context):
+        pass
+
+    cf_client = _fake_cf_client(mocker, _stack_resource_pages())
+    mocker.patch.object(ClientPool, "client", return_value=cf_client)
+
+    deployer = Deployer(app=app)
+    for _ in range(2):
+        with pytest.raises(FunctionNotFoundError, match="TestsUnitTestDeployerSayHello"):
+            deployer.get_function_id(say_hello)
+
+    cf_client.get_paginator.return_value.paginate.assert_called_once_with(StackName="demo")
+
+
+def _create_app_dir(tmp_path):
+    app_dir = tmp_path / "app"
+    app_dir.mkdir()
+    (app_dir / "tasks.py").write_text(u"x = 1")
+    return app_dir
+
+
+def test_create_deployment_package_build_cache(tmp_path, mocker):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["build_cache_dir"] = str(tmp_path / "cache")
+    app_dir = _create_app_dir(tmp_path)
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    deployer = Deployer(app=app)
+
+    package_path = deployer._create_deployment_package(dest, app_dir, use_build_cache=True)
+    package_bytes = package_path.read_bytes()
+
+    # nothing changed, so the package is not built again
+    zipfile_spy = mocker.spy(zipfile, "ZipFile")
+    package_path.unlink()
+    assert deployer._create_deployment_package(dest, app_dir, use_build_cache=True) == package_path
+    assert package_path.read_bytes() == package_bytes
+    assert zipfile_spy.call_count == 0
+    assert (app.build_cache.hits, app.build_cache.misses) == (1, 1)
+
+    # rebuilding does not write through to the cached package
+    (app_dir / "tasks.py").write_text(u"x = 2")
+    deployer._create_deployment_package(dest, app_dir, use_build_cache=True)
+    assert zipfile_spy.call_count == 1
+    assert app.build_cache.misses == 2
+    (app_dir / "tasks.py").write_text(u"x = 1")
+    deployer._create_deployment_package(dest, app_dir, use_build_cache=True)
+    assert package_path.read_bytes() == package_bytes
+
+
+def test_create_deployment_package_without_build_cache(tmp_path, mocker):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["build_cache_dir"] = str(tmp_path / "cache")
+    app_dir = _create_app_dir(tmp_path)
+    deployer = Deployer(app=app)
+
+    deployer._create_deployment_package(tmp_path, app_dir)
+    deployer._create_deployment_package(tmp_path, app_dir)
+
+    assert not (tmp_path / "cache").exists()
+
+
+@pytest.mark.parametrize("use_build_cache", [False, True])
+def test_create_deployment_package_requirements(tmp_path, mocker, use_build_cache):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["build_cache_dir"] = str(tmp_path / "build_cache")
+    app.conf["dependency_cache_dir"] = str(tmp_path / "dependency_cache")
+    app_dir = _create_app_dir(tmp_path)
+    (app_dir / "requirements.txt").write_text(u"requests==2.22.0")
+
+    def fake_install_requirements(requirements_path, target_dir, cache_dir=None):
+        (Path(target_dir) / "requests.py").write_text(u"")
+
+    install_requirements = mocker.patch("chili_pepper.dependency_cache.install_requirements", side_effect=fake_install_requirements)
+    mocker.patch("chili_pepper.deployer.install_requirements", new=install_requirements)
+    deployer = Deployer(app=app)
+
+    package_path = deployer._create_deployment_package(tmp_path, app_dir, use_build_cache=use_build_cache)
+    with zipfile.ZipFile(str(package_path)) as zfh:
+        assert "requests.py" in zfh.namelist()
+
+    # a code change rebuilds the package, but only installs the requirements again without the cache
+    (app_dir / "tasks.py").write_text(u"x = 2")
+    deployer._create_deployment_package(tmp_path, app_dir, use_build_cache=use_build_cache)
+    with zipfile.ZipFile(str(package_path)) as zfh:
+        assert "requests.py" in zfh.namelist()
+    assert install_requirements.call_count == (1 if use_build_cache else 2)
+    assert (tmp_path / "dependency_cache").exists() is use_build_cache
+
+
+def test_get_cloudformation_template_dependency_layer():
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["bucket_name"] = "my_test_bucket"
+    app.conf["aws"]["runtime"] = "python3.7"
+
+    @app.task()
+    def say_hello(event, context):
+        pass
+
+    deployer = Deployer(app=app)
+    code_argument = awslambda.Code(S3Bucket="my_test_bucket", S3Key="demo_deployment_package.zip")
+    layer_content = awslambda.Content(S3Bucket="my_test_bucket", S3Key="demo_layers/abc.zip")
+
+    template_resources = deployer._get_cloudformation_template(code_argument, layer_content=layer_content).resources
+
+    layer = template_resources[LAYER_LOGICAL_ID]
+    assert type(layer) == awslambda.LayerVersion
+    assert layer.Content == layer_content
+    assert layer.CompatibleRuntimes == ["python3.7"]
+    assert template_resources["TestsUnitTestDeployerSayHello"].Layers == [Ref(layer)]
+
+    # without a layer, functions do not get one
+    template_resources = deployer._get_cloudformation_template(code_argument).resources
+    assert LAYER_LOGICAL_ID not in template_resources
+    assert "Layers" not in template_resources["TestsUnitTestDeployerSayHello"].properties
+
+
+def test_create_layer_package(tmp_path, mocker):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["build_cache_dir"] = str(tmp_path / "build_cache")
+    app.conf["dependency_cache_dir"] = str(tmp_path / "dependency_cache")
+    app_dir = _create_app_dir(tmp_path)
+    requirements_path = app_dir / "requirements.txt"
+    requirements_path.write_text(u"requests==2.22.0")
+
+    def fake_install_requirements(requirements_path, target_dir, cache_dir=None):
+        (Path(target_dir) / "requests.py").write_text(u"")
+
+    install_requirements = mocker.patch("chili_pepper.dependency_cache.install_requirements", side_effect=fake_install_requirements)
+    deployer = Deployer(app=app)
+
+    layer_path, layer_hash = deployer._create_layer_package(tmp_path, requirements_path, use_build_cache=True)
+    with zipfile.ZipFile(str(layer_path)) as zfh:
+        assert zfh.namelist() == ["python/requests.py"]
+    assert layer_hash == compute_requirements_key(str(requirements_path), "python3.7")
+
+    # the layer is content addressed, so the same requirements give the same layer
+    assert deployer._create_layer_package(tmp_path, requirements_path, use_build_cache=True) == (layer_path, layer_hash)
+    assert app.build_cache.hits == 1
+    assert install_requirements.call_count == 1
+
+    # and the code package leaves the requirements out
+    package_path = deployer._create_deployment_package(tmp_path, app_dir, use_build_cache=True, include_requirements=False)
+    with zipfile.ZipFile(str(package_path)) as zfh:
+        assert "requests.py" not in zfh.namelist()
+    assert install_requirements.call_count == 1
+
+
+@pytest.mark.parametrize("use_build_cache", [False, True])
+def test_create_deployment_package_in_app_dir(tmp_path, mocker, use_build_cache):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["reproducible_packages"] = True
+    app.conf["build_cache_dir"] = str(tmp_path / "build_cache")
+    app.conf["dependency_cache_dir"] = str(tmp_path / "dependency_cache")
+    app_dir = _create_app_dir(tmp_path)
+    requirements_path = app_dir / "requirements.txt"
+    requirements_path.write_text(u"requests==2.22.0")
+
+    def fake_install_requirements(requirements_path, target_dir, cache_dir=None):
+        (Path(target_dir) / "requests.py").write_text(u"")
+
+    mocker.patch("chili_pepper.dependency_cache.install_requirements", side_effect=fake_install_requirements)
+    mocker.patch("chili_pepper.deployer.install_requirements", side_effect=fake_install_requirements)
+    deployer = Deployer(app=app)
+
+    # the CLI defaults both the app dir and the deployment package dir to the working directory
+    for _ in range(2):
+        deployer._create_layer_package(app_dir, requirements_path, use_build_cache=use_build_cache)
+        package_path = deployer._create_deployment_package(app_dir, app_dir, use_build_cache=use_build_cache, include_requirements=False)
+        deployer._write_function_manifest(app_dir)
+
+    with zipfile.ZipFile(str(package_path)) as zfh:
+        assert sorted(zfh.namelist()) == ["chili_pepper_manifest.json", "requirements.txt", "tasks.py"]
+
+
+def test_send_layer_package_to_s3(tmp_path, mocker):
+    bucket_name = "my_test_bucket"
+    boto3.client("s3").create_bucket(Bucket=bucket_name)
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["bucket_name"] = bucket_name
+    deployer = Deployer(app=app)
+    layer_path = tmp_path / "demo_layer.zip"
+    layer_path.write_bytes(b"layer")
+
+    layer_content = deployer._send_layer_package_to_s3(layer_path, "abc")
+    assert layer_content.S3Bucket == bucket_name
+    assert layer_content.S3Key == "demo_layers/abc.zip"
+    assert boto3.client("s3").get_object(Bucket=bucket_name, Key="demo_layers/abc.zip")["Body"].read() == b"layer"
+
+    # an unchanged layer is not sent again
+    layer_path.write_bytes(b"rebuilt layer")
+    assert deployer._send_layer_package_to_s3(layer_path, "abc").S3Key == "demo_layers/abc.zip"
+    assert boto3.client("s3").get_object(Bucket=bucket_name, Key="demo_layers/abc.zip")["Body"].read() == b"layer"
+
+
+def test_create_deployment_package_compression_level(tmp_path):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["build_cache_dir"] = str(tmp_path / "cache")
+    app_dir = _create_app_dir(tmp_path)
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    deployer = Deployer(app=app)
+
+    deployer._create_deployment_package(dest, app_dir, use_build_cache=True)
+
+    # the cached package was built with another compression level, so it is not reused
+    app.conf["package_compression_level"] = 0
+    package_path = deployer._create_deployment_package(dest, app_dir, use_build_cache=True)
+    assert app.build_cache.misses == 2
+    with zipfile.ZipFile(str(package_path)) as zfh:
+        assert set(info.compress_type for info in zfh.infolist()) == {zipfile.ZIP_STORED}
+
+
+def test_create_deployment_package_reproducible(tmp_path):
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["runtime"] = "python3.7"
+    app.conf["reproducible_packages"] = True
+    app_dir = _create_app_dir(tmp_path)
+    deployer = Deployer(app=app)
+
+    package_path = deployer._create_deployment_package(tmp_path, app_dir)
+    package_bytes = package_path.read_bytes()
+    digest = read_digest(str(package_path))
+    assert digest == hashlib.sha256(package_bytes).hexdigest()
+
+    os.utime(str(app_dir / "tasks.py"), (1234567890, 1234567890))
+    assert deployer._create_deployment_package(tmp_path, app_dir).read_bytes() == package_bytes
+    assert read_digest(str(package_path)) == digest
+
+    # the digest is removed when packages are not reproducible
+    app.conf["reproducible_packages"] = False
+    deployer._create_deployment_package(tmp_path, app_dir)
+    assert read_digest(str(package_path)) is None
+
+
+def test_send_deployment_package_to_s3_skips_unchanged(tmp_path):
+    bucket_name = "my_test_bucket"
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket=bucket_name)
+    s3_client.put_bucket_versioning(Bucket=bucket_name, VersioningConfiguration={"Status": "Enabled"})
+    app = ChiliPepper().create_app(app_name="demo")
+    app.conf["aws"]["bucket_name"] = bucket_name
+    deployer = Deployer(app=app)
+    package_path = tmp_path / "demo.zip"
+    package_path.write_bytes(b"package")
+
+    first_code = deployer._send_deployment_package_to_s3(package_path, digest="abc")
+    assert deployer._send_deployment_package_to_s3(package_path, digest="abc").S3ObjectVersion == first_code.S3ObjectVersion
+    assert deployer._send_deployment_package_to_s3(package_path, digest="def").S3ObjectVersion != first_code.S3ObjectVersion
+    # without a digest, it is always sent
+    assert deployer._send_deployment_package_to_s3(package_path).S3ObjectVersion != first_code.S3ObjectVersion
+
+    versions = s3_client.list_object_versions(Bucket=bucket_name, Prefix="demo_deployment_package.zip")["Versions"]
+    assert len(versions) == 3
+
+
+def test_deploy_template_to_cloudformation_unchanged(mocker):
+    app = ChiliPepper().create_app(app_name="demo")
+    deployer = Deployer(app=app)
+    cf_client = mocker.Mock()
+    cf_client.exceptions.ClientError = ClientError
+    cf_client.describe_stacks.return_value = {"Stacks": [{"StackId": "demo-stack-id"}]}
+    cf_client.update_stack.side_effect = ClientError({"Error": {"Code": "ValidationError", "Message": "No updates are to be performed."}}, "UpdateStack")
+    mocker.patch.object(boto3, "client", return_value=cf_client)
+
+    assert deployer._deploy_template_to_cloudformation(Template()) == "demo-stack-id"
+
+    cf_client.update_stack.side_effect = ClientError({"Error": {"Code": "ValidationError", "Message": "Template format error"}}, "UpdateStack")
+    with pytest.raises(ClientError):
+        deployer._deploy_template_to_cloudformation(Template())
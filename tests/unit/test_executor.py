@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from chili_pepper.app import ChiliPepper
+from chili_pepper.executor import BackpressurePolicy, ExecutorFullError, InvocationExecutor
+
+
+def _blocked_executor(max_in_flight, queue_depth, backpressure_policy):
+    """Fill an executor with invocations that wait until the returned event is set"""
+    executor = InvocationExecutor(max_in_flight=max_in_flight, queue_depth=queue_depth, backpressure_policy=backpressure_policy)
+    release_event = threading.Event()
+    futures = [executor.submit(release_event.wait) for _ in range(max_in_flight + queue_depth)]
+    return executor, release_event, futures
+
+
+def test_max_in_flight():
+    max_in_flight = 3
+    executor = InvocationExecutor(max_in_flight=max_in_flight, queue_depth=100)
+
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+    release_event = threading.Event()
+
+    def invocation():
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        release_event.wait(0.05)
+        with lock:
+            running[0] -= 1
+
+    futures = [executor.submit(invocation) for _ in range(20)]
+    for future in futures:
+        future.result()
+    executor.shutdown()
+
+    assert max_running[0] == max_in_flight
+
+
+def test_reject_when_full():
+    executor, release_event, futures = _blocked_executor(max_in_flight=2, queue_depth=2, backpressure_policy=BackpressurePolicy.REJECT)
+
+    with pytest.raises(ExecutorFullError):
+        executor.submit(lambda: None)
+
+    release_event.set()
+    for future in futures:
+        future.result()
+
+    # there is room again, now that the invocations are done
+    assert executor.submit(lambda: "done").result() == "done"
+    executor.shutdown()
+
+
+def test_block_when_full():
+    executor, release_event, futures = _blocked_executor(max_in_flight=1, queue_depth=1, backpressure_policy=BackpressurePolicy.BLOCK)
+
+    submitted_event = threading.Event()
+
+    def submit():
+        executor.submit(lambda: None)
+        submitted_event.set()
+
+    submit_thread = threading.Thread(target=submit)
+    submit_thread.start()
+
+    assert not submitted_event.wait(0.1)
+    release_event.set()
+    assert submitted_event.wait(5)
+
+    submit_thread.join()
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("max_in_flight, queue_depth", [(0, 1), (1, -1)])
+def test_invalid_limits(max_in_flight, queue_depth):
+    with pytest.raises(ValueError):
+        InvocationExecutor(max_in_flight=max_in_flight, queue_depth=queue_depth)
+
+
+def test_app_invocation_executor_config():
+    app = ChiliPepper().create_app("test_app")
+    app.conf["max_in_flight_invocations"] = 4
+    app.conf["invocation_queue_depth"] = 8
+    app.conf["invocation_backpressure_policy"] = "reject"
+
+    assert app.invocation_executor is app.invocation_executor
+    assert app.invocation_executor.max_in_flight == 4
+    assert app.invocation_executor.queue_depth == 8
+    assert app.invocation_executor.backpressure_policy == BackpressurePolicy.REJECT
+
+    app.shutdown()
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from chili_pepper.governor import AdaptiveLimit, InvocationGovernor, is_server_error, is_throttle_error
+
+
+def _client_error(code, status_code):
+    return ClientError({"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status_code}}, "Invoke")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff_sleep(mocker):
+    return mocker.patch("chili_pepper.governor.time.sleep")
+
+
+def test_error_classification():
+    assert is_throttle_error(_client_error("TooManyRequestsException", 429))
+    assert not is_throttle_error(_client_error("ResourceNotFoundException", 404))
+    assert not is_throttle_error(ValueError("TooManyRequestsException"))
+
+    assert is_server_error(_client_error("ServiceException", 500))
+    assert not is_server_error(_client_error("TooManyRequestsException", 429))
+
+
+def test_adaptive_limit_aimd():
+    adaptive_limit = AdaptiveLimit(8)
+
+    generation = adaptive_limit.acquire()
+    adaptive_limit.release(generation, throttled=False)
+    assert adaptive_limit.limit == pytest.approx(8.125)
+
+    generation = adaptive_limit.acquire()
+    adaptive_limit.release(generation, throttled=True)
+    assert adaptive_limit.limit == pytest.approx(8.125 / 2)
+
+
+def test_adaptive_limit_one_decrease_per_generation():
+    adaptive_limit = AdaptiveLimit(8)
+    generations = [adaptive_limit.acquire() for _ in range(4)]
+
+    # all four were started under the old limit, so only the first throttle lowers it
+    for generation in generations:
+        adaptive_limit.release(generation, throttled=True)
+
+    assert adaptive_limit.limit == 4
+    assert adaptive_limit.in_flight == 0
+
+
+def test_adaptive_limit_bounds():
+    adaptive_limit = AdaptiveLimit(10, ceiling=3)
+    assert adaptive_limit.limit == 3
+
+    for _ in range(10):
+        generation = adaptive_limit.acquire()
+        adaptive_limit.release(generation, throttled=False)
+    assert adaptive_limit.limit == 3
+
+    for _ in range(10):
+        generation = adaptive_limit.acquire()
+        adaptive_limit.release(generation, throttled=True)
+    assert adaptive_limit.limit == 1
+
+
+def test_adaptive_limit_blocks_at_limit():
+    adaptive_limit = AdaptiveLimit(1)
+    generation = adaptive_limit.acquire()
+
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: acquired.set() if adaptive_limit.acquire() is not None else None)
+    thread.start()
+    assert not acquired.wait(0.05)
+
+    adaptive_limit.release(generation, throttled=False)
+    assert acquired.wait(1)
+    thread.join()
+
+
+@pytest.mark.parametrize("error", [_client_error("TooManyRequestsException", 429), _client_error("ServiceException", 500)])
+def test_governor_retries(error, no_backoff_sleep):
+    governor = InvocationGovernor(4, max_retries=3, retry_base_ms=100, retry_max_ms=150)
+    errors = [error, error]
+
+    def invoke():
+        if errors:
+            raise errors.pop()
+        return "response"
+
+    assert governor.call("my_function", invoke) == "response"
+    assert no_backoff_sleep.call_count == 2
+    for call in no_backoff_sleep.call_args_list:
+        assert 0 <= call[0][0] <= 0.15
+
+
+def test_governor_gives_up():
+    governor = InvocationGovernor(4, max_retries=2)
+    error = _client_error("TooManyRequestsException", 429)
+    attempts = [0]
+
+    def invoke():
+        attempts[0] += 1
+        raise error
+
+    with pytest.raises(ClientError):
+        governor.call("my_function", invoke)
+    assert attempts[0] == 3
+    assert governor.limit("my_function").limit == 1
+
+
+def test_governor_does_not_retry_past_deadline(no_backoff_sleep):
+    governor = InvocationGovernor(4, retry_base_ms=1000, retry_max_ms=1000)
+    attempts = [0]
+
+    def invoke():
+        attempts[0] += 1
+        raise _client_error("TooManyRequestsException", 429)
+
+    with pytest.raises(ClientError):
+        governor.call("my_function", invoke, deadline=time.time() - 1)
+    assert attempts[0] == 1
+    no_backoff_sleep.assert_not_called()
+
+
+def test_governor_does_not_retry_client_errors(no_backoff_sleep):
+    governor = InvocationGovernor(4)
+    attempts = [0]
+
+    def invoke():
+        attempts[0] += 1
+        raise _client_error("ResourceNotFoundException", 404)
+
+    with pytest.raises(ClientError):
+        governor.call("my_function", invoke)
+    assert attempts[0] == 1
+    no_backoff_sleep.assert_not_called()
+
+
+def test_governor_limits_are_per_function():
+    governor = InvocationGovernor(4)
+    assert governor.limit("function_a", ceiling=2).limit == 2
+    assert governor.limit("function_b").limit == 4
+    assert governor.limit("function_a") is governor.limit("function_a")
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from chili_pepper.hedging import HedgeBudget, HedgePolicy, InvalidHedgeThreshold, LatencyTracker, call_later
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for latency in range(9):
+        tracker.record(latency)
+    assert tracker.percentile(95) is None
+
+    for latency in range(9, 200):
+        tracker.record(latency)
+    # only the most recent 100 latencies are kept
+    assert len(tracker) == 100
+    assert tracker.percentile(0) == 100
+    assert tracker.percentile(95) == 195
+    assert tracker.percentile(100) == 199
+
+
+def test_hedge_budget():
+    budget = HedgeBudget(max_ratio=0.5, burst=2)
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+
+    for _ in range(10):
+        budget.deposit()
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+
+@pytest.mark.parametrize("hedge_after_ms", ["p", "95", "p100", "fast", -1, True, None])
+def test_invalid_threshold(hedge_after_ms):
+    with pytest.raises(InvalidHedgeThreshold):
+        HedgePolicy(hedge_after_ms)
+
+
+def test_fixed_delay():
+    assert HedgePolicy(250).get_delay() == 0.25
+
+
+def test_percentile_delay():
+    policy = HedgePolicy("p50", latency_tracker=LatencyTracker(min_samples=2))
+    assert policy.get_delay() is None
+    policy.record_latency(1)
+    policy.record_latency(3)
+    assert policy.get_delay() == 3
+
+
+def test_counters():
+    policy = HedgePolicy(0, max_ratio=0)
+    for _ in range(10):
+        policy.on_invocation()
+    assert sum(policy.try_hedge() for _ in range(20)) == 10
+    assert policy.hedges == 10
+
+    policy.record_finish(hedge_won=True, abandoned=True)
+    policy.record_finish(hedge_won=False, abandoned=False)
+    assert policy.hedge_wins == 1
+    assert policy.abandoned == 1
+
+
+def test_call_later():
+    called = list()
+    done = threading.Event()
+
+    def _second():
+        called.append(2)
+        done.set()
+
+    call_later(0.1, _second)
+    call_later(0, lambda: called.append(1))
+
+    assert done.wait(5)
+    assert called == [1, 2]
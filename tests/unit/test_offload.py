@@ -0,0 +1,142 @@
+import json
+
+import boto3
+import pytest
+
+from chili_pepper.app import ChiliPepper, Result
+from chili_pepper.offload import PayloadOffloader, is_s3_reference, load_s3_reference, make_s3_reference
+
+BUCKET_NAME = "my-bucket"
+
+
+@pytest.fixture()
+def s3_client():
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket=BUCKET_NAME)
+    return s3_client
+
+
+@pytest.fixture()
+def offload_app(s3_client):
+    app = ChiliPepper().create_app("test_app")
+    app.conf["aws"]["bucket_name"] = BUCKET_NAME
+    app.conf["aws"]["event_offload_threshold"] = 100
+    return app
+
+
+def test_offload_event_under_threshold(s3_client):
+    offloader = PayloadOffloader(lambda: s3_client, BUCKET_NAME, "prefix/", event_threshold=100)
+    event = {"name": "Jalapeno"}
+
+    assert json.loads(offloader.offload_event(json.dumps(event))) == event
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET_NAME)
+
+
+@pytest.mark.parametrize("event_threshold", [None, 100])
+def test_offload_event(s3_client, event_threshold):
+    offloader = PayloadOffloader(lambda: s3_client, BUCKET_NAME, "prefix/", event_threshold=event_threshold)
+    event = {"names": ["Jalapeno"] * 100}
+
+    payload = json.loads(offloader.offload_event(json.dumps(event)))
+
+    if event_threshold is None:
+        assert payload == event
+    else:
+        assert is_s3_reference(payload)
+        assert payload == make_s3_reference(BUCKET_NAME, s3_client.list_objects_v2(Bucket=BUCKET_NAME)["Contents"][0]["Key"])
+        assert load_s3_reference(s3_client, payload) == event
+
+
+@pytest.mark.parametrize("result_threshold", [None, 100])
+def test_dump_result(s3_client, result_threshold):
+    offloader = PayloadOffloader(lambda: s3_client, BUCKET_NAME, "prefix/", result_threshold=result_threshold)
+    small_result = {"name": "Jalapeno"}
+    big_result = {"names": ["Jalapeno"] * 100}
+
+    assert offloader.dump_result(small_result) == small_result
+    if result_threshold is None:
+        assert offloader.dump_result(big_result) == big_result
+    else:
+        assert load_s3_reference(s3_client, offloader.dump_result(big_result)) == big_result
+
+
+def test_is_s3_reference():
+    assert is_s3_reference(make_s3_reference(BUCKET_NAME, "key"))
+    assert not is_s3_reference({"s3": {"bucket": BUCKET_NAME, "key": "key"}})
+
+
+def test_app_payload_offloader(offload_app):
+    offloader = offload_app.payload_offloader
+    assert offloader.bucket_name == BUCKET_NAME
+    assert offloader.key_prefix == "chili_pepper_offload/test_app/"
+    assert offloader.event_threshold == 100
+
+    offload_app.conf["aws"]["event_offload_threshold"] = None
+    assert offload_app.payload_offloader is None
+
+
+def test_offload_permission(offload_app):
+    offload_permission = [p for p in offload_app.allow_policy_permissions if p.sid == "ChiliPepperGrantAccessToOffloadedPayloads"][0]
+    assert offload_permission.allow_actions == ["s3:GetObject"]
+    assert offload_permission.allow_resources == ["arn:aws:s3:::my-bucket/chili_pepper_offload/test_app/*"]
+
+
+def test_task_handler_loads_offloaded_event(offload_app):
+    @offload_app.task()
+    def say_hello(event, context):
+        return len(event["names"])
+
+    event = {"names": ["Jalapeno"] * 100}
+    reference = json.loads(offload_app.payload_offloader.offload_event(json.dumps(event)))
+
+    assert say_hello(reference, None) == 100
+
+
+class TestResultChannel:
+    @pytest.fixture()
+    def offloader(self, s3_client):
+        return PayloadOffloader(lambda: s3_client, BUCKET_NAME, "prefix/", result_threshold=100)
+
+    @pytest.fixture()
+    def big_result(self, offloader, fake_lambda_client):
+        big_result = {"names": ["Jalapeno"] * 100}
+        fake_lambda_client.handler = lambda event, context: offloader.dump_result(big_result)
+        return big_result
+
+    def test_get(self, offloader, fake_lambda_client, big_result, s3_client, mocker):
+        result = Result("say_hello", {}, lambda_client=fake_lambda_client, offloader=offloader)
+        get_object_spy = mocker.spy(s3_client, "get_object")
+
+        assert result.get() == big_result
+        assert result.get() == big_result
+        assert get_object_spy.call_count == 1
+
+    @pytest.mark.parametrize("offloaded", [True, False])
+    def test_iter_chunks(self, offloader, fake_lambda_client, big_result, offloaded):
+        if not offloaded:
+            fake_lambda_client.handler = lambda event, context: big_result
+        result = Result("say_hello", {}, lambda_client=fake_lambda_client, offloader=offloader)
+
+        chunks = list(result.iter_chunks(chunk_size=100))
+
+        assert all(len(chunk) <= 100 for chunk in chunks)
+        assert len(chunks) > 1
+        assert json.loads(b"".join(chunks).decode("utf8")) == big_result
+
+    def test_open(self, offloader, fake_lambda_client, big_result):
+        result = Result("say_hello", {}, lambda_client=fake_lambda_client, offloader=offloader)
+        with result.open() as stream:
+            assert json.load(stream) == big_result
+
+    def test_task_handler_offloads_result(self, offload_app, s3_client):
+        offload_app.conf["aws"]["result_offload_threshold"] = 100
+
+        @offload_app.task()
+        def say_hello(event, context):
+            return {"names": ["Jalapeno"] * 100}
+
+        reference = say_hello({}, None)
+
+        assert is_s3_reference(reference)
+        assert load_s3_reference(s3_client, reference) == {"names": ["Jalapeno"] * 100}
+        assert set(offload_app.allow_policy_permissions[-1].allow_actions) == set(["s3:GetObject", "s3:PutObject"])
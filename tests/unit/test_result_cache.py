@@ -0,0 +1,97 @@
+import boto3
+import pytest
+
+from chili_pepper.result_cache import DiskResultCache, LruResultCache, S3ResultCache, make_cache_key
+
+BUCKET_NAME = "my-bucket"
+
+
+@pytest.fixture()
+def fake_time(mocker):
+    now = [1000.0]
+    mocker.patch("chili_pepper.result_cache.time.time", side_effect=lambda: now[0])
+    return now
+
+
+def _s3_cache(ttl=None):
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket=BUCKET_NAME)
+    return S3ResultCache(lambda: s3_client, BUCKET_NAME, "cache/", ttl=ttl)
+
+
+@pytest.fixture(params=["lru", "disk", "s3"])
+def make_cache(request, tmp_path):
+    def _make_cache(ttl=None):
+        if request.param == "lru":
+            return LruResultCache(ttl=ttl)
+        if request.param == "disk":
+            return DiskResultCache(str(tmp_path / "cache"), ttl=ttl)
+        return _s3_cache(ttl=ttl)
+
+    return _make_cache
+
+
+def test_make_cache_key():
+    assert make_cache_key("task", {"a": 1, "b": 2}) == make_cache_key("task", {"b": 2, "a": 1})
+    assert make_cache_key("task", {"a": 1}) != make_cache_key("task", {"a": 2})
+    assert make_cache_key("task", {"a": 1}) != make_cache_key("other_task", {"a": 1})
+
+
+def test_get_and_set(make_cache):
+    cache = make_cache()
+
+    assert cache.get("key") is None
+    cache.set("key", b"value")
+    assert cache.get("key") == b"value"
+
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_ttl(make_cache, fake_time, mocker):
+    if isinstance(make_cache(), DiskResultCache):
+        mocker.patch("chili_pepper.result_cache.os.path.getmtime", return_value=fake_time[0])
+    cache = make_cache(ttl=10)
+    cache.set("key", b"value")
+
+    fake_time[0] += 5
+    assert cache.get("key") == b"value"
+    fake_time[0] += 10
+    assert cache.get("key") is None
+
+
+def test_lru_eviction():
+    cache = LruResultCache(max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.evictions == 1
+
+
+def test_lru_max_bytes():
+    cache = LruResultCache(max_entries=None, max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"123")
+    cache.set("too_big", b"12345678901")
+
+    assert len(cache) == 2
+    assert cache.size == 8
+    assert cache.get("a") is None
+    assert cache.get("too_big") is None
+
+
+def test_disk_max_bytes(tmp_path):
+    cache = DiskResultCache(str(tmp_path), max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"123")
+
+    assert cache.evictions == 1
+    assert sum(cache.get(key) is not None for key in ["a", "b", "c"]) == 2
+    assert cache.get("c") == b"123"
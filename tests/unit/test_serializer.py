@@ -0,0 +1,86 @@
+import datetime
+import json
+
+import pytest
+
+from chili_pepper.envelope import ENVELOPE_KEY
+from chili_pepper.serializer import PayloadCodec, SerializerError, SerializerRegistry, is_encoded_payload
+
+PAYLOAD = {"name": "Jalapeno", "numbers": list(range(500))}
+
+SERIALIZERS = ["json", "pickle", "orjson", "msgpack"]
+COMPRESSIONS = [None, "zlib", "zstd"]
+
+
+@pytest.fixture()
+def registry():
+    return SerializerRegistry(pickle_allowlist=["datetime.date"])
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("serializer", SERIALIZERS)
+def test_round_trip(registry, serializer, compression):
+    if serializer in ["orjson", "msgpack"]:
+        pytest.importorskip(serializer)
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    codec = PayloadCodec(registry, serializer=serializer, compression=compression)
+
+    assert codec.loads(codec.dumps(PAYLOAD)) == PAYLOAD
+    assert codec.unwrap(json.loads(json.dumps(codec.wrap(PAYLOAD)))) == PAYLOAD
+
+
+def test_plain_json_is_not_wrapped(registry):
+    codec = PayloadCodec(registry)
+
+    assert json.loads(codec.dumps(PAYLOAD)) == PAYLOAD
+    assert codec.wrap(PAYLOAD) is PAYLOAD
+
+
+def test_plain_payloads_are_not_copied(registry, mocker):
+    codec = PayloadCodec(registry)
+    payload = {"items": [{"name": "Jalapeno", "tags": ["hot"]}], "envelope": {ENVELOPE_KEY: {"batch": True}, "events": [1]}}
+
+    assert codec.unwrap(payload) is payload
+
+    # without the envelope key in the text, the decoded payload is not walked at all
+    unwrap = mocker.spy(codec, "unwrap")
+    assert codec.loads(json.dumps(PAYLOAD)) == PAYLOAD
+    assert codec.loads(json.dumps(payload)) == payload
+    assert unwrap.call_count == 1
+
+
+def test_compression(registry):
+    codec = PayloadCodec(registry, compression="zlib", compression_min_size=100)
+
+    assert json.loads(codec.dumps({"name": "Jalapeno"})) == {"name": "Jalapeno"}
+    compressed = json.loads(codec.dumps(PAYLOAD))
+    assert compressed[ENVELOPE_KEY] == {"serializer": "json", "compression": "zlib"}
+    assert len(compressed["body"]) < len(json.dumps(PAYLOAD))
+
+
+def test_pickle_allowlist(registry):
+    codec = PayloadCodec(registry, serializer="pickle")
+
+    assert codec.loads(codec.dumps(datetime.date(2020, 1, 1))) == datetime.date(2020, 1, 1)
+    with pytest.raises(SerializerError):
+        codec.loads(codec.dumps(datetime.datetime(2020, 1, 1)))
+
+
+def test_unknown_serializer(registry):
+    with pytest.raises(SerializerError):
+        PayloadCodec(registry, serializer="carrier_pigeon")
+    with pytest.raises(SerializerError):
+        PayloadCodec(registry, compression="carrier_pigeon")
+
+
+def test_for_payload(registry):
+    codec = PayloadCodec(registry, serializer="pickle", compression="zlib", compression_min_size=0)
+    wrapped = codec.wrap(PAYLOAD)
+
+    assert is_encoded_payload(wrapped)
+    reply_codec = PayloadCodec(registry).for_payload(wrapped)
+    assert reply_codec.serializer.name == "pickle"
+    assert reply_codec.compression.name == "zlib"
+
+    assert PayloadCodec(registry).for_payload(PAYLOAD).serializer.name == "json"
@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from chili_pepper.app import ChiliPepper, MissingArgumentError
+from chili_pepper.clients import ClientPool
+from chili_pepper.deployer import Deployer
+from chili_pepper.envelope import make_batch_event, split_batch_payload
+from chili_pepper.governor import DEFAULT_MAX_RETRIES
+from chili_pepper.spillover import LocalContext, LocalSpillover, run_task_locally
+
+# spilled tasks are pickled by reference, so they have to be defined at the top level of a module
+app = ChiliPepper().create_app("spillover_app")
+app.conf["aws"]["invocation_retry_base_ms"] = 1
+app.conf["aws"]["spillover_after_throttles"] = 2
+
+
+@app.task(spillover=True, timeout=60)
+def double(event, context):
+    return {"doubled": event["number"] * 2, "remaining_ms": context.get_remaining_time_in_millis()}
+
+
+@app.task()
+def triple(event, context):
+    return event["number"] * 3
+
+
+@app.task(spillover=True)
+def describe(event, context):
+    return {"event": event, "pair": (1, 2), "numbers": {1: "one"}, "process_id": os.getpid()}
+
+
+class ThrottledLambdaClient:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invocations = 0
+
+    def invoke(self, **kwargs):
+        with self._lock:
+            self.invocations += 1
+        raise ClientError({"Error": {"Code": "TooManyRequestsException", "Message": "Rate Exceeded."}, "ResponseMetadata": {"HTTPStatusCode": 429}}, "Invoke")
+
+
+@pytest.fixture()
+def throttled_lambda_client(mocker):
+    lambda_client = ThrottledLambdaClient()
+    mocker.patch.object(ClientPool, "client", return_value=lambda_client)
+    mocker.patch.object(Deployer, "get_function_id", side_effect=lambda python_function: python_function.__name__)
+    yield lambda_client
+    app.local_spillover.shutdown()
+
+
+def test_run_task_locally():
+    result = run_task_locally(double, {"number": 2}, timeout=60)
+    assert result["doubled"] == 4
+    assert 59000 < result["remaining_ms"] <= 60000
+
+
+def test_run_batch_locally():
+    batch_payload = run_task_locally(triple, make_batch_event([{"number": 1}, {"number": 2}]))
+    assert split_batch_payload(batch_payload, 2) == [3, 6]
+
+
+def test_local_context():
+    assert 2900 < LocalContext("my_function").get_remaining_time_in_millis() <= 3000
+
+
+def test_local_spillover():
+    local_spillover = LocalSpillover(max_workers=1)
+    try:
+        assert local_spillover.run(triple, {"number": 2}) == 6
+        assert local_spillover.spilled == 1
+    finally:
+        local_spillover.shutdown()
+
+
+def test_throttled_task_spills_over(throttled_lambda_client):
+    results = [double.delay({"number": number}) for number in range(3)]
+
+    assert [result.get(timeout=30)["doubled"] for result in results] == [0, 2, 4]
+    assert results[0].request_id is None
+    assert throttled_lambda_client.invocations == 6
+    assert app.local_spillover.spilled == 3
+
+
+def test_spilled_payloads_are_encoded_like_invoked_ones(throttled_lambda_client):
+    payload = describe.delay({"pair": (3, 4)}).get(timeout=30)
+
+    # the same JSON round trip as a lambda invocation, in a process of its own
+    assert payload["event"] == {"pair": [3, 4]}
+    assert payload["pair"] == [1, 2]
+    assert payload["numbers"] == {"1": "one"}
+    assert payload["process_id"] != os.getpid()
+
+
+def test_local_spillover_spawns_processes(mocker):
+    if sys.version_info < (3, 7):
+        pytest.skip("ProcessPoolExecutor only takes a multiprocessing context since python3.7")
+    process_pool = mocker.patch("chili_pepper.spillover.ProcessPoolExecutor")
+    LocalSpillover(max_workers=1).run(triple, {"number": 2})
+    assert process_pool.call_args[1]["mp_context"].get_start_method() == "spawn"
+
+
+def test_ineligible_task_does_not_spill_over(throttled_lambda_client):
+    with pytest.raises(ClientError):
+        triple.delay({"number": 2}).get(timeout=30)
+    assert throttled_lambda_client.invocations == DEFAULT_MAX_RETRIES + 1
+
+
+def test_spillover_task_must_be_top_level(aws_app):
+    with pytest.raises(MissingArgumentError):
+
+        @aws_app.task(spillover=True)
+        def say_hello(event, context):  # pylint: disable=unused-variable
+            pass